@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+from pathlib import Path
+
+PASTA_DEBUG = "debug_ocr"
+LIMITE_DEBUG_MB = 100.0
+
+
+def pasta_execucao(base=PASTA_DEBUG) -> Path:
+    """Pasta nova para as imagens de debug desta execução: <base>/<data-hora>[-n]"""
+    base = Path(base)
+    nome = time.strftime('%Y%m%d-%H%M%S')
+    pasta, n = base / nome, 1
+    while pasta.exists():
+        n += 1
+        pasta = base / f"{nome}-{n}"
+    return pasta
+
+
+class GravadorDebug:
+    """Grava em segundo plano as imagens enviadas ao OCR, para inspeção.
+
+    O OCR só entrega uma cópia da imagem a uma fila; uma thread faz a
+    codificação PNG e a escrita em disco fora do caminho crítico. Se a fila
+    estiver cheia ou a pasta já tiver passado do limite de tamanho, a imagem
+    é descartada (e contada) em vez de atrasar o OCR.
+
+    Amostragem: a_cada=N grava só as páginas 1, N+1, 2N+1...; so_falhas=True
+    grava só os segmentos em que o OCR não reconheceu texto.
+    """
+
+    def __init__(self, pasta, a_cada: int = 1, so_falhas: bool = False, limite_mb: float = LIMITE_DEBUG_MB,
+                 tamanho_fila: int = 16):
+        if a_cada < 1:
+            raise ValueError(f"a_cada deve ser >= 1 (recebido {a_cada}).")
+        if limite_mb <= 0:
+            raise ValueError(f"limite_mb deve ser positivo (recebido {limite_mb}).")
+        self.pasta = Path(pasta)
+        self.a_cada = a_cada
+        self.so_falhas = so_falhas
+        self.limite_bytes = int(limite_mb * 1024 * 1024)
+        self.gravadas = 0
+        self.descartadas = 0
+        self.bytes_gravados = 0
+        self._fila = queue.Queue(maxsize=tamanho_fila)
+        self._fechado = False
+        self._thread = threading.Thread(target=self._gravar_fila, name="gravador-debug", daemon=True)
+        self._thread.start()
+
+    def deve_gravar(self, num_pagina: int, falhou: bool = False) -> bool:
+        """Se a imagem deste segmento entra na amostra (página 1-indexada)"""
+        if self.so_falhas:
+            return falhou
+        return (num_pagina - 1) % self.a_cada == 0
+
+    def gravar(self, imagem, nome: str) -> bool:
+        """Enfileira uma cópia da imagem para `nome` (.png) na pasta; nunca bloqueia.
+
+        Returns:
+            False se a imagem foi descartada (fila cheia, limite atingido ou gravador fechado)
+        """
+        if self._fechado or self.bytes_gravados >= self.limite_bytes:
+            self.descartadas += 1
+            return False
+        try:
+            # Cópia: a imagem pode apontar para um buffer reaproveitado no próximo segmento
+            self._fila.put_nowait((imagem.copy(), nome))
+        except queue.Full:
+            self.descartadas += 1
+            return False
+        return True
+
+    def _gravar_fila(self):
+        while True:
+            item = self._fila.get()
+            if item is None:
+                break
+            imagem, nome = item
+            if self.bytes_gravados >= self.limite_bytes:
+                self.descartadas += 1
+                continue
+            try:
+                self.pasta.mkdir(parents=True, exist_ok=True)
+                caminho = self.pasta / f"{nome}.png"
+                imagem.save(caminho)
+                self.bytes_gravados += caminho.stat().st_size
+                self.gravadas += 1
+            except OSError as e:
+                print(f"  Aviso: imagem de debug {nome} não gravada: {e}")
+                self.descartadas += 1
+
+    def fechar(self):
+        """Espera a fila esvaziar e encerra a thread (idempotente)"""
+        if self._fechado:
+            return
+        self._fechado = True
+        self._fila.put(None)
+        self._thread.join()
+
+
+def resumo_pasta(pasta) -> str:
+    """Imagens e tamanho de uma pasta de debug (inclui o que os workers do pool gravaram)"""
+    arquivos = list(Path(pasta).glob("*.png"))
+    tamanho = sum(arquivo.stat().st_size for arquivo in arquivos)
+    return f"{len(arquivos)} imagem(ns) de debug em {pasta} ({tamanho / 1024 / 1024:.1f} MB)"
+
+
+# Gravador do processo atual (cada worker do pool cria o seu, na mesma pasta)
+_gravador = None
+_configuracao = None
+
+
+def definir_debug(configuracao=None):
+    """
+    Liga (ou desliga, com None) as imagens de debug neste processo
+
+    Args:
+        configuracao: dicionário com os argumentos de GravadorDebug (pasta,
+            a_cada, so_falhas, limite_mb); a mesma configuração de novo mantém
+            o gravador atual
+    """
+    global _gravador, _configuracao
+    if configuracao == _configuracao:
+        return
+    if _gravador is not None:
+        _gravador.fechar()
+    _gravador, _configuracao = None, configuracao
+    if configuracao:
+        _gravador = GravadorDebug(**configuracao)
+        # Workers do pool saem sem rodar atexit; o finalizador do multiprocessing
+        # esvazia a fila antes do processo terminar
+        from multiprocessing import util
+        util.Finalize(None, _gravador.fechar, exitpriority=10)
+
+
+def obter_gravador_debug():
+    """Gravador deste processo, ou None se as imagens de debug estão desligadas"""
+    return _gravador
+
+
+def encerrar_debug():
+    """Esvazia a fila do gravador deste processo e o desliga; devolve o resumo da pasta (None se desligado)"""
+    global _gravador, _configuracao
+    if _gravador is None:
+        return None
+    _gravador.fechar()
+    resumo = resumo_pasta(_gravador.pasta)
+    if _gravador.descartadas:
+        resumo += f", {_gravador.descartadas} descartada(s) neste processo"
+    _gravador = _configuracao = None
+    return resumo
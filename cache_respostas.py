@@ -0,0 +1,137 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+
+class CacheRespostas:
+    """Cache em disco das respostas da API, endereçado pelo conteúdo da requisição.
+
+    A chave é o SHA-256 de (pixels das imagens recortadas, texto do prompt,
+    modelo, temperatura). Se qualquer um deles mudar, a chave muda e a página
+    é reenviada; reprocessar uma pasta sem alterações não gasta créditos.
+
+    Cada entrada é um arquivo JSON em <diretorio>/<2 primeiros hex>/<chave>.json.
+    O mtime do arquivo marca o último uso; a evicção remove entradas mais
+    antigas que max_idade_dias e, se o total passar de max_bytes, as menos
+    usadas recentemente.
+    """
+
+    def __init__(self, diretorio=".cache_openrouter", max_bytes: int = 200 * 1024 * 1024,
+                 max_idade_dias: float = 30):
+        self.diretorio = Path(diretorio)
+        self.max_bytes = max_bytes
+        self.max_idade = max_idade_dias * 86400
+        self.acertos = 0
+        self.falhas = 0
+        self._lock = threading.Lock()
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self._tamanho_total = sum(p.stat().st_size for p in self._entradas())
+        self.aplicar_evicao()
+
+    @staticmethod
+    def gerar_chave(imagens, prompt: str, modelo: str, temperatura: float, codificacao: str = 'png') -> str:
+        """Gera a chave da requisição. `imagens` é uma lista de (label, PIL.Image)
+
+        `codificacao` é a forma de envio das imagens (str de CodificacaoImagem);
+        o PNG padrão não entra no hash, mantendo válidas as entradas antigas.
+        """
+        h = hashlib.sha256()
+        for label, img in imagens:
+            h.update(f"{label}|{img.mode}|{img.size[0]}x{img.size[1]}|".encode('utf-8'))
+            h.update(img.tobytes())
+        h.update(prompt.encode('utf-8'))
+        h.update(f"|{modelo}|{temperatura!r}".encode('utf-8'))
+        if codificacao != 'png':
+            h.update(f"|{codificacao}".encode('utf-8'))
+        return h.hexdigest()
+
+    def _caminho(self, chave: str) -> Path:
+        return self.diretorio / chave[:2] / f"{chave}.json"
+
+    def _entradas(self):
+        return self.diretorio.glob("*/*.json")
+
+    def obter(self, chave: str):
+        """Retorna os dados guardados para a chave, ou None se não houver entrada válida"""
+        caminho = self._caminho(chave)
+        try:
+            if time.time() - caminho.stat().st_mtime > self.max_idade:
+                self._remover(caminho)
+                raise FileNotFoundError
+            with open(caminho, encoding='utf-8') as f:
+                dados = json.load(f)
+            os.utime(caminho)  # marca como usado recentemente
+        except (OSError, ValueError):
+            with self._lock:
+                self.falhas += 1
+            return None
+
+        with self._lock:
+            self.acertos += 1
+        return dados
+
+    def salvar(self, chave: str, dados):
+        """Grava a resposta de forma atômica e aplica a evicção por tamanho se necessário"""
+        caminho = self._caminho(chave)
+        caminho.parent.mkdir(exist_ok=True)
+        temporario = caminho.with_suffix(f".{threading.get_ident()}.tmp")
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False)
+        tamanho_antigo = caminho.stat().st_size if caminho.exists() else 0
+        os.replace(temporario, caminho)
+
+        with self._lock:
+            self._tamanho_total += caminho.stat().st_size - tamanho_antigo
+            excedeu = self._tamanho_total > self.max_bytes
+        if excedeu:
+            self.aplicar_evicao()
+
+    def _remover(self, caminho: Path):
+        try:
+            tamanho = caminho.stat().st_size
+            caminho.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self._tamanho_total -= tamanho
+
+    def aplicar_evicao(self):
+        """Remove entradas expiradas e, acima do limite de tamanho, as menos usadas"""
+        agora = time.time()
+        entradas = []
+        for caminho in self._entradas():
+            try:
+                st = caminho.stat()
+            except OSError:
+                continue
+            if agora - st.st_mtime > self.max_idade:
+                self._remover(caminho)
+            else:
+                entradas.append((st.st_mtime, st.st_size, caminho))
+
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        # Mantém ~90% do limite para não disparar a evicção a cada nova entrada
+        alvo = self.max_bytes * 0.9
+        if total > self.max_bytes:
+            for _, tamanho, caminho in sorted(entradas):
+                if total <= alvo:
+                    break
+                self._remover(caminho)
+                total -= tamanho
+
+    def limpar(self):
+        """Apaga todo o conteúdo do cache"""
+        shutil.rmtree(self.diretorio, ignore_errors=True)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._tamanho_total = 0
+
+    def exibir_resumo(self):
+        total = self.acertos + self.falhas
+        if total:
+            print(f"\n🗄️  CACHE: {self.acertos}/{total} requisições atendidas pelo cache"
+                  f" ({self._tamanho_total / 1024 / 1024:.1f} MB em {self.diretorio})")
@@ -0,0 +1,180 @@
+import re
+from typing import Dict, List
+
+from validacao import CAMPOS, valores_conferem
+
+PADRAO_DECIMAL = re.compile(r'^\d{1,3}(?:\.\d{3})*,\d+$|^\d+,\d+$')
+PADRAO_DATA = re.compile(r'\b(\d{2}/\d{2}/\d{4})\b')
+PADRAO_HORA = re.compile(r'\b([01]\d|2[0-3]):([0-5]\d)(?::[0-5]\d)?\b')
+PADRAO_PLACA = re.compile(r'\b([A-Z]{3}-?\d[A-Z0-9]\d{2})\b')
+PADRAO_QUATRO_DIGITOS = re.compile(r'^\d{4}$')
+
+# Valor na mesma linha do rótulo ("PLACA: ABC1D23", "KM 123456", ...)
+PADROES_ROTULADOS = {
+    'numero_documento': re.compile(r'\bN[º°O]\.?\s*:?\s*([\d.]{4,})'),
+    'placa': re.compile(r'\bPLACA\s*:?\s*([A-Z]{3}-?\d[A-Z0-9]\d{2})\b'),
+    'km': re.compile(r'\bKM\s*:?\s*(\d[\d.]*)'),
+    'modelo_veiculo': re.compile(r'\bMODELO\s*:?\s*([A-Z0-9][A-Z0-9 .\-/]*[A-Z0-9.])'),
+    'quantidade': re.compile(r'\b(?:QTDE?|QUANTIDADE)\.?\s*:?\s*(\d[\d.]*,\d+)'),
+    'valor_unitario': re.compile(r'\bV(?:A?L(?:OR)?)?\.?\s*UNIT\w*\.?\s*:?\s*(?:R\$\s*)?(\d[\d.]*,\d+)'),
+    'valor_total': re.compile(r'\bV(?:A?L(?:OR)?)?\.?\s*TOTAL\.?\s*:?\s*(?:R\$\s*)?(\d[\d.]*,\d+)'),
+}
+
+# Cabeçalho de coluna das tabelas de produtos: o valor é o número logo abaixo
+CABECALHOS_COLUNA = {
+    'quantidade': re.compile(r'^(?:QTDE?|QUANT(?:IDADE)?)\.?$'),
+    'valor_unitario': re.compile(r'UNIT'),
+    'valor_total': re.compile(r'^(?:V\.?)?TOTAL$'),
+}
+
+# Descrição do produto -> sigla do combustível (mesma convenção do prompt)
+COMBUSTIVEIS = [
+    (re.compile(r'DIESEL\s*S-?10\b'), 'DS'),
+    (re.compile(r'DIESEL\s*S-?500\b'), 'D'),
+    (re.compile(r'GASOLINA'), 'G'),
+]
+
+
+def _linhas(palavras) -> List[str]:
+    """Agrupa as palavras de get_text("words") em linhas de texto (maiúsculas)"""
+    linhas = {}
+    for palavra in palavras:
+        linhas.setdefault((palavra[5], palavra[6]), []).append(palavra)
+    return [" ".join(p[4] for p in sorted(ps, key=lambda p: p[7])).upper() for ps in linhas.values()]
+
+
+def _dentro(palavra, caixa) -> bool:
+    """True se o centro da palavra está na caixa (x0, y0, x1, y1) em pontos"""
+    cx = (palavra[0] + palavra[2]) / 2
+    cy = (palavra[1] + palavra[3]) / 2
+    return caixa[0] <= cx <= caixa[2] and caixa[1] <= cy <= caixa[3]
+
+
+def _unico(valores):
+    valores = list(dict.fromkeys(valores))
+    return valores[0] if len(valores) == 1 else None
+
+
+def _valor_na_coluna(palavras, cabecalho, distancia_maxima=60):
+    """Número decimal logo abaixo de uma palavra de cabeçalho, alinhado com ela"""
+    for rotulo in palavras:
+        if not cabecalho.search(rotulo[4].upper()):
+            continue
+        largura = rotulo[2] - rotulo[0]
+        candidatos = [
+            p for p in palavras
+            if PADRAO_DECIMAL.match(p[4])
+            and 0 <= p[1] - rotulo[3] + 1 <= distancia_maxima
+            and p[0] < rotulo[2] + largura and p[2] > rotulo[0] - largura
+        ]
+        if candidatos:
+            return min(candidatos, key=lambda p: (p[1], abs(p[0] - rotulo[0])))[4]
+    return None
+
+
+def _extrair_campo(campo, palavras):
+    linhas = _linhas(palavras)
+
+    padrao = PADROES_ROTULADOS.get(campo)
+    if padrao:
+        for linha in linhas:
+            m = padrao.search(linha)
+            if not m:
+                continue
+            valor = m.group(1).strip()
+            if campo == 'numero_documento':
+                # "Nº 000.001.234" -> "1234"; só aceita o formato de 4 dígitos
+                valor = re.sub(r'\D', '', valor).lstrip('0')
+                if len(valor) != 4:
+                    continue
+            return valor
+
+    if campo in CABECALHOS_COLUNA:
+        return _valor_na_coluna(palavras, CABECALHOS_COLUNA[campo])
+    if campo == 'numero_documento':
+        return _unico(p[4] for p in palavras if PADRAO_QUATRO_DIGITOS.match(p[4]))
+    if campo == 'data_documento':
+        datas = [m.group(1) for linha in linhas for m in PADRAO_DATA.finditer(linha)]
+        return datas[0] if datas else None
+    if campo == 'hora_documento':
+        horas = [f"{m.group(1)}:{m.group(2)}" for linha in linhas for m in PADRAO_HORA.finditer(linha)]
+        return horas[0] if horas else None
+    if campo == 'placa':
+        return _unico(m.group(1) for linha in linhas for m in PADRAO_PLACA.finditer(linha))
+    if campo == 'tipo_combustível':
+        texto = " ".join(linhas)
+        return _unico(sigla for padrao, sigla in COMBUSTIVEIS if padrao.search(texto))
+    return None
+
+
+def _validar_valores(campos):
+    """Descarta quantidade/valores se quantidade x valor unitário não bater com o total"""
+    chaves = ('quantidade', 'valor_unitario', 'valor_total')
+    if all(campos.get(c) for c in chaves) and not valores_conferem(*(campos[c] for c in chaves)):
+        for chave in chaves:
+            del campos[chave]
+
+
+def extrair_campos_palavras(palavras, campos=None) -> Dict[str, str]:
+    """
+    Procura os campos em uma lista de palavras já restrita a uma região
+
+    Args:
+        palavras: Tuplas no formato de page.get_text("words") (coordenadas em pontos),
+            vindas da camada de texto ou de MotorOCR.palavras
+        campos: Campos a procurar (se None, todos)
+
+    Returns:
+        Dicionário apenas com os campos encontrados
+    """
+    resultado = {}
+    for campo in campos or CAMPOS:
+        valor = _extrair_campo(campo, palavras)
+        if valor:
+            resultado[campo] = valor
+    _validar_valores(resultado)
+    return resultado
+
+
+def extrair_campos_texto(pagina, modelo=None) -> Dict[str, str]:
+    """
+    Extrai os campos da camada de texto nativa do PDF, sem OCR nem rede
+
+    Usa page.get_text("words") e procura cada campo por rótulo e expressão
+    regular. Quando o modelo de regiões associa o campo a uma região
+    (modelo.campos), só as palavras daquela região são consideradas.
+
+    Args:
+        pagina: Página PyMuPDF
+        modelo: ModeloRegioes da página (opcional)
+
+    Returns:
+        Dicionário apenas com os campos resolvidos, no formato do documento
+        (PDFs digitalizados, sem camada de texto, devolvem {})
+    """
+    palavras = pagina.get_text("words")
+    if not palavras:
+        return {}
+
+    caixas = {}
+    regiao_do_campo = {}
+    if modelo is not None:
+        caixas = dict(zip(modelo.labels, modelo.caixas_pontos(pagina.rect)))
+        regiao_do_campo = {campo: label for label, campos in modelo.campos.items() for campo in campos}
+
+    palavras_por_regiao = {}
+    campos = {}
+    for campo in CAMPOS:
+        label = regiao_do_campo.get(campo)
+        if label in caixas:
+            if label not in palavras_por_regiao:
+                palavras_por_regiao[label] = [p for p in palavras if _dentro(p, caixas[label])]
+            candidatas = palavras_por_regiao[label]
+        else:
+            candidatas = palavras
+        valor = _extrair_campo(campo, candidatas)
+        if valor:
+            campos[campo] = valor
+
+    _validar_valores(campos)
+    return campos
@@ -0,0 +1,253 @@
+import asyncio
+import contextlib
+import json
+import threading
+import time
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+import requests
+
+# Aproximação usada para cortar respostas longas sem depender do tokenizador do modelo
+CARACTERES_POR_TOKEN = 4
+
+
+class ExtratorJSONIncremental:
+    """Encontra o primeiro objeto JSON completo em um texto recebido aos pedaços.
+
+    Acompanha a profundidade de chaves fora de strings (com escapes), então
+    '{"modelo": "A}B"}' não termina no '}' de dentro da string. O texto antes
+    do primeiro '{' (ex.: "Claro! Segue o JSON:") é ignorado; se o trecho
+    fechado não for JSON válido, a busca recomeça no próximo '{'.
+    """
+
+    def __init__(self):
+        self.texto = ''
+        self.objeto = None      # dict decodificado, quando completo
+        self.trecho = None      # texto exato do objeto
+        self._inicio = None
+        self._posicao = 0
+        self._profundidade = 0
+        self._em_string = False
+        self._escape = False
+
+    @property
+    def completo(self) -> bool:
+        return self.objeto is not None
+
+    def alimentar(self, pedaco: str) -> bool:
+        """Acrescenta um pedaço do texto; devolve True quando o objeto fica completo"""
+        if self.completo:
+            return True
+        self.texto += pedaco
+        texto = self.texto
+        while self._posicao < len(texto):
+            c = texto[self._posicao]
+            self._posicao += 1
+            if self._inicio is None:
+                if c == '{':
+                    self._inicio, self._profundidade = self._posicao - 1, 1
+                continue
+            if self._em_string:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._em_string = False
+            elif c == '"':
+                self._em_string = True
+            elif c == '{':
+                self._profundidade += 1
+            elif c == '}':
+                self._profundidade -= 1
+                if self._profundidade == 0:
+                    trecho = texto[self._inicio:self._posicao]
+                    try:
+                        objeto = json.loads(trecho)
+                    except json.JSONDecodeError:
+                        objeto = None
+                    if isinstance(objeto, dict):
+                        self.objeto, self.trecho = objeto, trecho
+                        return True
+                    # Não era o JSON da resposta: procura a partir do '{' seguinte
+                    self._posicao, self._inicio = self._inicio + 1, None
+        return False
+
+
+class RespostaStreaming:
+    """Resposta de ClienteStreaming com a mesma interface usada de requests.Response.
+
+    json() devolve o formato de chat completions com o conteúdo já recortado
+    no objeto JSON (ou o texto recebido, se nenhum objeto fechou) e o `usage`
+    do último evento, quando ele chegou, então o código que trata respostas
+    comuns funciona sem mudanças.
+    """
+
+    def __init__(self, status_code, headers, text='', conteudo='', dados=None, cancelado=False, tempos=None,
+                 uso=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+        self.conteudo = conteudo
+        self.dados = dados
+        self.cancelado = cancelado  # stream encerrado pelo cliente antes do fim
+        self.tempos = tempos or {}
+        self.uso = uso
+
+    def json(self):
+        if self.status_code != 200:
+            return json.loads(self.text or '{}')
+        texto = json.dumps(self.dados, ensure_ascii=False) if self.dados is not None else self.conteudo
+        resposta = {"choices": [{"message": {"role": "assistant", "content": texto}}]}
+        if self.uso is not None:
+            resposta["usage"] = self.uso
+        return resposta
+
+
+class ClienteStreaming:
+    """Cliente assíncrono (httpx) de chat completions com stream=True.
+
+    O conteúdo chega por SSE (linhas 'data: {...}') e é lido incrementalmente.
+    O pedido leva stream_options.include_usage, e a contagem de tokens vem
+    em um último evento, depois do conteúdo: com aguardar_uso=True (padrão)
+    o cliente lê até esse evento; com False, encerra o stream assim que o
+    objeto JSON da resposta fecha, sem esperar o modelo terminar (mais
+    rápido, mas a resposta fica sem `usage`). Se o texto passar de
+    max_tokens (aproximado por CARACTERES_POR_TOKEN), o stream é cancelado.
+
+    Um único AsyncClient roda em um loop de eventos próprio (thread de fundo);
+    post() pode ser chamado de qualquer thread e bloqueia até a resposta,
+    e postar_async() serve a código que já é assíncrono.
+    """
+
+    def __init__(self, tamanho_pool: int = 10, keep_alive: bool = True, http2: bool = False,
+                 aguardar_uso: bool = True):
+        import httpx  # dependência opcional: pip install httpx
+
+        self._httpx = httpx
+        self.aguardar_uso = aguardar_uso
+        self._limites = httpx.Limits(max_connections=tamanho_pool,
+                                     max_keepalive_connections=tamanho_pool if keep_alive else 0)
+        self._http2 = http2
+        self._cliente = None
+        self.respostas_antecipadas = 0  # streams encerrados logo após o JSON fechar
+        self.respostas_canceladas = 0   # streams cortados por excesso de tokens
+        self._lock = threading.Lock()
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def post(self, url, headers=None, json=None, timeout=None, cancelamento=None) -> RespostaStreaming:
+        """Versão síncrona de postar_async (mesma assinatura de SessaoHTTP.post).
+
+        Se o evento `cancelamento` for sinalizado durante a requisição, o
+        stream é fechado (o servidor para de gerar) e a chamada lança
+        ConnectionError.
+        """
+        futuro = asyncio.run_coroutine_threadsafe(self.postar_async(url, headers, json, timeout), self._loop)
+        if cancelamento is None:
+            return futuro.result()
+        while True:
+            try:
+                return futuro.result(timeout=0.05)
+            except FuturesTimeout:
+                if cancelamento.is_set():
+                    futuro.cancel()
+                    raise requests.exceptions.ConnectionError("Requisição cancelada pelo cliente")
+
+    async def postar_async(self, url, headers=None, payload=None, timeout=None) -> RespostaStreaming:
+        if self._cliente is None:
+            self._cliente = self._httpx.AsyncClient(http2=self._http2, limits=self._limites)
+        payload = dict(payload or {}, stream=True, stream_options={"include_usage": True})
+        limite_caracteres = payload.get('max_tokens', 1500) * CARACTERES_POR_TOKEN
+        marcas = {}
+
+        async def rastrear(evento, info):
+            marcas[evento] = time.perf_counter()
+
+        inicio = time.perf_counter()
+        try:
+            async with self._cliente.stream('POST', url, headers=headers, json=payload, timeout=timeout,
+                                            extensions={'trace': rastrear}) as resposta:
+                ttfb = time.perf_counter() - inicio
+                if resposta.status_code != 200:
+                    await resposta.aread()
+                    return RespostaStreaming(resposta.status_code, resposta.headers, text=resposta.text,
+                                             tempos=self._tempos(marcas, inicio, ttfb))
+
+                extrator, cancelado, antecipada, uso = ExtratorJSONIncremental(), False, False, None
+                recebidos = 0
+                # aclosing: o gerador de linhas é fechado aqui mesmo quando o laço sai no meio (break)
+                async with contextlib.aclosing(resposta.aiter_lines()) as linhas:
+                    async for linha in linhas:
+                        # Linhas vazias separam eventos; ':' inicia comentários (ex.: ": OPENROUTER PROCESSING")
+                        if not linha.startswith('data:'):
+                            continue
+                        dados = linha[5:].strip()
+                        if dados == '[DONE]':
+                            break
+                        try:
+                            evento = json.loads(dados)
+                        except ValueError:
+                            continue
+                        if evento.get('usage'):
+                            uso = evento['usage']
+                            break
+                        try:
+                            pedaco = evento['choices'][0].get('delta', {}).get('content') or ''
+                        except (KeyError, IndexError, AttributeError):
+                            continue
+                        recebidos += len(pedaco)
+                        if not extrator.completo and extrator.alimentar(pedaco) and not self.aguardar_uso:
+                            antecipada = True
+                            break
+                        if recebidos > limite_caracteres:
+                            # Sem JSON: cancelado; com JSON, o modelo só está falando demais depois dele
+                            cancelado, antecipada = not extrator.completo, extrator.completo
+                            break
+                # Sair do bloco com o stream aberto fecha a conexão: o servidor para de gerar
+        except self._httpx.HTTPError as e:
+            # Mantém o contrato de erros do requests para quem chama
+            raise requests.exceptions.ConnectionError(str(e)) from e
+
+        with self._lock:
+            if cancelado:
+                self.respostas_canceladas += 1
+            elif antecipada:
+                self.respostas_antecipadas += 1
+        if cancelado:
+            print(f"  ✂️  Stream cancelado: {len(extrator.texto)} caracteres sem JSON completo"
+                  f" (limite ~{limite_caracteres // CARACTERES_POR_TOKEN} tokens)")
+        return RespostaStreaming(200, resposta.headers, conteudo=extrator.texto, dados=extrator.objeto,
+                                 cancelado=cancelado, tempos=self._tempos(marcas, inicio, ttfb), uso=uso)
+
+    @staticmethod
+    def _tempos(marcas, inicio, ttfb):
+        inicio_conexao = marcas.get('connection.connect_tcp.started')
+        fim_conexao = marcas.get('connection.start_tls.complete', marcas.get('connection.connect_tcp.complete'))
+        return {
+            'conexao': (fim_conexao - inicio_conexao) if inicio_conexao and fim_conexao else 0.0,
+            'ttfb': ttfb,
+            'total': time.perf_counter() - inicio,
+        }
+
+    def fechar(self):
+        """Fecha o cliente, cancela o que ainda estiver pendente no loop e encerra a thread (idempotente)"""
+        if self._loop.is_closed():
+            return
+        asyncio.run_coroutine_threadsafe(self._encerrar(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+    async def _encerrar(self):
+        atual = asyncio.current_task()
+        pendentes = [tarefa for tarefa in asyncio.all_tasks() if tarefa is not atual]
+        for tarefa in pendentes:
+            tarefa.cancel()
+        await asyncio.gather(*pendentes, return_exceptions=True)
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+        # Geradores assíncronos ainda abertos (ex.: linhas de um stream) são fechados aqui
+        await self._loop.shutdown_asyncgens()
@@ -0,0 +1,317 @@
+import argparse
+import io
+import random
+import re
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from PIL import Image, ImageFilter, features
+
+# Formatos aceitos e o tipo MIME usado na data URL enviada à API
+FORMATOS = {'png': 'image/png', 'jpeg': 'image/jpeg', 'webp': 'image/webp'}
+
+# Codificações comparadas por padrão na avaliação
+CODIFICACOES_AVALIACAO = [
+    'png',
+    'png:cinza',
+    'png:bin',
+    'jpeg:q85',
+    'jpeg:q60:cinza',
+    'webp:q80:cinza',
+    'webp:q60:cinza:max1024',
+    'webp:q40:cinza:max768',
+]
+
+
+class CodificacaoImagem:
+    """Como cada recorte é codificado antes de ir para a API.
+
+    Etapas, nesta ordem: binarização (PreprocessadorOCR.binarizar com
+    'simples', do preprocessamento.py, sem ampliar o recorte) ou conversão
+    para tons de cinza, redução para que o maior lado não passe de
+    max_dimensao e compressão no formato escolhido (PNG sem perdas, JPEG
+    ou WebP com a qualidade indicada).
+
+    A representação em texto ('webp:q60:cinza:max1024') é aceita por
+    de_texto e entra na chave do cache de respostas.
+    """
+
+    def __init__(self, formato: str = 'png', qualidade: int = 85, cinza: bool = False,
+                 binarizar: bool = False, max_dimensao: int = None):
+        formato = formato.lower().replace('jpg', 'jpeg')
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de imagem inválido: {formato!r}. Use um de {tuple(FORMATOS)}.")
+        if formato == 'webp' and not features.check('webp'):
+            raise ValueError("Esta instalação do Pillow não tem suporte a WebP.")
+        if not 1 <= qualidade <= 100:
+            raise ValueError(f"Qualidade deve estar entre 1 e 100 (recebido {qualidade}).")
+        if max_dimensao is not None and max_dimensao < 16:
+            raise ValueError(f"max_dimensao muito pequena: {max_dimensao}")
+        self.formato = formato
+        self.qualidade = qualidade
+        self.cinza = cinza or binarizar
+        self.binarizar = binarizar
+        self.max_dimensao = max_dimensao
+
+    @classmethod
+    def de_texto(cls, texto: str) -> 'CodificacaoImagem':
+        """'webp:q60:cinza:max1024' -> CodificacaoImagem('webp', 60, cinza=True, max_dimensao=1024)"""
+        formato, *opcoes = texto.strip().lower().split(':')
+        parametros = {}
+        for opcao in opcoes:
+            if opcao == 'cinza':
+                parametros['cinza'] = True
+            elif opcao == 'bin':
+                parametros['binarizar'] = True
+            elif re.fullmatch(r'q\d+', opcao):
+                parametros['qualidade'] = int(opcao[1:])
+            elif re.fullmatch(r'max\d+', opcao):
+                parametros['max_dimensao'] = int(opcao[3:])
+            else:
+                raise ValueError(f"Opção de codificação desconhecida: {opcao!r} em {texto!r}")
+        return cls(formato, **parametros)
+
+    def __str__(self):
+        partes = [self.formato]
+        if self.formato != 'png':
+            partes.append(f"q{self.qualidade}")
+        if self.binarizar:
+            partes.append('bin')
+        elif self.cinza:
+            partes.append('cinza')
+        if self.max_dimensao:
+            partes.append(f"max{self.max_dimensao}")
+        return ':'.join(partes)
+
+    @property
+    def tipo_mime(self) -> str:
+        return FORMATOS[self.formato]
+
+    def preparar(self, img: Image.Image) -> Image.Image:
+        """Aplica binarização/tons de cinza e a redução de tamanho (sem comprimir)"""
+        if self.binarizar:
+            # OpenCV só é carregado quando a binarização é usada. Sem ampliar: a imagem
+            # enviada à API mantém o tamanho do recorte. Cópia: o buffer é reaproveitado
+            from preprocessamento import obter_preprocessador, para_cinza
+            img = Image.fromarray(obter_preprocessador().binarizar(para_cinza(img), 'simples').copy())
+        elif self.cinza and img.mode != 'L':
+            img = img.convert('L')
+
+        if self.max_dimensao and max(img.size) > self.max_dimensao:
+            escala = self.max_dimensao / max(img.size)
+            img = img.resize((max(1, round(img.width * escala)), max(1, round(img.height * escala))),
+                             Image.LANCZOS)
+            if self.binarizar:
+                # A redução suaviza as bordas; volta a ser preto e branco
+                img = img.point(lambda v: 255 if v >= 128 else 0)
+        return img
+
+    def codificar(self, img: Image.Image) -> bytes:
+        """Bytes do arquivo de imagem pronto para envio (no formato self.formato)"""
+        img = self.preparar(img)
+        buffer = io.BytesIO()
+        if self.formato == 'png':
+            if self.binarizar:
+                img = img.convert('1', dither=Image.Dither.NONE)  # 1 bit por pixel
+            img.save(buffer, format='PNG')
+        else:
+            if img.mode not in ('L', 'RGB'):
+                img = img.convert('RGB')
+            img.save(buffer, format=self.formato.upper(), quality=self.qualidade)
+        return buffer.getvalue()
+
+
+# ---------------------------------------------------------------------------
+# Avaliação offline: precisão x bytes enviados
+# ---------------------------------------------------------------------------
+
+def criar_fixtures(pasta, quantidade: int = 4, semente: int = 0) -> List[Tuple[Path, Dict[str, str]]]:
+    """Gera notas digitalizadas simuladas (PDF só com imagem, com ruído) e o gabarito de cada uma.
+
+    As notas seguem o layout do modelo padrão; os valores variam de forma
+    determinística com a semente, então o conjunto é sempre o mesmo.
+
+    Returns:
+        Lista de (caminho do PDF, {campo: valor como impresso no documento})
+    """
+    import fitz
+    import numpy as np
+    from extrator_deepseek import PAGINA_REFERENCIA, ZOOM_REGIOES
+
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(semente)
+    ruido = np.random.default_rng(semente)
+    largura, altura = PAGINA_REFERENCIA[0] / ZOOM_REGIOES, PAGINA_REFERENCIA[1] / ZOOM_REGIOES
+    combustiveis = {'DIESEL S10': 'DS', 'DIESEL S500': 'D', 'GASOLINA COMUM': 'G'}
+    modelos_veiculo = ['FIAT STRADA', 'AMB. RENAULT', 'VW GOL', 'FORD RANGER']
+
+    fixtures = []
+    for i in range(quantidade):
+        quantidade_l = rng.randint(5000, 90000) / 1000
+        unitario = rng.randint(5200, 6900) / 1000
+        letras = ''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(4))
+        gabarito = {
+            'numero_documento': f"{rng.randint(1000, 9999)}",
+            'data_documento': f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/2024",
+            'hora_documento': f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}",
+            'tipo_combustível': rng.choice(list(combustiveis)),
+            'quantidade': f"{quantidade_l:.3f}".replace('.', ','),
+            'valor_unitario': f"{unitario:.3f}".replace('.', ','),
+            'valor_total': f"{quantidade_l * unitario:.2f}".replace('.', ','),
+            'placa': f"{letras[:3]}{rng.randint(0, 9)}{letras[3]}{rng.randint(10, 99)}",
+            'km': f"{rng.randint(10000, 999999)}",
+            'modelo_veiculo': rng.choice(modelos_veiculo),
+        }
+
+        digital = fitz.open()
+        pagina = digital.new_page(width=largura, height=altura)
+        textos = [
+            ((240, 80), f"NF-e Nº {gabarito['numero_documento']} Série 1"),
+            ((495, 190), "EMISSÃO"),
+            ((495, 205), f"{gabarito['data_documento']} {gabarito['hora_documento']}"),
+            ((20, 430), "DESCRIÇÃO"), ((250, 430), "QTD"), ((320, 430), "V.UNIT"), ((400, 430), "V.TOTAL"),
+            ((20, 445), gabarito['tipo_combustível']), ((250, 445), gabarito['quantidade']),
+            ((320, 445), gabarito['valor_unitario']), ((400, 445), gabarito['valor_total']),
+            ((20, 630), "DADOS ADICIONAIS"),
+            ((20, 660), f"PLACA: {gabarito['placa']}"),
+            ((20, 675), f"KM: {gabarito['km']}"),
+            ((20, 690), f"MODELO: {gabarito['modelo_veiculo']}"),
+        ]
+        for posicao, texto in textos:
+            pagina.insert_text(posicao, texto, fontsize=8)
+
+        # "Digitaliza": rasteriza, borra levemente e soma ruído; o PDF final não tem camada de texto
+        pix = pagina.get_pixmap(matrix=fitz.Matrix(ZOOM_REGIOES, ZOOM_REGIOES), colorspace=fitz.csGRAY)
+        digital.close()
+        imagem = Image.frombytes('L', (pix.width, pix.height), pix.samples).filter(ImageFilter.GaussianBlur(0.7))
+        pixels = np.asarray(imagem, dtype=np.int16) + ruido.normal(0, 14, (pix.height, pix.width)).astype(np.int16)
+        imagem = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+        buffer = io.BytesIO()
+        imagem.save(buffer, format='PNG')
+
+        caminho = pasta / f"fixture_{i:02d}.pdf"
+        digitalizado = fitz.open()
+        pagina = digitalizado.new_page(width=largura, height=altura)
+        pagina.insert_image(pagina.rect, stream=buffer.getvalue())
+        digitalizado.save(caminho)
+        digitalizado.close()
+
+        gabarito['tipo_combustível'] = combustiveis[gabarito['tipo_combustível']]
+        fixtures.append((caminho, gabarito))
+    return fixtures
+
+
+def _sem_espacos(texto) -> str:
+    return re.sub(r'\s', '', str(texto)).upper()
+
+
+# Como o campo aparece impresso (para o leitor OCR, que não converte a sigla do combustível)
+_IMPRESSO_COMBUSTIVEL = {'DS': 'S10', 'D': 'S500', 'G': 'GASOLINA'}
+
+
+def _acertos_ocr(texto, gabarito) -> int:
+    """Campos do gabarito que aparecem, exatamente como impressos, no texto reconhecido"""
+    texto = _sem_espacos(texto)
+    acertos = 0
+    for campo, valor in gabarito.items():
+        if campo == 'tipo_combustível':
+            valor = _IMPRESSO_COMBUSTIVEL[valor]
+        acertos += _sem_espacos(valor) in texto
+    return acertos
+
+
+def _acertos_api(resultado, gabarito) -> int:
+    """Campos extraídos pela API iguais ao gabarito (os dois lados normalizados como no CSV)"""
+    from extrator_deepseek import OpenRouterExtractor
+    normalizar = OpenRouterExtractor._normalizar_valor
+    return sum(normalizar(resultado.get(campo), campo) == normalizar(valor, campo)
+               for campo, valor in gabarito.items())
+
+
+def avaliar_codificacoes(codificacoes, fixtures, leitor='ocr', idioma='por'):
+    """
+    Compara precisão e bytes enviados de cada codificação sobre as mesmas notas
+
+    Args:
+        codificacoes: Lista de CodificacaoImagem
+        fixtures: Lista de (caminho do PDF, gabarito), ex.: criar_fixtures()
+        leitor: 'ocr' (Tesseract sobre as imagens decodificadas, offline) ou
+            'api' (extração completa via OpenRouter, sem cache nem camada de texto)
+        idioma: Idioma do Tesseract no leitor 'ocr'
+
+    Returns:
+        Lista de dicionários (codificacao, bytes, acertos, campos, precisao, segundos),
+        na ordem de codificacoes
+    """
+    import fitz
+    from extrator_deepseek import OpenRouterExtractor
+
+    extrator = OpenRouterExtractor(api_key='offline' if leitor == 'ocr' else None, usar_camada_texto=False,
+                                   reconsultar=False, motor_extracao='visao')
+    if leitor == 'ocr':
+        from motor_ocr import obter_motor
+        motor = obter_motor()
+
+    # Recortes de cada nota, rasterizados uma vez e reaproveitados por todas as codificações
+    recortes = []
+    for caminho, gabarito in fixtures:
+        with fitz.open(caminho) as documento:
+            recortes.append((caminho, gabarito, extrator.recortar_regioes_pagina(documento[0])))
+
+    resultados = []
+    for codificacao in codificacoes:
+        inicio = time.perf_counter()
+        total_bytes = acertos = campos = 0
+        for caminho, gabarito, imagens in recortes:
+            campos += len(gabarito)
+            total_bytes += sum(len(codificacao.codificar(img)) for img in imagens)
+            if leitor == 'ocr':
+                decodificadas = [Image.open(io.BytesIO(codificacao.codificar(img))) for img in imagens]
+                texto = "\n".join(motor.reconhecer(img, idioma=idioma, psm=6) for img in decodificadas)
+                acertos += _acertos_ocr(texto, gabarito)
+            else:
+                extrator.codificacao = codificacao
+                acertos += _acertos_api(extrator.processar_pdf(str(caminho)) or {}, gabarito)
+        resultados.append({
+            'codificacao': str(codificacao),
+            'bytes': total_bytes,
+            'acertos': acertos,
+            'campos': campos,
+            'precisao': acertos / campos if campos else 0.0,
+            'segundos': time.perf_counter() - inicio,
+        })
+    return resultados
+
+
+def exibir_avaliacao(resultados):
+    """Tabela precisão x bytes, com a codificação mais barata que mantém a melhor precisão"""
+    referencia = resultados[0]['bytes'] or 1
+    print(f"\n{'codificação':<28}{'bytes':>12}{'vs 1ª':>8}{'precisão':>11}{'tempo':>9}")
+    for r in resultados:
+        print(f"{r['codificacao']:<28}{r['bytes']:>12,}{r['bytes'] / referencia:>8.2f}"
+              f"{r['precisao']:>10.1%}{r['segundos']:>8.1f}s")
+    melhor = max(r['precisao'] for r in resultados)
+    escolhida = min((r for r in resultados if r['precisao'] >= melhor), key=lambda r: r['bytes'])
+    print(f"\n✅ Mais barata com a melhor precisão ({melhor:.1%}): {escolhida['codificacao']}"
+          f" ({escolhida['bytes'] / referencia:.0%} dos bytes de {resultados[0]['codificacao']})")
+    return escolhida
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Avaliação offline das codificações de imagem: precisão x bytes")
+    parser.add_argument("codificacoes", nargs="*", default=CODIFICACOES_AVALIACAO,
+                        help="Codificações a comparar, ex.: png webp:q60:cinza:max1024 (padrão: um conjunto fixo)")
+    parser.add_argument("--fixtures", type=int, default=4, help="Quantidade de notas simuladas (padrão: 4)")
+    parser.add_argument("--semente", type=int, default=0, help="Semente das notas simuladas")
+    parser.add_argument("--leitor", choices=['ocr', 'api'], default='ocr',
+                        help="'ocr' = Tesseract, sem rede; 'api' = extração real via OpenRouter (gasta créditos)")
+    parser.add_argument("--idioma", default='por', help="Idioma do Tesseract no leitor 'ocr' (padrão: por)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        notas = criar_fixtures(pasta, args.fixtures, args.semente)
+        exibir_avaliacao(avaliar_codificacoes([CodificacaoImagem.de_texto(c) for c in args.codificacoes], notas,
+                                              leitor=args.leitor, idioma=args.idioma))
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# Chaves do resultado que não são campos extraídos
+CHAVES_METADADOS = ('arquivo', 'origem_campos', 'confianca_campos', 'tokens_paginas')
+
+
+class DiarioLote:
+    """Diário append-only (JSONL) dos PDFs já processados em um lote.
+
+    Cada linha registra o nome do arquivo, o SHA-256 do seu conteúdo e o
+    resultado da extração. A linha é gravada (flush + fsync) logo após cada
+    PDF, então uma queda ou Ctrl+C perde no máximo o arquivo em andamento.
+    Ao recarregar, vale o registro mais recente de cada hash e uma última
+    linha truncada (gravação interrompida) é removida do arquivo.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = Path(caminho)
+        self._lock = threading.Lock()
+        self._registros = {}
+        self._carregar()
+
+    @staticmethod
+    def hash_arquivo(caminho, tamanho_bloco: int = 1024 * 1024) -> str:
+        """SHA-256 do conteúdo do arquivo (o mesmo PDF renomeado mantém o hash)"""
+        h = hashlib.sha256()
+        with open(caminho, 'rb') as f:
+            for bloco in iter(lambda: f.read(tamanho_bloco), b''):
+                h.update(bloco)
+        return h.hexdigest()
+
+    def _carregar(self):
+        if not self.caminho.exists():
+            return
+        with open(self.caminho, 'rb') as f:
+            conteudo = f.read()
+        # Gravação interrompida: descarta a última linha sem "\n", senão o
+        # próximo registro seria acrescentado colado a ela e também se perderia
+        if conteudo and not conteudo.endswith(b"\n"):
+            conteudo = conteudo[:conteudo.rfind(b"\n") + 1]
+            with open(self.caminho, 'r+b') as f:
+                f.truncate(len(conteudo))
+                os.fsync(f.fileno())
+        for linha in conteudo.decode('utf-8', errors='replace').split("\n"):
+            if not linha:
+                continue
+            try:
+                registro = json.loads(linha)
+            except json.JSONDecodeError:
+                continue
+            self._registros[registro['hash']] = registro
+
+    def __len__(self):
+        return len(self._registros)
+
+    def __contains__(self, hash_pdf):
+        return hash_pdf in self._registros
+
+    def concluido(self, hash_pdf) -> bool:
+        """True se o PDF já foi processado com pelo menos um campo extraído.
+
+        Registros sem nenhum campo (ex.: todos os modelos falharam) não contam
+        como concluídos, para que --resume tente esses arquivos de novo.
+        """
+        registro = self._registros.get(hash_pdf)
+        return registro is not None and registro.get('campos_extraidos', 0) > 0
+
+    def resultado(self, hash_pdf):
+        registro = self._registros.get(hash_pdf)
+        return dict(registro['resultado']) if registro else None
+
+    def registrar(self, arquivo, hash_pdf, resultado):
+        """Acrescenta um registro ao diário e força a gravação em disco"""
+        campos_extraidos = sum(1 for k, v in resultado.items() if k not in CHAVES_METADADOS and v is not None)
+        registro = {
+            'arquivo': arquivo,
+            'hash': hash_pdf,
+            'campos_extraidos': campos_extraidos,
+            'processado_em': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'resultado': resultado,
+        }
+        linha = json.dumps(registro, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.caminho, 'a', encoding='utf-8') as f:
+                f.write(linha)
+                f.flush()
+                os.fsync(f.fileno())
+            self._registros[hash_pdf] = registro
@@ -7,23 +7,296 @@ import io
 import base64
 import json
 import requests
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 import csv
 import re
+import threading
+import argparse
+import tempfile
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from sessao_http import SessaoHTTP
+from cliente_streaming import ClienteStreaming
+from roteador_modelos import RoteadorModelos
+from cache_respostas import CacheRespostas
+from diario_lote import CHAVES_METADADOS, DiarioLote
+from renderizacao import renderizar_regioes, tamanho_renderizado
+from codificacao_imagem import FORMATOS, CodificacaoImagem
+from modelos_regioes import ARQUIVO_MODELOS, CatalogoModelos, ModeloRegioes
+from camada_texto import extrair_campos_texto
+from motor_ocr import MOTORES_OCR, definir_motor_ocr
+from ocr_regioes import LIMIAR_OCR, extrair_campos_ocr, verificar_ocr
+from prompt_extracao import PREFIXO_INSTRUCOES, campos_pedidos, montar_prompt_campos
+from validacao import CAMPOS, LIMIAR_CONFIANCA, calcular_confianca, validar_campo, validar_resultado
+from limitador_taxa import LimitadorTaxa, calcular_espera, interpretar_retry_after
+
+# Colunas do CSV de resultados, nesta ordem
+CAMPOS_CSV = ['arquivo', 'data_documento', 'hora_documento', 'tipo_combustível', 'quantidade',
+              'valor_unitario', 'valor_total', 'numero_documento', 'placa', 'km', 'modelo_veiculo']
+
+# Regiões fixas onde os campos aparecem: (label, (x, y, largura, altura)) em
+# pixels da página de referência (PAGINA_REFERENCIA: A4, 595x842 pt, renderizada
+# com ZOOM_REGIOES, sobre a qual as caixas foram medidas).
+# Usadas como modelo embutido quando não há modelos_regioes.json
+ZOOM_REGIOES = 2.0
+PAGINA_REFERENCIA = (1190, 1684)
+REGIOES_FIXAS = [
+    ('numero_documento', (470, 0, 375, 330)),
+    ('data_hora', (980, 325, 220, 220)),
+    ('corpo_doc', (0, 800, 1200, 1800)),  # tudo exceto placa/km/modelo
+    ('placa_km_modelo', (0, 1275, 425, 330)),
+]
+
+# Campos do CSV contidos em cada região fixa
+CAMPOS_REGIOES = {
+    'numero_documento': ['numero_documento'],
+    'data_hora': ['data_documento', 'hora_documento'],
+    'corpo_doc': ['tipo_combustível', 'quantidade', 'valor_unitario', 'valor_total'],
+    'placa_km_modelo': ['placa', 'km', 'modelo_veiculo'],
+}
+
+# Tipo de cada campo para _normalizar_valor
+TIPOS_CAMPOS = {
+    'data_documento': 'data',
+    'hora_documento': 'hora',
+    'tipo_combustível': 'combustivel',
+    'quantidade': 'litros',
+    'valor_unitario': 'dinheiro',
+    'valor_total': 'dinheiro',
+    'numero_documento': 'inteiro',
+    'placa': 'placa',
+    'km': 'km',
+    'modelo_veiculo': 'texto',
+}
+
+PADRAO_TEM_LETRA = re.compile(r'[^\W\d_]')
+PADRAO_TEM_DIGITO = re.compile(r'\d')
+PADRAO_NAO_ALFANUMERICO = re.compile(r'[^A-Za-z0-9\- ]')
+PADRAO_NAO_NUMERICO = re.compile(r'[^0-9\.-]')
+
+
+def _decimal_br(s):
+    """'1.234,56' -> '1234.56'; '22,850' -> '22.850'"""
+    return s.replace('.', '').replace(',', '.')
+
+
+# Formas já limpas de cada tipo e a conversão direta de cada uma. Cada conversão
+# devolve o mesmo que a normalização genérica devolveria para o valor; o que não
+# casar com nenhuma forma segue para a normalização genérica.
+REGRAS_NORMALIZACAO = {
+    'dinheiro': [
+        (re.compile(r'\d+(?:\.\d+)?'), None),
+        (re.compile(r'\d{1,3}(?:\.\d{3})*,\d+|\d+,\d+'), _decimal_br),
+        # 'R$ 134,58': o 'R' levaria o valor para a normalização de texto
+        (re.compile(r'R\$\s*(\d{1,3}(?:\.\d{3})*,\d+|\d+,\d+)'), lambda s: _decimal_br(s[2:].strip())),
+        (re.compile(r'R\$\s*\d+(?:\.\d+)?'), lambda s: s[2:].strip()),
+    ],
+    'litros': [
+        (re.compile(r'\d+(?:\.\d+)?'), None),
+        (re.compile(r'\d{1,3}(?:\.\d{3})*,\d+|\d+,\d+'), _decimal_br),
+    ],
+    'data': [
+        (re.compile(r'\d{8}'), None),
+        (re.compile(r'\d{2}/\d{2}/\d{4}'), lambda s: s.replace('/', '')),
+    ],
+    'hora': [
+        (re.compile(r'\d{4}'), None),
+        (re.compile(r'\d{2}:\d{2}(?::\d{2})?'), lambda s: s.replace(':', '')),
+    ],
+    'inteiro': [(re.compile(r'\d+'), None)],
+    'km': [(re.compile(r'\d+(?:\.\d+)*'), None)],
+    'placa': [(re.compile(r'[A-Za-z]{2,3}-?\d[A-Za-z0-9]\d{2}|\d{4}'), str.upper)],
+    'combustivel': [(re.compile(r'[A-Za-z]{1,3}'), str.upper)],
+    'texto': [(re.compile(r'[^\d]+'), lambda s: s.upper() if PADRAO_TEM_LETRA.search(s) else None)],
+}
+
+
+def carregar_modelos(caminho=ARQUIVO_MODELOS) -> CatalogoModelos:
+    """Carrega os modelos de regiões, com REGIOES_FIXAS como padrão se o arquivo não existir"""
+    return CatalogoModelos(caminho, padrao=ModeloRegioes.de_pixels('embutido', REGIOES_FIXAS, *PAGINA_REFERENCIA,
+                                                                  campos=CAMPOS_REGIOES))
+
+
+class EscritorCSV:
+    """Grava o CSV de resultados linha a linha, à medida que cada PDF termina.
+
+    Cada linha é enviada ao disco (flush) assim que escrita, então o arquivo
+    pode ser lido por outras ferramentas (ex.: preenchedor_automatico.py)
+    enquanto o lote ainda roda. Com fsync=True, cada linha também é forçada
+    no disco físico.
+    """
+
+    def __init__(self, caminho, fsync: bool = False):
+        self.caminho = caminho
+        self.fsync = fsync
+        self.linhas = 0
+        self._arquivo = open(caminho, 'w', newline='', encoding='utf-8')
+        # Chaves extras devolvidas pelo modelo (ex.: avisos) não entram no CSV
+        self._writer = csv.DictWriter(self._arquivo, fieldnames=CAMPOS_CSV, extrasaction='ignore')
+        self._writer.writeheader()
+        self._descarregar()
+
+    def _descarregar(self):
+        self._arquivo.flush()
+        if self.fsync:
+            os.fsync(self._arquivo.fileno())
+
+    def escrever(self, resultado):
+        self._writer.writerow(resultado)
+        self.linhas += 1
+        self._descarregar()
+
+    def fechar(self):
+        self._arquivo.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.fechar()
+
+
+class EstadoConsulta:
+    """Acompanha uma consulta a um modelo, para o roteador e o hedge.
+
+    `enviada` é sinalizado quando a requisição passa do limitador e do
+    semáforo e sai de fato para a API; `cancelada`, quando outra consulta
+    já venceu o hedge e esta não deve mais tentar. `latencia` guarda a ida e
+    volta HTTP da última tentativa (sem filas locais, Retry-After ou backoff).
+    """
+
+    def __init__(self):
+        self.enviada = threading.Event()
+        self.cancelada = threading.Event()
+        self.latencia = None
+
 
 class OpenRouterExtractor:
-    def __init__(self, api_key: str = None):
+    MODOS_LOTE = ('regiao', 'pagina')
+    MOTORES_EXTRACAO = ('hibrido', 'visao', 'ocr')
+
+    # Usando modelos de visão GRATUITOS/BARATOS disponíveis no OpenRouter
+    MODELOS_VISAO = [
+        # "x-ai/grok-4-fast:free",
+        "meta-llama/llama-3.2-90b-vision-instruct",
+        # "mistralai/mistral-small-3.2-24b-instruct:free",
+        # "google/gemini-flash-1.5",
+    ]
+
+    def __init__(self, api_key: str = None, base_url: str = None, max_requisicoes: int = 4,
+                 modo_lote: str = 'regiao', tamanho_pool: int = None, keep_alive: bool = True,
+                 http2: bool = False, cache: Optional[CacheRespostas] = None,
+                 limitador: Optional[LimitadorTaxa] = None, max_tentativas: int = 4,
+                 modelos: Optional[CatalogoModelos] = None, usar_camada_texto: bool = True,
+                 modelos_visao: Optional[List[str]] = None, reconsultar: bool = True,
+                 limiar_confianca: float = LIMIAR_CONFIANCA, modelo_reconsulta: Optional[str] = None,
+                 codificacao: Optional[CodificacaoImagem] = None, streaming: bool = False,
+                 streaming_antecipado: bool = False,
+                 roteador: Optional[RoteadorModelos] = None, prompt_especializado: bool = True,
+                 cache_prompt: bool = True, motor_extracao: str = 'hibrido', limiar_ocr: float = LIMIAR_OCR):
         """
         Inicializa o extrator OpenRouter
         
         Args:
             api_key: Chave da API OpenRouter (se None, tentará pegar da variável de ambiente)
+            base_url: Endpoint de chat completions (se None, usa OPENROUTER_BASE_URL ou o endpoint oficial)
+            max_requisicoes: Número máximo de requisições simultâneas à API (compartilhado entre workers)
+            modo_lote: 'regiao' (uma requisição por região recortada) ou 'pagina'
+                (as quatro regiões etiquetadas em uma única requisição por página)
+            tamanho_pool: Conexões mantidas abertas com a API (se None, igual a max_requisicoes)
+            keep_alive: Reaproveita conexões entre requisições (evita novo handshake TCP+TLS)
+            http2: Usa HTTP/2 quando httpx[http2] estiver instalado
+            cache: Cache em disco das respostas (None = sempre consulta a API)
+            limitador: Limitador de taxa compartilhado (se None, cria um com 10 req/s iniciais)
+            max_tentativas: Novas tentativas por modelo após 429, 5xx ou erro de conexão
+            modelos: Modelos de regiões por layout (se None, carrega modelos_regioes.json)
+            usar_camada_texto: Lê primeiro a camada de texto nativa do PDF e só envia à API
+                as regiões com campos não resolvidos
+            modelos_visao: Modelos de visão tentados em ordem (se None, MODELOS_VISAO)
+            reconsultar: Faz a segunda passada para os campos de baixa confiança
+            limiar_confianca: Campos abaixo desta confiança (0 a 1) são reconsultados
+            modelo_reconsulta: Modelo usado na segunda passada (se None, o primeiro de modelos_visao)
+            codificacao: Como as imagens são codificadas para envio (se None, PNG sem alterações)
+            streaming: Pede a resposta em stream (SSE, requer httpx) e lê até o evento final com o uso de tokens
+            streaming_antecipado: Com streaming, encerra o stream assim que o JSON fecha, sem esperar o
+                evento de uso (mais rápido, mas essas respostas contam como 'sem_uso' nos tokens)
+            roteador: Ordena modelos_visao pelas métricas recentes de cada modelo e, com hedge,
+                duplica requisições lentas para o segundo modelo (None = ordem fixa)
+            prompt_especializado: Cada recorte pede só os campos da sua região (False = todos os campos)
+            cache_prompt: Marca as instruções fixas do prompt com cache_control (prompt caching do provedor)
+            motor_extracao: 'hibrido' (OCR local nos recortes e visão só para os campos reprovados),
+                'visao' (só o modelo de visão) ou 'ocr' (só o OCR local, sem requisições)
+            limiar_ocr: Confiança mínima do Tesseract (0 a 1) para aceitar um campo lido pelo OCR
         """
+        if modo_lote not in self.MODOS_LOTE:
+            raise ValueError(f"modo_lote inválido: {modo_lote!r}. Use um de {self.MODOS_LOTE}.")
+        self.modo_lote = modo_lote
+
         self.api_key = api_key or os.getenv('OPENROUTER_API_KEY')
-        if not self.api_key:
+        if not self.api_key and motor_extracao != 'ocr':
             raise ValueError("API Key do OpenRouter não encontrada. Defina OPENROUTER_API_KEY ou passe como parâmetro.")
         
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.base_url = base_url or os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1/chat/completions")
+        self._semaforo_requisicoes = threading.BoundedSemaphore(max(1, max_requisicoes))
+        self._vagas = max(1, max_requisicoes)
+        self._em_voo = 0           # requisições dentro do semáforo
+        self._hedges_ativos = 0    # hedges enviados que ainda não terminaram
+        self._lock_vagas = threading.Lock()
+
+        # Sessão única para todo o extrator: conexões ficam abertas entre regiões, páginas e arquivos
+        self.sessao = SessaoHTTP(tamanho_pool=tamanho_pool or max(1, max_requisicoes),
+                                 keep_alive=keep_alive, http2=http2)
+        self.cliente_streaming = None
+        if streaming:
+            try:
+                self.cliente_streaming = ClienteStreaming(tamanho_pool=tamanho_pool or max(1, max_requisicoes),
+                                                          keep_alive=keep_alive, http2=self.sessao.http2,
+                                                          aguardar_uso=not streaming_antecipado)
+            except ImportError:
+                print("  ⚠️  Streaming indisponível (instale httpx). Usando respostas completas.")
+        self.tempos_requisicoes = []
+        self._lock_tempos = threading.Lock()
+        self.cache = cache
+        self.limitador = limitador or LimitadorTaxa(capacidade=max(1, max_requisicoes))
+        self.max_tentativas = max_tentativas
+        self.modelos = modelos or carregar_modelos()
+        self.usar_camada_texto = usar_camada_texto
+        self.origens = Counter()  # campos preenchidos por etapa ('texto' ou 'visao')
+        self.requisicoes_evitadas = 0
+        self.modelos_visao = list(modelos_visao or self.MODELOS_VISAO)
+        self.reconsultar = reconsultar
+        self.limiar_confianca = limiar_confianca
+        self.modelo_reconsulta = modelo_reconsulta
+        self.reconsultas = 0           # requisições da segunda passada
+        self.campos_reconsultados = 0
+        self.campos_corrigidos = 0     # campos cujo valor mudou ou foi preenchido na segunda passada
+        self._lock_origens = threading.Lock()
+        self.codificacao = codificacao or CodificacaoImagem()
+        self.imagens_enviadas = 0
+        self.bytes_imagens = 0         # tamanho das imagens codificadas (antes do base64)
+        self.roteador = roteador
+        if motor_extracao not in self.MOTORES_EXTRACAO:
+            raise ValueError(f"motor_extracao inválido: {motor_extracao!r}. Use um de {self.MOTORES_EXTRACAO}.")
+        if motor_extracao != 'visao':
+            try:
+                verificar_ocr()
+            except Exception as e:
+                if motor_extracao == 'ocr':
+                    raise RuntimeError(f"OCR local indisponível (Tesseract): {e}") from e
+                print(f"  ⚠️  OCR local indisponível ({e}). Usando só o modelo de visão.")
+                motor_extracao = 'visao'
+        self.motor_extracao = motor_extracao
+        self.limiar_ocr = limiar_ocr
+        self.regioes_ocr = 0           # regiões resolvidas pelo OCR local, sem requisição
+        self.prompt_especializado = prompt_especializado
+        self.cache_prompt = cache_prompt
+        self.uso_tokens = Counter()    # entrada, saida, cache, requisicoes, sem_uso
+        self.paginas_consultadas = 0   # páginas que precisaram de alguma requisição
+        self._executor_hedge = None
+        self._threads_hedge = 0
+        self._dimensionar_hedge(1)
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {self.api_key}",
@@ -31,11 +304,35 @@ class OpenRouterExtractor:
             "X-Title": "PDF Data Extractor"  # Opcional
         }
     
+    def fechar(self):
+        """Fecha as conexões HTTP do extrator (sessão e cliente de streaming)"""
+        if self.cliente_streaming is not None:
+            self.cliente_streaming.fechar()
+        self.sessao.fechar()
+
+    def _dimensionar_hedge(self, chamadores):
+        """Garante threads no executor do hedge para `chamadores` consultas simultâneas.
+
+        Cada chamador ocupa uma thread com a consulta principal; hedges e
+        perdedores ainda em andamento ocupam no máximo 2 x max_requisicoes,
+        então nenhuma consulta principal fica na fila atrás deles.
+        """
+        if self.roteador is None:
+            return
+        necessarias = chamadores + 2 * self._vagas
+        if necessarias > self._threads_hedge:
+            anterior = self._executor_hedge
+            self._executor_hedge = ThreadPoolExecutor(max_workers=necessarias)
+            self._threads_hedge = necessarias
+            if anterior is not None:
+                anterior.shutdown(wait=False)
+
     def image_to_base64(self, image: Image.Image) -> str:
-        """Converte imagem PIL para base64"""
-        buffer = io.BytesIO()
-        image.save(buffer, format='PNG')
-        img_bytes = buffer.getvalue()
+        """Converte imagem PIL para base64, na codificação configurada (self.codificacao)"""
+        img_bytes = self.codificacao.codificar(image)
+        with self._lock_tempos:
+            self.imagens_enviadas += 1
+            self.bytes_imagens += len(img_bytes)
         return base64.b64encode(img_bytes).decode('utf-8')
     
     def segmentar_imagem_horizontal(self, img, num_segmentos=4, segmentos_desejados=[2, 3]):
@@ -53,183 +350,423 @@ class OpenRouterExtractor:
         
         return segmentos
 
-    def recortar_regioes_fixas(self, img: Image.Image) -> List[Image.Image]:
-        """Recorta as quatro regiões fixas indicadas pelo usuário.
-
-        Regiões (x, y, largura, altura):
-        - Número do documento: 470x0, 375x330
-        - Data e hora: 980x325, 220x220
-        - Corpo do documento (tudo exceto placa/km/modelo): 0x800, 1200x1800
-        - Placa/KM/Modelo: 0x1275, 425x330
-
-        Retorna lista de imagens PIL na ordem: [num_doc, data_hora, corpo, placa_km_modelo]
-        """
-        w, h = img.size
-
-        regions = []
+    def recortar_regioes_pagina(self, pagina, modelo: Optional[ModeloRegioes] = None,
+                                labels: Optional[List[str]] = None) -> List[Image.Image]:
+        """Rasteriza só as regiões do modelo (clip) em vez da página inteira.
 
-        # Número do documento
-        x, y, rw, rh = 470, 0, 375, 330
-        regions.append(img.crop((x, y, x + rw, y + rh)))
+        As regiões do modelo são relativas à página, então acompanham o
+        tamanho real dela. Uma região contida em outra (ex.: placa/km/modelo
+        dentro do corpo) é recortada da maior, sem nova rasterização.
 
-        # Data e hora
-        x, y, rw, rh = 980, 325, 220, 220
-        regions.append(img.crop((x, y, x + rw, y + rh)))
-
-        # Corpo do documento
-        x, y, rw, rh = 0, 800, 1200, 1800
-        # Limita ao tamanho da imagem
-        x2 = min(x + rw, w)
-        y2 = min(y + rh, h)
-        regions.append(img.crop((x, y, x2, y2)))
-
-        # Placa, KM e Modelo
-        x, y, rw, rh = 0, 1275, 425, 330
-        x2 = min(x + rw, w)
-        y2 = min(y + rh, h)
-        regions.append(img.crop((x, y, x2, y2)))
+        Args:
+            pagina: Página PyMuPDF
+            modelo: Modelo de regiões (se None, detecta pelo catálogo)
+            labels: Rasteriza só estas regiões (se None, todas)
 
-        return regions
+        Retorna lista de imagens PIL na ordem das regiões do modelo
+        """
+        modelo = modelo or self.modelos.detectar(pagina)
+        caixas = modelo.caixas_pixels(*tamanho_renderizado(pagina, zoom=ZOOM_REGIOES))
+        if labels is not None:
+            caixas = [caixa for label, caixa in zip(modelo.labels, caixas) if label in labels]
+        return renderizar_regioes(pagina, caixas, zoom=ZOOM_REGIOES)
     
-    def extrair_dados_com_openrouter(self, image: Image.Image) -> Dict[str, Optional[str]]:
+    def extrair_dados_com_openrouter(self, images, campos: Optional[List[str]] = None,
+                                     modelos: Optional[List[str]] = None,
+                                     uso: Optional[Counter] = None) -> Dict[str, Optional[str]]:
         """
         Usa OpenRouter para extrair dados específicos da imagem
         
         Args:
-            image: Imagem PIL
+            images: pode ser:
+                - um único PIL.Image (uma região ou a página inteira)
+                - uma lista de tuplas (label, PIL.Image), enviadas etiquetadas em UMA requisição
+                - uma lista de PIL.Image (etiquetas genéricas imagem_0, imagem_1, ...)
+            campos: Se informado, o prompt descreve e pede apenas estes campos
+            modelos: Modelos a tentar, em ordem (se None, self.modelos_visao)
+            uso: Contador onde somar os tokens gastos (ex.: os da página em andamento)
         
         Returns:
             Dicionário com os dados extraídos
         """
-        # Converte imagem para base64
-        img_base64 = self.image_to_base64(image)
-        
-        # Prompt específico para extração de dados
-        prompt = """
-        Analise esta imagem de um documento fiscal/nota e extraia EXATAMENTE as seguintes informações:
-
-        1. **Número do Documento**: Número do documento que possui 4 dígitos (ex de formato: XXXX).
-        2. **Data do documento**: Data em que o documento foi emitido (formato: DD/MM/AAAA).
-        3. **Hora do documento**: Hora em que o documento foi emitido (formato: HH:MM).
-        4. **Tipo de Combustível**: O tipo do combustível (ex: Gasolina, Etanol, Etanol S10, Diesel, etc).
-        5. **Quantidade**: Quantidade do produto (em litros ou unidades).
-        6. **Valor Unitário**: Preço por unidade (R$), ele sempre terá 3 casas decimais, use virgulas e pontos conforme o documento.
-        7. **Valor Total**: Valor total da compra (R$), ele sempre terá 3 casas decimais, use virgulas e pontos conforme o documento.
-        8. **Placa**: Placa do veículo (formato ABC-1234 ou ABC1D23).
-        9. **KM**: Quilometragem do veículo.
-        10. **Modelo do Veículo**: Modelo/marca do carro, ele está em frente ao "OBS" logo acima do "MOTOTISTA" e abaixo da placa e km,
-
-        se não encontrar, retorne null, não confundir com o nome do motorista que também está acima do modelo do carro.
-
-        INSTRUÇÕES IMPORTANTES:
-        - Retorne APENAS um JSON válido com os campos exatos.
-        - Use null para campos não encontrados.
-        - Para valores monetários, use apenas números e com formatação do Brasil (ex: "35198,75").
-        - Para o número do documento, ele fica localizado junto com o número de Série e "NF-e", e o número do documento é o de 4 dígitos que vem logo acima, na parte mais inferior do documento.
-        - Caso não encontre a hora do documento, retorne 00:00.
-        - Para quantidade, valor unitário e valor total, mantenha o formato original do documento
-        - Para placa, mantenha o formato original e a placa sempre tera o formato ABC1234, ABC1D23 , 1234 ou AB1234, caso encontre um resultado diferente ou não consiga indentificar, retorne null.
-        - Faça a conta de quantidade * valor unitário e veja se bate com o valor total, se não bater, retorne null para valor total e retorne um aviso.
-        - Para o combustível, os numeros 3 = D (Diesel S500), 4 = DS (Diesel S10), 5 = G (Gasolina), retorne apenas a sigla (ex: DS, G, D, etc).
-        - A placa, km e modelo do veículo estão localizados na parte inferior do documento, na seção "DADOS ADICIONAIS", logo acima do "MOTOTISTA".
-        - Seja preciso e extraia apenas o que está claramente visível.
-        - Retorne nomes com todos os caracteres em maiúsculo.
-        - Caso não tenha certeza sobre mais que 1 campo em 1 arquivo, retorne uma mensagem falando para o usuário conferir o documento.
-
-        Formato de resposta esperado:
-        {
-            "data_documento": "DD/MM/AAAA ou null",
-            "hora_documento": "HH:MM ou null",
-            "tipo_combustível": "valor ou null",
-            "quantidade": "valor ou null",
-            "valor_unitario": "valor ou null",
-            "valor_total": "valor ou null",
-            "numero_documento": "valor ou null",
-            "placa": "valor ou null",
-            "km": "valor ou null",
-            "modelo_veiculo": "valor ou null",
-        }
-        """
-        
-        # Usando modelos de visão GRATUITOS/BARATOS disponíveis no OpenRouter
-        modelos_disponiveis = [
-            # "x-ai/grok-4-fast:free",
-            "meta-llama/llama-3.2-90b-vision-instruct",
-            # "mistralai/mistral-small-3.2-24b-instruct:free",
-            # "google/gemini-flash-1.5",
-        ]
+        # Normaliza o parâmetro para uma lista de (label, Image)
+        if isinstance(images, Image.Image):
+            imagens_list: List[Tuple[str, Image.Image]] = [("imagem_0", images)]
+        elif isinstance(images, list) and images:
+            if isinstance(images[0], tuple) and len(images[0]) == 2:
+                imagens_list = images
+            else:
+                imagens_list = [(f"imagem_{i}", img) for i, img in enumerate(images)]
+        else:
+            print("  Parâmetro 'images' em formato inesperado. Retornando resultado vazio.")
+            return self._criar_resultado_vazio()
+
+        # Prompt: instruções fixas (prefixo cacheável) + descrição só dos campos pedidos
+        etiquetas = [label for label, _ in imagens_list]
+        prompt_campos = montar_prompt_campos(campos, etiquetas)
+        prompt = PREFIXO_INSTRUCOES + "\n" + prompt_campos
+
+        modelos_disponiveis = modelos or self.modelos_visao
+        temperatura = 0.1  # Baixa temperatura para mais precisão
+
+        # Consulta o cache antes de codificar e enviar as imagens
+        chaves_cache = {}
+        if self.cache is not None:
+            for modelo in modelos_disponiveis:
+                chaves_cache[modelo] = self.cache.gerar_chave(imagens_list, prompt, modelo, temperatura,
+                                                              codificacao=str(self.codificacao))
+                dados_cache = self.cache.obter(chaves_cache[modelo])
+                if dados_cache is not None:
+                    print(f"  🗄️  Resposta obtida do cache ({modelo})")
+                    return dados_cache
+
+        # Monta o conteúdo da mensagem: prompt + imagens (etiquetadas quando há mais de uma)
+        prefixo = {"type": "text", "text": PREFIXO_INSTRUCOES}
+        if self.cache_prompt:
+            # Ignorado pelos provedores sem suporte; os que guardam prefixos automaticamente também se beneficiam
+            prefixo["cache_control"] = {"type": "ephemeral"}
+        content_items = [prefixo, {"type": "text", "text": prompt_campos}]
+        bytes_antes = self.bytes_imagens
+        for label, img in imagens_list:
+            if len(imagens_list) > 1:
+                content_items.append({"type": "text", "text": label})
+            content_items.append({
+                "type": "image_url",
+                "image_url": {"url": f"data:{self.codificacao.tipo_mime};base64,{self.image_to_base64(img)}"}
+            })
+        tamanho_imagens = self.bytes_imagens - bytes_antes
         
+        if self.roteador is not None:
+            modelos_disponiveis = self.roteador.ordenar(modelos_disponiveis)
+        consultar = lambda modelo, estado=None: self._consultar_modelo(
+            modelo, content_items, temperatura, len(imagens_list), tamanho_imagens, chaves_cache, campos, uso,
+            estado)
+
+        # Hedge: se o primeiro modelo passar do seu p95, o segundo recebe a mesma requisição
+        restantes = list(modelos_disponiveis)
+        if self.roteador is not None and self.roteador.hedge and len(restantes) >= 2:
+            dados_extraidos = self._consultar_com_hedge(restantes[0], restantes[1], consultar)
+            if dados_extraidos is not None:
+                return dados_extraidos
+            restantes = restantes[2:]
+
         # Tenta diferentes modelos até encontrar um que funcione
-        for modelo in modelos_disponiveis:
-            try:
-                # Payload para a API
-                payload = {
-                    "model": modelo,
-                    "messages": [
-                        {
-                            "role": "user",
-                            "content": [
-                                {
-                                    "type": "text",
-                                    "text": prompt
-                                },
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": f"data:image/png;base64,{img_base64}"
-                                    }
-                                }
-                            ]
-                        }
-                    ],
-                    "max_tokens": 1500,
-                    "temperature": 0.1  # Baixa temperatura para mais precisão
-                }
-                
-                print(f"  Enviando imagem para OpenRouter ({modelo})...")
-                response = requests.post(self.base_url, headers=self.headers, json=payload, timeout=90)
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    if 'choices' in data and len(data['choices']) > 0:
-                        content = data['choices'][0]['message']['content']
-                        print(f"  Resposta da API recebida com sucesso usando {modelo}!")
-                        
-                        # Busca por JSON na resposta
-                        json_start = content.find('{')
-                        json_end = content.rfind('}') + 1
-                        
-                        if json_start != -1 and json_end != -1:
-                            json_str = content[json_start:json_end]
-                            try:
-                                dados_extraidos = json.loads(json_str)
-                                return dados_extraidos
-                            except json.JSONDecodeError as e:
-                                print(f"  Erro ao decodificar JSON: {e}")
-                                continue
-                        else:
-                            print(f"  Não foi encontrado JSON válido na resposta")
-                            continue
-                    else:
-                        print(f"  Resposta sem choices válidos")
-                        continue
-                else:
-                    print(f"  Erro HTTP {response.status_code} com {modelo}: {response.text}")
-                    # Se for 404, provavelmente o modelo não está disponível
-                    if response.status_code == 404:
-                        print(f"  Modelo {modelo} não disponível, tentando próximo...")
-                    continue
-            except requests.exceptions.RequestException as e:
-                print(f"  Erro de conexão com {modelo}: {e}")
-                continue
-            except Exception as e:
-                print(f"  Erro inesperado com {modelo}: {e}")
-                continue
+        for modelo in restantes:
+            dados_extraidos = consultar(modelo)
+            if dados_extraidos is not None:
+                return dados_extraidos
         
         # Se chegou aqui, nenhum modelo funcionou
         print("  ❌ Todos os modelos falharam. Retornando resultado vazio.")
         return self._criar_resultado_vazio()
+
+    def _consultar_com_hedge(self, principal, reserva, consultar):
+        """Envia ao modelo principal e, se ele passar do p95 da sua latência, também ao reserva.
+
+        O p95 conta a partir do envio de fato (depois do limitador e do
+        semáforo), e o hedge só sai se houver vaga livre no semáforo; sem
+        vaga, espera o principal. Devolve o primeiro JSON válido que chegar
+        (ou None se os dois falharem) e cancela a requisição perdedora: ela
+        não tenta de novo e, com streaming, o stream é fechado na hora.
+        """
+        atraso = self.roteador.atraso_hedge(principal)
+        estado_principal = EstadoConsulta()
+        futuro_principal = self._executor_hedge.submit(consultar, principal, estado_principal)
+        # Fila local (limitador, semáforo, Retry-After) não conta para o p95
+        while not estado_principal.enviada.wait(0.05) and not futuro_principal.done():
+            pass
+        try:
+            dados_extraidos = futuro_principal.result(timeout=atraso)
+        except FuturesTimeout:
+            dados_extraidos = None
+        else:
+            if dados_extraidos is not None:
+                return dados_extraidos
+            # O principal falhou antes do p95: o reserva entra como tentativa comum
+            return consultar(reserva)
+
+        if not self._reservar_hedge():
+            # Semáforo cheio: a cópia só entraria na mesma fila e atrasaria as outras páginas
+            dados_extraidos = futuro_principal.result()
+            return dados_extraidos if dados_extraidos is not None else consultar(reserva)
+
+        print(f"  🪁 {principal} passou de {atraso:.1f}s; enviando também para {reserva}")
+        estado_reserva = EstadoConsulta()
+        futuro_reserva = self._executor_hedge.submit(consultar, reserva, estado_reserva)
+        futuro_reserva.add_done_callback(lambda _: self._liberar_hedge())
+        estados = {futuro_principal: estado_principal, futuro_reserva: estado_reserva}
+        pendentes = set(estados)
+        while pendentes:
+            concluidos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in concluidos:
+                dados_extraidos = futuro.result()
+                if dados_extraidos is not None:
+                    for perdedor in pendentes:
+                        estados[perdedor].cancelada.set()
+                    self.roteador.registrar_hedge(venceu=futuro is futuro_reserva)
+                    return dados_extraidos
+        self.roteador.registrar_hedge(venceu=False)
+        return None
+
+    def _reservar_hedge(self) -> bool:
+        """Reserva uma vaga livre do semáforo para um hedge (False se todas estiverem ocupadas)"""
+        with self._lock_vagas:
+            if self._em_voo + self._hedges_ativos >= self._vagas:
+                return False
+            self._hedges_ativos += 1
+            return True
+
+    def _liberar_hedge(self):
+        with self._lock_vagas:
+            self._hedges_ativos -= 1
+
+    def _consultar_modelo(self, modelo, content_items, temperatura, n_imagens, tamanho_imagens,
+                          chaves_cache, campos=None, uso=None, estado: Optional[EstadoConsulta] = None):
+        """Envia a requisição a um modelo; devolve o JSON extraído ou None se o modelo falhar.
+
+        O roteador recebe a latência HTTP da última tentativa (estado.latencia);
+        consultas cortadas pelo hedge ou sem nenhuma resposta não entram nas
+        métricas.
+        """
+        estado = estado or EstadoConsulta()
+        dados_extraidos = None
+        try:
+            dados_extraidos = self._requisitar_modelo(modelo, content_items, temperatura, n_imagens,
+                                                      tamanho_imagens, chaves_cache, uso, estado)
+            return dados_extraidos
+        finally:
+            if self.roteador is not None and estado.latencia is not None:
+                preenchimento = None
+                if isinstance(dados_extraidos, dict):
+                    pedidos = campos or CAMPOS
+                    preenchidos = sum(1 for campo in pedidos if dados_extraidos.get(campo) not in (None, '', 'null'))
+                    preenchimento = preenchidos / len(pedidos)
+                self.roteador.registrar(modelo, estado.latencia, isinstance(dados_extraidos, dict), preenchimento)
+
+    def _requisitar_modelo(self, modelo, content_items, temperatura, n_imagens, tamanho_imagens, chaves_cache,
+                           uso=None, estado: Optional[EstadoConsulta] = None):
+        """Monta o payload, envia e recorta o JSON da resposta (None em qualquer falha)"""
+        try:
+            # Payload para a API
+            payload = {
+                "model": modelo,
+                "messages": [
+                    {
+                        "role": "user",
+                        "content": content_items
+                    }
+                ],
+                "max_tokens": 1500,
+                "temperature": temperatura
+            }
+
+            print(f"  Enviando {n_imagens} imagem(ns) para OpenRouter ({modelo},"
+                  f" {tamanho_imagens / 1024:.0f} KB em {self.codificacao})...")
+            response = self._postar_com_retentativas(payload, modelo, estado)
+            if response is None:
+                print(f"  ⏹️  Requisição a {modelo} cancelada (o hedge já respondeu)")
+                return None
+
+            if response.status_code == 200:
+                data = response.json()
+                self._registrar_uso(data.get('usage'), uso)
+                if 'choices' in data and len(data['choices']) > 0:
+                    content = data['choices'][0]['message']['content']
+                    print(f"  Resposta da API recebida com sucesso usando {modelo}!")
+
+                    # Busca por JSON na resposta
+                    json_start = content.find('{')
+                    json_end = content.rfind('}') + 1
+
+                    if json_start != -1 and json_end != -1:
+                        json_str = content[json_start:json_end]
+                        try:
+                            dados_extraidos = json.loads(json_str)
+                            if modelo in chaves_cache:
+                                self.cache.salvar(chaves_cache[modelo], dados_extraidos)
+                            return dados_extraidos
+                        except json.JSONDecodeError as e:
+                            print(f"  Erro ao decodificar JSON: {e}")
+                            return None
+                    else:
+                        print(f"  Não foi encontrado JSON válido na resposta")
+                        return None
+                else:
+                    print(f"  Resposta sem choices válidos")
+                    return None
+            else:
+                print(f"  Erro HTTP {response.status_code} com {modelo}: {response.text}")
+                # Se for 404, provavelmente o modelo não está disponível
+                if response.status_code == 404:
+                    print(f"  Modelo {modelo} não disponível, tentando próximo...")
+                return None
+        except requests.exceptions.RequestException as e:
+            print(f"  Erro de conexão com {modelo}: {e}")
+            return None
+        except Exception as e:
+            print(f"  Erro inesperado com {modelo}: {e}")
+            return None
     
+    def _postar_com_retentativas(self, payload, modelo, estado: Optional[EstadoConsulta] = None):
+        """Envia a requisição respeitando o limitador de taxa, com backoff em 429/5xx/erros de conexão.
+
+        429 usa o Retry-After do servidor quando presente (pausando todos os
+        workers); caso contrário, e para 5xx e falhas de conexão, espera um
+        backoff exponencial com jitter. Só respostas 2xx sobem a taxa; os
+        demais 4xx a deixam como está. Devolve a última resposta obtida ou
+        relança o erro de conexão quando as tentativas acabam.
+
+        Com um `estado`, marca o envio, mede a ida e volta HTTP de cada
+        tentativa e devolve None assim que ele for cancelado (sem novas
+        tentativas nem espera por vaga no semáforo).
+        """
+        estado = estado or EstadoConsulta()
+        cliente = self.cliente_streaming or self.sessao
+        extras = {'cancelamento': estado.cancelada} if self.cliente_streaming is not None else {}
+        for tentativa in range(self.max_tentativas + 1):
+            ultima = tentativa == self.max_tentativas
+            if estado.cancelada.is_set():
+                return None
+            self.limitador.adquirir()
+            if not self._ocupar_vaga(estado):
+                return None
+            try:
+                estado.enviada.set()
+                inicio = time.perf_counter()
+                response = cliente.post(self.base_url, headers=self.headers, json=payload, timeout=90, **extras)
+                estado.latencia = time.perf_counter() - inicio
+            except requests.exceptions.RequestException as e:
+                if estado.cancelada.is_set():
+                    estado.latencia = None
+                    return None
+                if ultima:
+                    raise
+                espera = calcular_espera(tentativa)
+                print(f"  🔁 Erro de conexão com {modelo} ({e}); nova tentativa em {espera:.1f}s")
+                estado.cancelada.wait(espera)
+                continue
+            finally:
+                self._liberar_vaga()
+
+            self._registrar_tempos(response.tempos)
+
+            if response.status_code == 429:
+                retry_after = interpretar_retry_after(response.headers.get('Retry-After'))
+                self.limitador.registrar_limite(retry_after)
+                if not ultima:
+                    # O jitter sobre o Retry-After evita que todos os workers voltem no mesmo instante
+                    if retry_after is not None:
+                        espera = retry_after + calcular_espera(tentativa, base=0.5)
+                    else:
+                        espera = calcular_espera(tentativa)
+                    print(f"  🚦 HTTP 429 com {modelo}; nova tentativa em {espera:.1f}s")
+                    estado.cancelada.wait(espera)
+                    continue
+            elif response.status_code >= 500:
+                self.limitador.registrar_erro_servidor()
+                if not ultima:
+                    espera = calcular_espera(tentativa)
+                    print(f"  🔁 HTTP {response.status_code} com {modelo}; nova tentativa em {espera:.1f}s")
+                    estado.cancelada.wait(espera)
+                    continue
+            elif 200 <= response.status_code < 300:
+                self.limitador.registrar_sucesso(response.headers)
+            # Demais 4xx (400/401/402/404...) são recusas do pedido, não sinal de capacidade: taxa inalterada
+
+            return response
+
+    def _ocupar_vaga(self, estado):
+        """Entra no semáforo de requisições; False se o estado for cancelado durante a espera"""
+        while not self._semaforo_requisicoes.acquire(timeout=0.05):
+            if estado.cancelada.is_set():
+                return False
+        with self._lock_vagas:
+            self._em_voo += 1
+        return True
+
+    def _liberar_vaga(self):
+        with self._lock_vagas:
+            self._em_voo -= 1
+        self._semaforo_requisicoes.release()
+
+    def _registrar_uso(self, usage, uso=None):
+        """Soma os tokens de uma resposta (campo 'usage') ao total e ao contador `uso`, se houver"""
+        contagem = Counter(requisicoes=1)
+        if usage:
+            contagem['entrada'] = usage.get('prompt_tokens') or 0
+            contagem['saida'] = usage.get('completion_tokens') or 0
+            contagem['cache'] = (usage.get('prompt_tokens_details') or {}).get('cached_tokens') or 0
+        else:
+            # Ex.: stream encerrado antes do último evento, que é o que traz o usage
+            contagem['sem_uso'] = 1
+        with self._lock_tempos:
+            self.uso_tokens.update(contagem)
+            if uso is not None:
+                uso.update(contagem)
+
+    def _registrar_tempos(self, tempos):
+        """Guarda e exibe os tempos (conexão, TTFB, total) de uma requisição"""
+        with self._lock_tempos:
+            self.tempos_requisicoes.append(tempos)
+        print(f"  ⏱️  conexão {tempos['conexao'] * 1000:.0f} ms | TTFB {tempos['ttfb'] * 1000:.0f} ms"
+              f" | total {tempos['total'] * 1000:.0f} ms")
+
+    def exibir_resumo_tempos(self):
+        """Resume quanto da latência das requisições foi gasto em handshakes"""
+        with self._lock_tempos:
+            tempos = list(self.tempos_requisicoes)
+        if not tempos:
+            return
+
+        total = sum(t['total'] for t in tempos)
+        conexao = sum(t['conexao'] for t in tempos)
+        novas = sum(1 for t in tempos if t['conexao'] > 0)
+        print(f"\n⏱️  TEMPOS DE REDE ({len(tempos)} requisições, {novas} conexão(ões) nova(s))")
+        print(f"   • Média total: {total / len(tempos) * 1000:.0f} ms")
+        print(f"   • Média TTFB: {sum(t['ttfb'] for t in tempos) / len(tempos) * 1000:.0f} ms")
+        print(f"   • Handshake (TCP+TLS): {conexao * 1000:.0f} ms"
+              f" ({(conexao / total * 100) if total else 0:.1f}% do tempo total)")
+        if self.cliente_streaming is not None:
+            print(f"   • Streaming: {self.cliente_streaming.respostas_antecipadas} resposta(s) encerrada(s) ao fechar"
+                  f" o JSON, {self.cliente_streaming.respostas_canceladas} cancelada(s) por excesso de tokens")
+        if self.imagens_enviadas:
+            print(f"   • Imagens enviadas: {self.imagens_enviadas} ({self.codificacao}),"
+                  f" {self.bytes_imagens / 1024:.0f} KB, média {self.bytes_imagens / self.imagens_enviadas / 1024:.1f} KB")
+
+    def exibir_resumo_tokens(self):
+        """Tokens de entrada/saída gastos no lote, por página e quanto da entrada veio do cache de prompt"""
+        with self._lock_tempos:
+            uso = Counter(self.uso_tokens)
+            paginas = self.paginas_consultadas
+        if not uso['requisicoes']:
+            return
+        print(f"\n🔢 TOKENS ({uso['requisicoes']} requisição(ões), {paginas} página(s) com requisições)")
+        print(f"   • Entrada: {uso['entrada']} ({uso['cache']} do cache de prompt,"
+              f" {(uso['cache'] / uso['entrada'] * 100) if uso['entrada'] else 0:.1f}%)")
+        print(f"   • Saída: {uso['saida']}")
+        if paginas:
+            print(f"   • Média por página: {uso['entrada'] / paginas:.0f} de entrada, {uso['saida'] / paginas:.0f} de saída")
+        if uso['sem_uso']:
+            aviso = " (--streaming-antecipado não espera o uso)" if self.cliente_streaming and \
+                not self.cliente_streaming.aguardar_uso else ""
+            print(f"   • {uso['sem_uso']} resposta(s) sem 'usage' (não contadas){aviso}")
+
+    def exibir_resumo_origens(self):
+        """Resume de onde vieram os campos preenchidos e quantas requisições a camada de texto evitou"""
+        with self._lock_origens:
+            origens = dict(self.origens)
+            evitadas = self.requisicoes_evitadas
+        if not origens:
+            return
+        print(f"\n📝 ORIGEM DOS CAMPOS: {origens.get('texto', 0)} da camada de texto,"
+              f" {origens.get('ocr', 0)} do OCR local, {origens.get('visao', 0)} da visão")
+        if self.motor_extracao != 'visao':
+            print(f"   • Regiões resolvidas pelo OCR local: {self.regioes_ocr}")
+        print(f"   • Requisições à API evitadas: {evitadas}")
+        if self.reconsultas:
+            print(f"   • Reconsultas: {self.reconsultas} requisição(ões) para {self.campos_reconsultados}"
+                  f" campo(s) de baixa confiança, {self.campos_corrigidos} corrigido(s)")
+
     def _criar_resultado_vazio(self):
         """Cria um dicionário com todos os campos como None"""
         return {
@@ -245,11 +782,14 @@ class OpenRouterExtractor:
             'modelo_veiculo': None,
         }
 
-    def _normalizar_valor(self, valor):
+    @staticmethod
+    def _normalizar_valor(valor, campo=None):
         """Normaliza strings numéricas para uma forma consistente (usa ponto como separador decimal).
 
         - Se receber None, retorna None
         - Remove espaços
+        - Se `campo` for informado, valores já no formato do tipo do campo
+          (TIPOS_CAMPOS) são convertidos direto pela tabela REGRAS_NORMALIZACAO
         - Se tiver ponto e vírgula como separadores (ex: '1.234,56'), transforma em '1234.56'
         - Se tiver apenas vírgula como separador decimal, troca por ponto
         - Remove caracteres indesejados
@@ -269,39 +809,231 @@ class OpenRouterExtractor:
         # Remove espaços e caracteres invisíveis
         s = s.replace('\u00a0', '').replace('\n', ' ').strip()
 
+        # Caminho rápido: valor já no formato esperado para o tipo do campo
+        for padrao, converter in REGRAS_NORMALIZACAO.get(TIPOS_CAMPOS.get(campo), ()):
+            if padrao.fullmatch(s):
+                if converter is None:
+                    return s
+                convertido = converter(s)
+                if convertido is not None:
+                    return convertido
+
         # Caso contenha letras:
         # - Se contém apenas letras (ex.: 'AMB RENAULT'), retorna em maiúsculas
         # - Se contém letras e dígitos (ex.: placas como 'FEI6365'), preserva e retorna em maiúsculas
-        if any(c.isalpha() for c in s):
-            if re.search(r'\d', s):
+        if PADRAO_TEM_LETRA.search(s):
+            if PADRAO_TEM_DIGITO.search(s):
                 # Letras e dígitos: mantém caracteres alfanuméricos e símbolos úteis
-                s_clean = re.sub(r'[^A-Za-z0-9\- ]', '', s)
-                return s_clean.upper().strip()
-            else:
-                return s.upper()
+                return PADRAO_NAO_ALFANUMERICO.sub('', s).upper().strip()
+            return s.upper()
 
         # Normaliza números com milhares e decimais
         # Ex: '1.234,56' -> '1234.56'; '134,58' -> '134.58'; '22,850' -> '22.850' (ambíguo) -> treat comma as decimal
         # Se houver tanto '.' quanto ',', assume '.' é separador de milhares e ',' decimal
-        try:
-            if '.' in s and ',' in s:
-                s2 = s.replace('.', '').replace(',', '.')
-            elif ',' in s and '.' not in s:
-                s2 = s.replace(',', '.')
+        if ',' in s:
+            s = _decimal_br(s)
+
+        # Remove quaisquer caracteres que não sejam dígitos, ponto, ou sinal
+        s = PADRAO_NAO_NUMERICO.sub('', s)
+
+        # Evita strings vazias
+        if s == '' or s == '.' or s == '-':
+            return None
+        return s
+
+    def _mesclar_resultados(self, resultados_finais, dados, candidatos=None):
+        """Incorpora uma resposta da API ao resultado da página (o primeiro valor não-nulo vence).
+
+        Se `candidatos` for informado, cada valor recebido é anotado em
+        candidatos[campo], mesmo quando não vence (usado na confiança por campo).
+        """
+        for campo, valor in dados.items():
+            # Normaliza chaves e valores
+            chave = campo if isinstance(campo, str) else str(campo)
+            # Ignora valores vazios ou 'null'
+            if valor is None or (isinstance(valor, str) and valor.strip().lower() == 'null'):
+                continue
+
+            # Normaliza o valor (numéricos e strings)
+            try:
+                valor_norm = self._normalizar_valor(valor, chave)
+            except Exception:
+                valor_norm = valor
+
+            if candidatos is not None:
+                candidatos.setdefault(chave, []).append(valor_norm)
+
+            # Se a chave já existe no resultado final, prioriza o primeiro valor não-nulo
+            if chave in resultados_finais:
+                if resultados_finais[chave] is None:
+                    resultados_finais[chave] = valor_norm
+                    print(f"    ✅ {chave}: {valor_norm}")
             else:
-                s2 = s
+                # Aceita chaves extras (por exemplo hora_documento) e adiciona ao dicionário
+                resultados_finais[chave] = valor_norm
+                print(f"    ℹ️  Chave adicional encontrada e salva: {chave}: {valor_norm}")
 
-            # Remove quaisquer caracteres que não sejam dígitos, ponto, ou sinal
-            s2 = re.sub(r'[^0-9\.-]', '', s2)
+    @staticmethod
+    def _marcar_origem(resultados, origens, etapa):
+        """Anota `etapa` como origem dos campos que acabaram de ser preenchidos"""
+        for chave, valor in resultados.items():
+            if chave in CAMPOS_CSV and valor is not None and chave not in origens:
+                origens[chave] = etapa
 
-            # Evita strings vazias
-            if s2 == '' or s2 == '.' or s2 == '-':
-                return None
+    @staticmethod
+    def _regiao_pendente(modelo, label, resultados) -> bool:
+        """True se a região ainda tem campo sem valor (regiões sem campos mapeados sempre são enviadas)"""
+        campos = modelo.campos.get(label)
+        return not campos or any(resultados.get(campo) is None for campo in campos)
+
+    @staticmethod
+    def _candidatos_validos(campo, candidatos):
+        """Valores recebidos para o campo que passam no validador (respostas inválidas não contam como divergência)"""
+        return [valor for valor in candidatos.get(campo, ()) if validar_campo(campo, valor)]
+
+    def _preferir_candidatos_validos(self, resultados, candidatos):
+        """Troca um valor inválido pelo candidato válido mais frequente entre as respostas, se houver"""
+        for campo in self._criar_resultado_vazio():
+            if validar_campo(campo, resultados.get(campo)):
+                continue
+            validos = self._candidatos_validos(campo, candidatos)
+            if validos:
+                resultados[campo] = max(validos, key=validos.count)
+
+    def _avaliar_confianca(self, resultados, origens, candidatos, confiancas_ocr=None):
+        """Confiança (0 a 1) de cada campo: validador, origem e concordância entre as respostas.
+
+        Campos lidos pelo OCR local partem da confiança do Tesseract (confiancas_ocr).
+        """
+        validos = validar_resultado(resultados)
+        confiancas_ocr = confiancas_ocr or {}
+        return {
+            campo: calcular_confianca(resultados.get(campo), validos[campo], origens.get(campo, 'visao'),
+                                      self._candidatos_validos(campo, candidatos), confiancas_ocr.get(campo))
+            for campo in self._criar_resultado_vazio()
+        }
+
+    def _etapa_ocr(self, modelo, labels, regioes, resultados, origens, candidatos, confiancas_ocr):
+        """OCR local nos recortes pendentes; devolve (labels, recortes) que ainda precisam da visão.
+
+        Só os campos aprovados no validador e com confiança do Tesseract acima
+        de limiar_ocr são aceitos. Regiões sem campos mapeados no modelo não
+        passam pelo OCR (não há como saber se ficaram resolvidas).
+        """
+        restantes = []
+        for label, segmento in zip(labels, regioes):
+            campos = modelo.campos.get(label)
+            if not campos:
+                restantes.append((label, segmento))
+                continue
+            try:
+                aceitos, confiancas = extrair_campos_ocr(segmento, campos, escala=1 / ZOOM_REGIOES,
+                                                         limiar=self.limiar_ocr)
+            except Exception as e:
+                print(f"  ⚠️  OCR local falhou na região '{label}': {e}")
+                aceitos, confiancas = {}, {}
+            novos = [campo for campo in aceitos if resultados.get(campo) is None]
+            if novos:
+                print(f"  🔡 OCR local na região '{label}': {', '.join(novos)}")
+                self._mesclar_resultados(resultados, {campo: aceitos[campo] for campo in novos}, candidatos)
+                self._marcar_origem(resultados, origens, 'ocr')
+                confiancas_ocr.update((campo, confiancas[campo]) for campo in novos)
+            if self._regiao_pendente(modelo, label, resultados):
+                restantes.append((label, segmento))
+
+        resolvidas = len(labels) - len(restantes)
+        with self._lock_origens:
+            self.regioes_ocr += resolvidas
+            if self.motor_extracao != 'ocr':
+                self.requisicoes_evitadas += resolvidas if self.modo_lote == 'regiao' else int(not restantes)
+        if resolvidas:
+            print(f"  ⏭️  {resolvidas} região(ões) resolvida(s) pelo OCR local")
+        return [label for label, _ in restantes], [segmento for _, segmento in restantes]
+
+    def _campos_regioes(self, modelo, labels):
+        """Campos a pedir no prompt para estes recortes (None = todos, ex.: região sem campos declarados)"""
+        if not self.prompt_especializado or any(label not in modelo.campos for label in labels):
+            return None
+        return campos_pedidos([campo for label in labels for campo in modelo.campos[label]])
+
+    def _resumir_uso_pagina(self, numero, uso, reconsulta=False):
+        """Exibe e devolve os tokens gastos em uma página (ou na reconsulta, atribuída à página 1)"""
+        resumo = {'pagina': numero, 'requisicoes': uso['requisicoes'], 'entrada': uso['entrada'],
+                  'cache': uso['cache'], 'saida': uso['saida']}
+        if reconsulta:
+            resumo['reconsulta'] = True
+        elif uso['requisicoes']:
+            with self._lock_tempos:
+                self.paginas_consultadas += 1
+        etapa = "reconsulta" if reconsulta else f"página {numero}"
+        print(f"  🔢 Tokens ({etapa}): {uso['entrada']} entrada ({uso['cache']} do cache de prompt),"
+              f" {uso['saida']} saída em {uso['requisicoes']} requisição(ões)")
+        return resumo
+
+    @staticmethod
+    def _menor_regiao(modelo, campo):
+        """Label da menor região do modelo que contém o campo (None se nenhuma o declara)"""
+        areas = {label: (x1 - x0) * (y1 - y0) for label, (x0, y0, x1, y1) in modelo.regioes}
+        labels = [label for label, campos in modelo.campos.items() if campo in campos and label in areas]
+        return min(labels, key=areas.get) if labels else None
+
+    def _reconsultar_campos(self, pagina, modelo, resultados, origens, candidatos, confiancas, uso=None,
+                            confiancas_ocr=None):
+        """Segunda passada: reenvia só o menor recorte de cada campo abaixo do limiar de confiança.
+
+        Usa a página e o modelo de regiões indicados (a primeira página do PDF).
+        Campos da mesma região vão juntos em uma requisição cujo prompt pede
+        apenas esses campos (opcionalmente a outro modelo). O novo valor só
+        substitui o atual se ficar com confiança maior. Devolve as confianças
+        recalculadas.
+        """
+        fracos = [campo for campo, confianca in confiancas.items() if confianca < self.limiar_confianca]
+        if not fracos:
+            return confiancas
+        confiancas_ocr = confiancas_ocr or {}
+
+        grupos = {}
+        for campo in fracos:
+            label = self._menor_regiao(modelo, campo)
+            if label is not None:
+                grupos.setdefault(label, []).append(campo)
+
+        modelos_visao = [self.modelo_reconsulta] if self.modelo_reconsulta else None
+        corrigidos = 0
+        for label, campos in grupos.items():
+            print(f"  🎯 Reconsulta de {', '.join(campos)} (confiança baixa) na região '{label}'...")
+            recorte, = self.recortar_regioes_pagina(pagina, modelo, labels=[label])
+            dados = self.extrair_dados_com_openrouter(recorte, campos=campos, modelos=modelos_visao, uso=uso)
+
+            for campo in campos:
+                valor = dados.get(campo)
+                if valor is None or (isinstance(valor, str) and valor.strip().lower() == 'null'):
+                    continue
+                try:
+                    valor = self._normalizar_valor(valor, campo)
+                except Exception:
+                    pass
+                candidatos.setdefault(campo, []).append(valor)
+
+                atual = resultados.get(campo)
+                validos = self._candidatos_validos(campo, candidatos)
+                confianca_atual = calcular_confianca(atual, validar_resultado(resultados)[campo],
+                                                     origens.get(campo, 'visao'), validos, confiancas_ocr.get(campo))
+                confianca_nova = calcular_confianca(valor, validar_resultado({**resultados, campo: valor})[campo],
+                                                    'reconsulta', validos)
+                if confianca_nova > confianca_atual:
+                    if valor != atual:
+                        corrigidos += 1
+                        print(f"    🔁 {campo}: {atual} -> {valor}")
+                    resultados[campo] = valor
+                    origens[campo] = 'reconsulta'
+
+        with self._lock_origens:
+            self.reconsultas += len(grupos)
+            self.campos_reconsultados += sum(len(campos) for campos in grupos.values())
+            self.campos_corrigidos += corrigidos
+        return self._avaliar_confianca(resultados, origens, candidatos, confiancas_ocr)
 
-            return s2
-        except Exception:
-            return s
-    
     def processar_pdf(self, caminho_pdf):
         """
         Processa um PDF e extrai dados usando OpenRouter
@@ -321,57 +1053,93 @@ class OpenRouterExtractor:
             
             # Processa cada página
             resultados_finais = self._criar_resultado_vazio()
+            origens = {}  # campo -> etapa que forneceu o valor
+            candidatos = {}  # campo -> todos os valores recebidos (concordância entre respostas)
+            tokens_paginas = []  # tokens gastos em cada página que foi à API
+            confiancas_ocr = {}  # campo -> confiança do Tesseract, para os campos lidos pelo OCR local
             
             for i in range(documento.page_count):
                 print(f"📑 Processando página {i+1}/{documento.page_count}...")
                 
-                # Converte página para imagem
                 pagina = documento[i]
-                matriz = fitz.Matrix(2.0, 2.0)  # Alta resolução
-                pix = pagina.get_pixmap(matrix=matriz)
-                img_data = pix.tobytes("ppm")
-                img_original = Image.open(io.BytesIO(img_data))
-                
-                print(f"  📐 Imagem original: {img_original.size}")
+                print(f"  📐 Imagem original: {tamanho_renderizado(pagina, zoom=ZOOM_REGIOES)}")
                 
-                # Recorta regiões fixas onde os campos normalmente aparecem
-                regioes = self.recortar_regioes_fixas(img_original)
-
-                labels = ['numero_documento', 'data_hora', 'corpo_doc', 'placa_km_modelo']
-
-                # Processa cada região recortada
-                for idx_reg, segmento in enumerate(regioes):
-                    label = labels[idx_reg] if idx_reg < len(labels) else f"regiao_{idx_reg}"
-                    print(f"  🔍 Analisando região '{label}' (índice {idx_reg})...")
-                    
-                    # Extrai dados da região usando OpenRouter
-                    dados_segmento = self.extrair_dados_com_openrouter(segmento)
-                    
-                    # Combina resultados (prioriza dados não-nulos)
-                    for campo, valor in dados_segmento.items():
-                        # Normaliza chaves e valores
-                        chave = campo if isinstance(campo, str) else str(campo)
-                        # Ignora valores vazios ou 'null'
-                        if valor is None or (isinstance(valor, str) and valor.strip().lower() == 'null'):
-                            continue
-
-                        # Normaliza o valor (numéricos e strings)
-                        try:
-                            valor_norm = self._normalizar_valor(valor)
-                        except Exception:
-                            valor_norm = valor
-
-                        # Se a chave já existe no resultado final, prioriza o primeiro valor não-nulo
-                        if chave in resultados_finais:
-                            if resultados_finais[chave] is None:
-                                resultados_finais[chave] = valor_norm
-                                print(f"    ✅ {chave}: {valor_norm}")
-                        else:
-                            # Aceita chaves extras (por exemplo hora_documento) e adiciona ao dicionário
-                            resultados_finais[chave] = valor_norm
-                            print(f"    ℹ️  Chave adicional encontrada e salva: {chave}: {valor_norm}")
+                # Escolhe o layout antes de qualquer requisição
+                modelo = self.modelos.detectar(pagina)
+                print(f"  🧩 Modelo de regiões: {modelo.nome}")
+                labels = modelo.labels
+                if i == 0:
+                    modelo_primeira_pagina = modelo
+
+                # 1ª etapa: camada de texto nativa (PDFs gerados digitalmente), sem rede
+                if self.usar_camada_texto:
+                    campos_texto = extrair_campos_texto(pagina, modelo)
+                    if campos_texto:
+                        print(f"  📝 Camada de texto: {len(campos_texto)} campo(s) resolvido(s)")
+                        self._mesclar_resultados(resultados_finais, campos_texto, candidatos)
+                        self._marcar_origem(resultados_finais, origens, 'texto')
+
+                # 2ª etapa: OCR local e 3ª etapa: visão, apenas para as regiões com algum campo ainda não resolvido
+                pendentes = [label for label in labels if self._regiao_pendente(modelo, label, resultados_finais)]
+                if len(pendentes) < len(labels):
+                    evitadas = (len(labels) - len(pendentes)) if self.modo_lote == 'regiao' else int(not pendentes)
+                    with self._lock_origens:
+                        self.requisicoes_evitadas += evitadas
+                    print(f"  ⏭️  {len(labels) - len(pendentes)} região(ões) já resolvida(s) pela camada de texto")
+                if not pendentes:
+                    continue
+
+                # Rasteriza apenas as regiões pendentes
+                regioes = self.recortar_regioes_pagina(pagina, modelo, labels=pendentes)
+                if self.motor_extracao != 'visao':
+                    pendentes, regioes = self._etapa_ocr(modelo, pendentes, regioes, resultados_finais, origens,
+                                                         candidatos, confiancas_ocr)
+                    if not pendentes or self.motor_extracao == 'ocr':
+                        continue
+                uso_pagina = Counter()
+
+                if self.modo_lote == 'pagina':
+                    # Envia TODAS as regiões em UMA única requisição (etiquetando cada imagem)
+                    labeled_images = list(zip(pendentes, regioes))
+                    print(f"  🔍 Analisando {len(labeled_images)} regiões em uma única requisição...")
+                    dados_pagina = self.extrair_dados_com_openrouter(
+                        labeled_images, campos=self._campos_regioes(modelo, pendentes), uso=uso_pagina)
+                    self._mesclar_resultados(resultados_finais, dados_pagina, candidatos)
+                    self._marcar_origem(resultados_finais, origens, 'visao')
+                else:
+                    # Processa cada região recortada
+                    for label, segmento in zip(pendentes, regioes):
+                        print(f"  🔍 Analisando região '{label}' (índice {labels.index(label)})...")
+
+                        # Extrai dados da região usando OpenRouter (o prompt pede só os campos da região)
+                        dados_segmento = self.extrair_dados_com_openrouter(
+                            segmento, campos=self._campos_regioes(modelo, [label]), uso=uso_pagina)
+
+                        # Combina resultados (prioriza dados não-nulos)
+                        self._mesclar_resultados(resultados_finais, dados_segmento, candidatos)
+                        self._marcar_origem(resultados_finais, origens, 'visao')
+
+                tokens_paginas.append(self._resumir_uso_pagina(i + 1, uso_pagina))
+            
+            # Confiança por campo e segunda passada só para os campos fracos
+            self._preferir_candidatos_validos(resultados_finais, candidatos)
+            confiancas = self._avaliar_confianca(resultados_finais, origens, candidatos, confiancas_ocr)
+            if self.reconsultar and self.motor_extracao != 'ocr' and documento.page_count:
+                uso_reconsulta = Counter()
+                confiancas = self._reconsultar_campos(documento[0], modelo_primeira_pagina, resultados_finais,
+                                                      origens, candidatos, confiancas, uso=uso_reconsulta,
+                                                      confiancas_ocr=confiancas_ocr)
+                if uso_reconsulta:
+                    tokens_paginas.append(self._resumir_uso_pagina(1, uso_reconsulta, reconsulta=True))
             
             documento.close()
+            with self._lock_origens:
+                self.origens.update(origens.values())
+            if origens:
+                resultados_finais['origem_campos'] = origens
+            resultados_finais['confianca_campos'] = confiancas
+            if tokens_paginas:
+                resultados_finais['tokens_paginas'] = tokens_paginas
             return resultados_finais
             
         except Exception as e:
@@ -399,10 +1167,15 @@ class OpenRouterExtractor:
         dados_encontrados = []
         dados_nao_encontrados = []
 
+        origens = dados.get('origem_campos') or {}
+        confiancas = dados.get('confianca_campos') or {}
         for campo, nome_exibicao in campos_nomes.items():
             valor = dados.get(campo)
             if valor is not None and str(valor).strip() and str(valor).lower() != 'null':
-                print(f"✅ {nome_exibicao}: {valor}")
+                origem = f" ({origens[campo]})" if campo in origens else ""
+                if campo in confiancas:
+                    origem += f" [confiança {confiancas[campo]:.2f}]"
+                print(f"✅ {nome_exibicao}: {valor}{origem}")
                 dados_encontrados.append(nome_exibicao)
             else:
                 print(f"❌ {nome_exibicao}: Não encontrado")
@@ -411,98 +1184,291 @@ class OpenRouterExtractor:
         total_campos = len(campos_nomes)
         encontrados = len(dados_encontrados)
         print(f"\n📊 RESUMO: {encontrados}/{total_campos} campos extraídos")
-        if dados_nao_encontrados:
-            print(f"⚠️  Campos não encontrados: {', '.join(dados_nao_encontrados)}")
-
-        campos_nomes = {
-                'data_documento': 'Data do Documento',
-                'hora_documento': 'Hora do Documento',
-                'tipo_combustível': 'Tipo de Combustível',
-                'quantidade': 'Quantidade',
-                'valor_unitario': 'Valor Unitário',
-                'valor_total': 'Valor Total',
-                'numero_documento': 'Número do Documento',
-                'placa': 'Placa',
-                'km': 'KM',
-                'modelo_veiculo': 'Modelo do Veículo'
-            }
-        
-        print(f"\n📋 RESULTADOS PARA: {arquivo}")
-        print("=" * 60)
-        
-        dados_encontrados = []
-        dados_nao_encontrados = []
-        
-        for campo, nome_exibicao in campos_nomes.items():
-            valor = dados[campo]
-            if valor is not None and valor != "null" and str(valor).strip():
-                print(f"✅ {nome_exibicao}: {valor}")
-                dados_encontrados.append(nome_exibicao)
-            else:
-                print(f"❌ {nome_exibicao}: Não encontrado")
-                dados_nao_encontrados.append(nome_exibicao)
-        
-        # Resumo
-        total_campos = len(campos_nomes)
-        encontrados = len(dados_encontrados)
-        
-        print(f"\n📊 RESUMO: {encontrados}/{total_campos} campos extraídos")
-        
         if dados_nao_encontrados:
             print(f"⚠️  Campos não encontrados: {', '.join(dados_nao_encontrados)}")
 
         # Exibe alertas de incerteza
         self.exibir_alertas(dados, arquivo)
+
+    def exibir_alertas(self, dados, arquivo):
+        """Exibe avisos devolvidos pelo modelo (chaves fora do contrato, ex.: 'aviso')"""
+        campos_conhecidos = set(self._criar_resultado_vazio()) | set(CHAVES_METADADOS)
+        alertas = {k: v for k, v in dados.items() if k not in campos_conhecidos and v}
+
+        if alertas:
+            print(f"\n⚠️  ALERTAS PARA {arquivo} (confira o documento):")
+            for chave, valor in alertas.items():
+                print(f"   • {chave}: {valor}")
     
-    def processar_todos_pdfs(self, pasta="tests"):
-        """Processa todos os PDFs de uma pasta"""
+    def _processar_arquivo(self, pdf):
+        """Processa um único PDF do lote e anota o nome do arquivo no resultado"""
+        resultado = self.processar_pdf(pdf)
+        resultado['arquivo'] = pdf.name
+        return resultado
+
+    def _mapear_em_ordem(self, funcao, itens, workers=1):
+        """Aplica `funcao` aos itens com até `workers` threads, devolvendo na ordem de entrada.
+
+        No máximo 2x workers itens ficam em andamento/aguardando consumo, para que
+        lotes grandes não acumulem resultados em memória.
+        """
+        if workers <= 1:
+            for item in itens:
+                yield funcao(item)
+            return
+
+        self._dimensionar_hedge(workers)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            janela = deque()
+            for item in itens:
+                janela.append(executor.submit(funcao, item))
+                if len(janela) >= workers * 2:
+                    yield janela.popleft().result()
+            while janela:
+                yield janela.popleft().result()
+
+    def _iterar_resultados(self, arquivos_pdf, workers=1, diario: Optional[DiarioLote] = None, retomar=False):
+        """Gera (pdf, resultado, processado_agora) na ordem dos arquivos.
+
+        Com um diário, cada resultado é registrado assim que o PDF termina; com
+        retomar=True, PDFs cujo conteúdo já consta no diário não são reprocessados.
+        """
+        def tarefa(pdf):
+            hash_pdf = DiarioLote.hash_arquivo(pdf) if diario is not None else None
+            if retomar and diario.concluido(hash_pdf):
+                print(f"⏭️  {pdf.name}: já consta no diário, pulando")
+                resultado = diario.resultado(hash_pdf)
+                resultado['arquivo'] = pdf.name
+                return resultado, False
+
+            resultado = self._processar_arquivo(pdf)
+            if diario is not None:
+                diario.registrar(pdf.name, hash_pdf, resultado)
+            return resultado, True
+
+        for pdf, (resultado, novo) in zip(arquivos_pdf, self._mapear_em_ordem(tarefa, arquivos_pdf, workers)):
+            yield pdf, resultado, novo
+
+    def processar_todos_pdfs(self, pasta="tests", workers=1, arquivo_saida="dados_extraidos_grok.csv",
+                             diario: Optional[DiarioLote] = None, retomar=False, fsync=False):
+        """
+        Processa todos os PDFs de uma pasta
+
+        Mesmo processamento e mesmo CSV de gravar_todos_pdfs, mas também guarda
+        e devolve os resultados. Para lotes grandes, prefira gravar_todos_pdfs,
+        que não os mantém em memória.
+
+        Returns:
+            Lista com o resultado (dict) de cada arquivo, em ordem alfabética
+        """
+        resultados = []
+        self.gravar_todos_pdfs(pasta, workers, arquivo_saida, diario, retomar, fsync, ao_gravar=resultados.append)
+        return resultados
+
+    def gravar_todos_pdfs(self, pasta="tests", workers=1, arquivo_saida="dados_extraidos_grok.csv",
+                          diario: Optional[DiarioLote] = None, retomar=False, fsync=False, ao_gravar=None):
+        """
+        Processa todos os PDFs de uma pasta, gravando o CSV à medida que cada um termina
+
+        Args:
+            pasta: Pasta com os PDFs
+            workers: Quantos PDFs processar em paralelo (1 = sequencial). O número de
+                requisições simultâneas à API continua limitado por max_requisicoes.
+            arquivo_saida: Caminho do CSV de saída
+            diario: Diário do lote; cada PDF é registrado assim que termina
+            retomar: Pula os PDFs cujo conteúdo já está registrado no diário
+            fsync: Força cada linha do CSV no disco físico (além do flush)
+            ao_gravar: Função chamada com cada resultado logo depois de gravado
+
+        Returns:
+            Quantidade de linhas gravadas no CSV (uma por arquivo, em ordem alfabética).
+            Os resultados não ficam em memória.
+        """
         pasta_tests = Path(pasta)
         
         if not pasta_tests.exists():
             print(f"❌ Pasta '{pasta}' não encontrada!")
-            return []
+            return 0
         
-        arquivos_pdf = list(pasta_tests.glob("*.pdf"))
+        arquivos_pdf = sorted(pasta_tests.glob("*.pdf"))
         
         if not arquivos_pdf:
             print(f"❌ Nenhum arquivo PDF encontrado na pasta '{pasta}'!")
-            return []
+            return 0
         
         print(f"🎯 Encontrados {len(arquivos_pdf)} arquivo(s) PDF")
         print(f"🤖 Usando Grok Vision AI para extração de dados")
+        if workers > 1:
+            print(f"⚡ Modo concorrente: {workers} arquivo(s) em paralelo")
+        if retomar and diario is not None:
+            print(f"♻️  Retomando: {len(diario)} arquivo(s) no diário {diario.caminho}")
         
-        todos_resultados = []
+        # Grava cada resultado assim que o PDF termina (na ordem dos arquivos)
+        with EscritorCSV(arquivo_saida, fsync=fsync) as escritor:
+            for pdf, resultado, novo in self._iterar_resultados(arquivos_pdf, workers, diario, retomar):
+                escritor.escrever(resultado)
+                if ao_gravar is not None:
+                    ao_gravar(resultado)
+                if novo:
+                    self.exibir_resultados(resultado, pdf.name)
         
-        for pdf in arquivos_pdf:
-            resultado = self.processar_pdf(pdf)
-            resultado['arquivo'] = pdf.name
-            todos_resultados.append(resultado)
-            
-            self.exibir_resultados(resultado, pdf.name)
-        
-        # Salva resultados
-        if todos_resultados:
-            self.salvar_resultados(todos_resultados)
-        
-        return todos_resultados
-    
-    def salvar_resultados(self, resultados):
+        self.exibir_resumo_tempos()
+        if self.cache is not None:
+            self.cache.exibir_resumo()
+        self.modelos.exibir_resumo()
+        self.exibir_resumo_origens()
+        self.exibir_resumo_tokens()
+        if self.roteador is not None:
+            self.roteador.exibir_resumo()
+
+        print(f"\n💾 Resultados salvos em: {arquivo_saida}")
+        return escritor.linhas
+
+    def monitorar_pasta(self, pasta="tests", diario: DiarioLote = None, intervalo=5.0, workers=1,
+                        arquivo_saida="dados_extraidos_grok.csv"):
+        """Fica observando a pasta e processa apenas os PDFs novos (Ctrl+C para sair).
+
+        Um PDF é considerado novo quando seu hash não está no diário; ele só é
+        processado depois que o tamanho ficar estável entre duas verificações,
+        para não ler um arquivo que ainda está sendo copiado. O CSV é regravado
+        a partir do diário sempre que algo novo termina.
+
+        Cada PDF é enviado à API no máximo uma vez por monitoramento: um PDF
+        cujo registro não tem nenhum campo extraído não é reenviado a cada
+        volta; para tentar de novo, use --resume.
+        """
+        pasta = Path(pasta)
+        hashes = {}        # caminho -> (mtime, tamanho, hash), evita recalcular o hash a cada volta
+        tamanhos_vistos = {}
+        tentados = set()   # hashes já enviados neste monitoramento
+
+        print(f"👀 Monitorando '{pasta}' a cada {intervalo:g}s (Ctrl+C para sair)...")
+        try:
+            while True:
+                novos = []
+                for pdf in sorted(pasta.glob("*.pdf")):
+                    try:
+                        st = pdf.stat()
+                    except OSError:
+                        continue
+                    estavel = tamanhos_vistos.get(pdf) == st.st_size
+                    tamanhos_vistos[pdf] = st.st_size
+                    if not estavel:
+                        continue
+
+                    assinatura = (st.st_mtime, st.st_size)
+                    if pdf not in hashes or hashes[pdf][:2] != assinatura:
+                        hashes[pdf] = assinatura + (DiarioLote.hash_arquivo(pdf),)
+                    hash_pdf = hashes[pdf][2]
+                    if hash_pdf not in diario and hash_pdf not in tentados:
+                        novos.append(pdf)
+
+                if novos:
+                    print(f"\n📥 {len(novos)} PDF(s) novo(s) em '{pasta}'")
+                    tentados.update(hashes[pdf][2] for pdf in novos)
+                    for pdf, resultado, _ in self._iterar_resultados(novos, workers, diario):
+                        self.exibir_resultados(resultado, pdf.name)
+
+                    resultados = [dict(diario.resultado(h), arquivo=p.name)
+                                  for p, (_, _, h) in sorted(hashes.items()) if p.exists() and h in diario]
+                    self.salvar_resultados(resultados, arquivo_saida)
+
+                time.sleep(intervalo)
+        except KeyboardInterrupt:
+            print("\n👋 Monitoramento encerrado")
+
+    def salvar_resultados(self, resultados, nome_arquivo="dados_extraidos_grok.csv"):
         """Salva os resultados em um arquivo CSV"""
-        nome_arquivo = "dados_extraidos_grok.csv"
-        
-        with open(nome_arquivo, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['arquivo', 'data_documento', 'hora_documento', 'tipo_combustível', 'quantidade', 
-                         'valor_unitario', 'valor_total', 'numero_documento', 'placa', 'km', 'modelo_veiculo']
-            
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            
+        with EscritorCSV(nome_arquivo) as escritor:
             for resultado in resultados:
-                writer.writerow(resultado)
+                escritor.escrever(resultado)
         
         print(f"\n💾 Resultados salvos em: {nome_arquivo}")
 
-def main():
+def criar_parser_argumentos():
+    """Define as opções de linha de comando do extrator"""
+    parser = argparse.ArgumentParser(description="Extrator de dados de notas fiscais com OpenRouter")
+    parser.add_argument("--pasta", default="tests", help="Pasta com os PDFs (padrão: tests)")
+    parser.add_argument("--saida", default="dados_extraidos_grok.csv", help="Arquivo CSV de saída")
+    parser.add_argument("--fsync", action="store_true",
+                        help="Força cada linha do CSV no disco assim que o PDF termina")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="PDFs processados em paralelo (padrão: 1 = sequencial)")
+    parser.add_argument("--max-requisicoes", type=int, default=4,
+                        help="Máximo de requisições simultâneas à API (padrão: 4)")
+    parser.add_argument("--taxa", type=float, default=10.0,
+                        help="Requisições por segundo iniciais (ajustada automaticamente por 429/5xx)")
+    parser.add_argument("--max-tentativas", type=int, default=4,
+                        help="Novas tentativas por modelo após 429, 5xx ou erro de conexão")
+    parser.add_argument("--pool", type=int, default=None,
+                        help="Conexões mantidas abertas com a API (padrão: igual a --max-requisicoes)")
+    parser.add_argument("--sem-keep-alive", action="store_true",
+                        help="Fecha a conexão após cada requisição (útil para medir o custo do handshake)")
+    parser.add_argument("--http2", action="store_true", help="Usa HTTP/2 (requer httpx[http2])")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Recebe a resposta em stream, lendo até o evento com o uso de tokens (requer httpx)")
+    parser.add_argument("--streaming-antecipado", action="store_true",
+                        help="Com --streaming, encerra o stream assim que o JSON fecha; mais rápido, mas"
+                             " sem a contagem de tokens dessas respostas")
+    parser.add_argument("--resume", action="store_true",
+                        help="Retoma o lote: pula os PDFs cujo conteúdo já está no diário")
+    parser.add_argument("--watch", action="store_true",
+                        help="Após o lote, fica monitorando a pasta e processa apenas PDFs novos")
+    parser.add_argument("--intervalo", type=float, default=5.0, help="Segundos entre verificações do --watch")
+    parser.add_argument("--diario", default=None,
+                        help="Diário do lote (padrão: <saida>.diario.jsonl)")
+    parser.add_argument("--sem-cache", action="store_true",
+                        help="Ignora o cache de respostas e sempre consulta a API")
+    parser.add_argument("--limpar-cache", action="store_true", help="Apaga o cache de respostas antes de processar")
+    parser.add_argument("--cache-dir", default=".cache_openrouter", help="Diretório do cache de respostas")
+    parser.add_argument("--cache-max-mb", type=float, default=200, help="Tamanho máximo do cache em MB")
+    parser.add_argument("--cache-max-dias", type=float, default=30,
+                        help="Dias sem uso após os quais uma entrada do cache expira")
+    parser.add_argument("--modelos", default=str(ARQUIVO_MODELOS),
+                        help="JSON com os modelos de regiões por layout (padrão: modelos_regioes.json)")
+    parser.add_argument("--sem-camada-texto", action="store_true",
+                        help="Não lê a camada de texto do PDF; envia todas as regiões à API")
+    parser.add_argument("--sem-reconsulta", action="store_true",
+                        help="Não reenvia os campos de baixa confiança em uma segunda passada")
+    parser.add_argument("--limiar-confianca", type=float, default=LIMIAR_CONFIANCA,
+                        help="Campos abaixo desta confiança (0 a 1) são reconsultados")
+    parser.add_argument("--modelo-reconsulta", default=None,
+                        help="Modelo de visão usado na reconsulta (padrão: o mesmo da primeira passada)")
+    parser.add_argument("--modelos-visao", default=None,
+                        help="Modelos de visão separados por vírgula (padrão: MODELOS_VISAO)")
+    parser.add_argument("--motor-extracao", choices=OpenRouterExtractor.MOTORES_EXTRACAO, default='hibrido',
+                        help="'hibrido' = OCR local e visão só para o que falhar; 'visao' ou 'ocr' forçam um motor")
+    parser.add_argument("--limiar-ocr", type=float, default=LIMIAR_OCR,
+                        help="Confiança mínima do Tesseract (0 a 1) para aceitar um campo lido pelo OCR local")
+    parser.add_argument("--motor-ocr", choices=MOTORES_OCR, default='auto',
+                        help="Implementação do Tesseract usada pelo OCR local (padrão: tesserocr se instalado)")
+    parser.add_argument("--prompt-completo", action="store_true",
+                        help="Pede os dez campos em todo recorte (padrão: só os campos de cada região)")
+    parser.add_argument("--sem-cache-prompt", action="store_true",
+                        help="Não marca as instruções fixas do prompt com cache_control")
+    parser.add_argument("--roteamento", action="store_true",
+                        help="Ordena os modelos de visão por latência, taxa de erro e preenchimento recentes")
+    parser.add_argument("--hedge", action="store_true",
+                        help="Com --roteamento: duplica para o segundo modelo a requisição que passar do p95")
+    parser.add_argument("--formato-imagem", choices=list(FORMATOS), default='png',
+                        help="Formato das imagens enviadas à API (padrão: png, sem perdas)")
+    parser.add_argument("--qualidade-imagem", type=int, default=85,
+                        help="Qualidade JPEG/WebP, de 1 a 100 (padrão: 85)")
+    parser.add_argument("--imagem-cinza", action="store_true", help="Envia as imagens em tons de cinza")
+    parser.add_argument("--binarizar-imagem", action="store_true",
+                        help="Envia as imagens binarizadas (binarizar 'simples' do preprocessamento.py, sem ampliar)")
+    parser.add_argument("--max-dimensao-imagem", type=int, default=None,
+                        help="Reduz as imagens para que o maior lado tenha no máximo N pixels")
+    parser.add_argument("--sem-validacao", action="store_true",
+                        help="Não gera o relatório de validação do CSV (<saida>_validacao.csv) ao fim do lote")
+    parser.add_argument("--modo", choices=OpenRouterExtractor.MODOS_LOTE, default='regiao',
+                        help="'regiao' = uma requisição por região; 'pagina' = as quatro regiões em uma requisição")
+    return parser
+
+
+def main(argv=None):
+    args = criar_parser_argumentos().parse_args(argv)
+
     print("🚀 EXTRATOR DE DADOS COM GROK VISION AI")
     print("=" * 60)
     print("🎯 Campos a extrair:")
@@ -520,29 +1486,87 @@ def main():
     
     # Verifica se há API key
     api_key = os.getenv('OPENROUTER_API_KEY')
-    if not api_key:
+    if not api_key and args.motor_extracao != 'ocr':
         print("❌ ERRO: Variável de ambiente OPENROUTER_API_KEY não encontrada!")
         print("💡 Para configurar:")
         print("   setx OPENROUTER_API_KEY \"sua_api_key_aqui\"")
         print("   (Reinicie o terminal após configurar)")
         return
     
+    extractor = None
     try:
+        cache = None
+        if args.limpar_cache or not args.sem_cache:
+            cache = CacheRespostas(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 * 1024),
+                                   max_idade_dias=args.cache_max_dias)
+            if args.limpar_cache:
+                cache.limpar()
+                print(f"🧹 Cache de respostas apagado ({args.cache_dir})")
+            if args.sem_cache:
+                cache = None
+
+        definir_motor_ocr(args.motor_ocr)
+
         # Cria o extrator
-        extractor = OpenRouterExtractor(api_key)
+        extractor = OpenRouterExtractor(api_key, max_requisicoes=args.max_requisicoes, modo_lote=args.modo,
+                                        tamanho_pool=args.pool, keep_alive=not args.sem_keep_alive,
+                                        http2=args.http2, cache=cache, streaming=args.streaming,
+                                        streaming_antecipado=args.streaming_antecipado,
+                                        limitador=LimitadorTaxa(args.taxa, capacidade=max(1, args.max_requisicoes)),
+                                        max_tentativas=args.max_tentativas,
+                                        modelos=carregar_modelos(args.modelos),
+                                        usar_camada_texto=not args.sem_camada_texto,
+                                        reconsultar=not args.sem_reconsulta,
+                                        limiar_confianca=args.limiar_confianca,
+                                        modelo_reconsulta=args.modelo_reconsulta,
+                                        modelos_visao=[m.strip() for m in args.modelos_visao.split(',') if m.strip()]
+                                        if args.modelos_visao else None,
+                                        roteador=RoteadorModelos(hedge=args.hedge)
+                                        if args.roteamento or args.hedge else None,
+                                        prompt_especializado=not args.prompt_completo,
+                                        motor_extracao=args.motor_extracao, limiar_ocr=args.limiar_ocr,
+                                        cache_prompt=not args.sem_cache_prompt,
+                                        codificacao=CodificacaoImagem(args.formato_imagem, args.qualidade_imagem,
+                                                                      cinza=args.imagem_cinza,
+                                                                      binarizar=args.binarizar_imagem,
+                                                                      max_dimensao=args.max_dimensao_imagem))
         
+        # Diário do lote: cada PDF é registrado assim que termina
+        diario = DiarioLote(args.diario or Path(args.saida).with_suffix('.diario.jsonl'))
+
         # Processa todos os PDFs
-        resultados = extractor.processar_todos_pdfs()
+        processados = extractor.gravar_todos_pdfs(args.pasta, workers=args.workers, arquivo_saida=args.saida,
+                                                  diario=diario, retomar=args.resume or args.watch,
+                                                  fsync=args.fsync)
         
-        if resultados:
+        if processados:
             print(f"\n🎉 PROCESSAMENTO CONCLUÍDO!")
-            print(f"📁 {len(resultados)} arquivo(s) processado(s)")
-            print(f"💾 Resultados salvos em dados_extraidos_grok.csv")
+            print(f"📁 {processados} arquivo(s) processado(s)")
+            print(f"💾 Resultados salvos em {args.saida}")
         else:
             print(f"\n⚠️  Nenhum arquivo foi processado com sucesso")
+
+        if not args.sem_validacao and Path(args.saida).exists():
+            try:
+                from pos_processamento import validar_csv
+            except ImportError as e:
+                print(f"⚠️  Validação do CSV ignorada (requer pandas e NumPy >= 2): {e}")
+            else:
+                # Um CSV malformado não pode impedir o --watch que vem depois
+                try:
+                    validar_csv(args.saida)
+                except Exception as e:
+                    print(f"⚠️  Validação do CSV falhou, relatório não gerado: {e}")
+
+        if args.watch:
+            extractor.monitorar_pasta(args.pasta, diario, intervalo=args.intervalo, workers=args.workers,
+                                      arquivo_saida=args.saida)
             
     except Exception as e:
         print(f"\n❌ ERRO: {str(e)}")
+    finally:
+        if extractor is not None:
+            extractor.fechar()
 
 
 def test_parsing_simulado():
@@ -566,17 +1590,705 @@ def test_parsing_simulado():
     for k, v in resposta_simulada.items():
         if v is None or (isinstance(v, str) and v.strip().lower() == 'null'):
             continue
-        resultados[k] = extractor._normalizar_valor(v)
+        resultados[k] = extractor._normalizar_valor(v, k)
 
     print('\n🔬 Resultado do teste simulado:')
     for k, v in resultados.items():
         print(f' - {k}: {v}')
 
 
+def _criar_pdf_simulado(caminho, texto):
+    """Gera um PDF de uma página (tamanho A4) para os testes simulados"""
+    documento = fitz.open()
+    pagina = documento.new_page(width=595, height=842)
+    pagina.insert_text((72, 72), texto)
+    documento.save(caminho)
+    documento.close()
+
+
+def test_lote_simulado(num_pdfs=8, workers=4, max_requisicoes=3, atraso=0.2, modo_lote='regiao'):
+    """Rotina de teste do modo concorrente contra um servidor OpenRouter local.
+
+    Verifica que o limite de requisições simultâneas é respeitado e que o CSV
+    mantém a ordem dos arquivos, comparando com o tempo do modo sequencial.
+    """
+    from servidor_simulado import ServidorOpenRouterSimulado
+
+    def responder(payload):
+        return {'numero_documento': '1234', 'placa': 'ABC1D23', 'valor_total': '100,000'}
+
+    with tempfile.TemporaryDirectory() as tmp, ServidorOpenRouterSimulado(responder, atraso=atraso) as servidor:
+        pasta = Path(tmp) / "pdfs"
+        pasta.mkdir()
+        for n in range(num_pdfs):
+            _criar_pdf_simulado(pasta / f"nota_{n:03d}.pdf", f"NOTA {n}")
+
+        tempos = {}
+        for modo, n_workers in (('sequencial', 1), ('concorrente', workers)):
+            extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, max_requisicoes=max_requisicoes,
+                                            modo_lote=modo_lote, reconsultar=False)
+            servidor.pico_simultaneas = 0
+            saida = Path(tmp) / f"saida_{modo}.csv"
+            inicio = time.perf_counter()
+            resultados = extractor.processar_todos_pdfs(pasta, workers=n_workers, arquivo_saida=saida)
+            tempos[modo] = time.perf_counter() - inicio
+
+            with open(saida, newline='', encoding='utf-8') as f:
+                arquivos = [linha['arquivo'] for linha in csv.DictReader(f)]
+            assert arquivos == sorted(arquivos) and len(arquivos) == num_pdfs, arquivos
+            assert [r['arquivo'] for r in resultados] == arquivos, resultados
+            assert servidor.pico_simultaneas <= max_requisicoes, servidor.pico_simultaneas
+
+        print('\n🔬 Resultado do teste de lote simulado:')
+        print(f" - requisições recebidas: {servidor.total_requisicoes}")
+        print(f" - pico de requisições simultâneas: {servidor.pico_simultaneas} (limite {max_requisicoes})")
+        for modo, segundos in tempos.items():
+            print(f" - {modo}: {segundos:.2f}s")
+
+
+def test_diario_simulado():
+    """Rotina de teste do diário do lote após uma gravação interrompida.
+
+    Simula uma queda no meio de um registro (última linha sem "\\n") e confere
+    que o registro seguinte, gravado após reabrir o diário, sobrevive à recarga.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = Path(tmp) / "lote.diario.jsonl"
+        DiarioLote(caminho).registrar('a.pdf', 'h1', {'placa': 'ABC1D23'})
+        with open(caminho, 'a', encoding='utf-8') as f:
+            f.write('{"arquivo": "b.pdf", "hash": "h2", "resul')  # queda no meio da linha
+
+        diario = DiarioLote(caminho)
+        assert len(diario) == 1 and 'h2' not in diario
+        diario.registrar('c.pdf', 'h3', {'placa': 'XYZ9A87'})
+
+        recarregado = DiarioLote(caminho)
+        assert len(recarregado) == 2 and 'h1' in recarregado and 'h3' in recarregado, len(recarregado)
+        assert recarregado.resultado('h3') == {'placa': 'XYZ9A87'}
+        print('\n🔬 Resultado do teste do diário simulado:')
+        print(' - linha truncada descartada; registro seguinte preservado após recarregar')
+
+
+def _criar_nfe_digital_simulada(caminho, com_placa=True):
+    """Gera uma NF-e com camada de texto no layout do modelo padrão (página de referência)"""
+    documento = fitz.open()
+    pagina = documento.new_page(width=PAGINA_REFERENCIA[0] / ZOOM_REGIOES, height=PAGINA_REFERENCIA[1] / ZOOM_REGIOES)
+    textos = [
+        ((240, 80), "NF-e Nº 000.001.234 Série 1"),
+        ((495, 190), "EMISSÃO"),
+        ((495, 205), "15/03/2024 14:32:10"),
+        ((20, 430), "DESCRIÇÃO"), ((250, 430), "QTD"), ((320, 430), "V.UNIT"), ((400, 430), "V.TOTAL"),
+        ((20, 445), "DIESEL S10"), ((250, 445), "45,000"), ((320, 445), "5,990"), ((400, 445), "269,55"),
+        ((20, 630), "DADOS ADICIONAIS"),
+        ((20, 675), "KM: 123456"),
+        ((20, 690), "MODELO: FIAT STRADA"),
+    ]
+    if com_placa:
+        textos.append(((20, 660), "PLACA: ABC1D23"))
+    for posicao, texto in textos:
+        pagina.insert_text(posicao, texto, fontsize=8)
+    documento.save(caminho)
+    documento.close()
+
+
+def test_modelos_simulado():
+    """Rotina de teste dos modelos de regiões: caixas em A4 e detecção entre dois layouts.
+
+    Em uma página A4 renderizada com ZOOM_REGIOES, o modelo embutido e o
+    cupom_padrao de modelos_regioes.json recortam exatamente as caixas de
+    REGIOES_FIXAS. Um catálogo com um segundo layout (cupom estreito) escolhe
+    o modelo certo pelas âncoras na camada de texto e, em páginas sem texto,
+    pela proporção.
+    """
+    print('\n🔬 Teste dos modelos de regiões simulado:')
+    with fitz.open() as documento:
+        a4 = documento.new_page(width=PAGINA_REFERENCIA[0] / ZOOM_REGIOES, height=PAGINA_REFERENCIA[1] / ZOOM_REGIOES)
+        largura, altura = tamanho_renderizado(a4, zoom=ZOOM_REGIOES)
+    assert (largura, altura) == PAGINA_REFERENCIA, (largura, altura)
+    fixas = [(x, y, min(x + w, largura), min(y + h, altura)) for _, (x, y, w, h) in REGIOES_FIXAS]
+    for modelo in (carregar_modelos(None).padrao, carregar_modelos().modelos['cupom_padrao']):
+        assert modelo.caixas_pixels(largura, altura) == fixas, (modelo.nome, modelo.caixas_pixels(largura, altura))
+    print(f" - A4 em {largura}x{altura}: caixas do embutido e do cupom_padrao iguais às de REGIOES_FIXAS")
+
+    estreito = {'descricao': 'Cupom térmico de 80 mm', 'ancoras': ['CUPOM FISCAL ELETRONICO', 'SAT'],
+                'proporcao': 0.35, 'regioes': {'numero_documento': [0.0, 0.0, 1.0, 0.2]},
+                'campos': {'numero_documento': ['numero_documento']}}
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = Path(tmp) / "modelos.json"
+        with open(ARQUIVO_MODELOS, encoding='utf-8') as f:
+            config = json.load(f)
+        config['modelos']['cupom_estreito'] = estreito
+        caminho.write_text(json.dumps(config, ensure_ascii=False), encoding='utf-8')
+        catalogo = carregar_modelos(caminho)
+
+    casos = [
+        ((595, 842, "DANFE", "Dados adicionais"), 'cupom_padrao'),            # âncora (sem diferenciar caixa)
+        ((595, 842, "CUPOM FISCAL ELETRONICO - SAT"), 'cupom_estreito'),      # âncora vale mais que proporção
+        ((227, 650), 'cupom_estreito'),                                        # digitalizada, 80 mm
+        ((620, 877), 'cupom_padrao'),                                          # digitalizada, A4 a 150 dpi
+        ((842, 595), 'cupom_padrao'),                                          # paisagem: nenhum, vale o padrão
+    ]
+    documento = fitz.open()
+    for (largura_pt, altura_pt, *textos), _ in casos:
+        nova = documento.new_page(width=largura_pt, height=altura_pt)
+        for n, texto in enumerate(textos):
+            nova.insert_text((10, 20 + 15 * n), texto, fontsize=8)
+    # Páginas reabertas depois de criadas: new_page invalida as referências anteriores
+    for pagina_teste, (_, esperado) in zip(documento, casos):
+        detectado = catalogo.detectar(pagina_teste).nome
+        assert detectado == esperado, (pagina_teste.rect, detectado, esperado)
+    documento.close()
+    print(f" - detecção com dois layouts: {len(casos)}/{len(casos)} páginas no modelo certo"
+          f" ({', '.join(f'{nome}: {n}' for nome, n in catalogo.deteccoes.most_common())})")
+
+
+def test_camada_texto_simulado():
+    """Rotina de teste da camada de texto: campos nativos dispensam as requisições das suas regiões"""
+    from servidor_simulado import ServidorOpenRouterSimulado
+
+    resposta = {'placa': 'XYZ9876', 'km': '1', 'numero_documento': '9999'}
+    esperado = {'numero_documento': '1234', 'tipo_combustível': 'DS', 'valor_total': '269.55',
+                'placa': 'ABC1D23', 'modelo_veiculo': 'FIAT STRADA'}
+
+    print('\n🔬 Teste da camada de texto simulado:')
+    with tempfile.TemporaryDirectory() as tmp:
+        pasta = Path(tmp) / "pdfs"
+        pasta.mkdir()
+        _criar_nfe_digital_simulada(pasta / "nota_completa.pdf")
+        _criar_nfe_digital_simulada(pasta / "nota_sem_placa.pdf", com_placa=False)
+
+        requisicoes = {}
+        for usar_texto in (False, True):
+            with ServidorOpenRouterSimulado(resposta) as servidor:
+                extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, motor_extracao='visao',
+                                                usar_camada_texto=usar_texto, reconsultar=False)
+                completo = extractor.processar_pdf(pasta / "nota_completa.pdf")
+                sem_placa = extractor.processar_pdf(pasta / "nota_sem_placa.pdf")
+                requisicoes[usar_texto] = servidor.total_requisicoes
+
+        # Com a camada de texto, os valores nativos prevalecem e só a região da placa vai à API
+        for campo, valor in esperado.items():
+            assert completo[campo] == valor, (campo, completo[campo])
+        assert len(completo['origem_campos']) == 10, completo['origem_campos']
+        assert set(completo['origem_campos'].values()) == {'texto'}, completo['origem_campos']
+        assert sem_placa['placa'] == 'XYZ9876' and sem_placa['origem_campos']['placa'] == 'visao', sem_placa
+        assert sem_placa['km'] == '123456', sem_placa
+        assert requisicoes[True] == 1 and requisicoes[False] == 8, requisicoes
+
+    print(f" - requisições com camada de texto: {requisicoes[True]} | sem: {requisicoes[False]}")
+    print(f" - campos da nota completa vindos do texto: {len(completo['origem_campos'])}/10")
+
+
+def test_confianca_simulado():
+    """Rotina de teste da confiança por campo e da reconsulta dirigida.
+
+    Na primeira passada o servidor devolve placa e número do documento em
+    formato inválido; só esses dois campos devem ser reenviados (cada um com
+    o seu recorte) e ao modelo de reconsulta. Um campo do OCR local só é
+    trocado se a reconsulta superar a confiança do Tesseract.
+    """
+    from servidor_simulado import ServidorOpenRouterSimulado
+
+    corretos = {'data_documento': '15/03/2024', 'hora_documento': '14:32', 'tipo_combustível': 'DS',
+                'quantidade': '45,000', 'valor_unitario': '5,990', 'valor_total': '269,55',
+                'numero_documento': '1234', 'placa': 'ABC1D23', 'km': '123456', 'modelo_veiculo': 'FIAT STRADA'}
+    modelos_reconsulta = []
+
+    def responder(payload):
+        if payload['model'] == 'outro/modelo':
+            modelos_reconsulta.append(payload['model'])
+            return corretos
+        return {**corretos, 'placa': 'PLACA?', 'numero_documento': '12'}
+
+    print('\n🔬 Teste de confiança por campo simulado:')
+    with tempfile.TemporaryDirectory() as tmp, ServidorOpenRouterSimulado(responder) as servidor:
+        caminho = Path(tmp) / "nota.pdf"
+        _criar_pdf_simulado(caminho, "NOTA DIGITALIZADA")
+        extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, modelo_reconsulta='outro/modelo')
+        resultado = extractor.processar_pdf(caminho)
+
+        assert resultado['placa'] == 'ABC1D23' and resultado['numero_documento'] == '1234', resultado
+        assert resultado['origem_campos']['placa'] == 'reconsulta', resultado['origem_campos']
+        assert min(resultado['confianca_campos'].values()) >= extractor.limiar_confianca, resultado
+        assert servidor.total_requisicoes == 4 + 2, servidor.total_requisicoes
+        assert modelos_reconsulta == ['outro/modelo'] * 2, modelos_reconsulta
+
+    print(f" - requisições: 4 na primeira passada + {extractor.reconsultas} reconsulta(s)"
+          f" para {extractor.campos_reconsultados} campo(s)")
+    print(f" - campos corrigidos: {extractor.campos_corrigidos}")
+
+    # Campo lido pelo OCR local parte da confiança do Tesseract também na
+    # comparação com a reconsulta: 0.95 - 0.2 (divergência) > 0.75 - 0.2
+    with tempfile.TemporaryDirectory() as tmp, \
+            ServidorOpenRouterSimulado({**corretos, 'placa': 'ABC1D28'}) as servidor:
+        caminho = Path(tmp) / "nota.pdf"
+        _criar_pdf_simulado(caminho, "NOTA DIGITALIZADA")
+        extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url)
+        resultados = {**extractor._criar_resultado_vazio(), 'placa': 'ABC1D23'}
+        origens, candidatos = {'placa': 'ocr'}, {'placa': ['ABC1D23']}
+        with fitz.open(caminho) as documento:
+            pagina = documento[0]
+            extractor._reconsultar_campos(pagina, extractor.modelos.detectar(pagina), resultados, origens,
+                                          candidatos, {'placa': 0.5}, confiancas_ocr={'placa': 0.95})
+        assert resultados['placa'] == 'ABC1D23' and origens['placa'] == 'ocr', (resultados, origens)
+    print(" - valor do OCR com confiança alta mantido diante de reconsulta divergente")
+
+
+def test_limitador_simulado():
+    """Rotina de teste do limitador de taxa e das retentativas contra um servidor que injeta limitação.
+
+    Cenários: 429 com Retry-After, 5xx transitórios, lote concorrente acima do
+    limite do servidor, esgotamento das tentativas e 4xx que não mexe na taxa.
+    """
+    from servidor_simulado import ServidorOpenRouterSimulado
+
+    resposta = {'numero_documento': '1234', 'placa': 'ABC1D23'}
+    imagem = Image.new('RGB', (200, 100), 'white')
+
+    def novo_extrator(servidor, **kwargs):
+        return OpenRouterExtractor(api_key='test', base_url=servidor.url, **kwargs)
+
+    print('\n🔬 Teste do limitador de taxa simulado:')
+
+    # 1. Um 429 com Retry-After: 1 deve ser respeitado antes da nova tentativa
+    with ServidorOpenRouterSimulado(resposta, status_forcados=[429], retry_after=1.0) as servidor:
+        inicio = time.perf_counter()
+        dados = novo_extrator(servidor).extrair_dados_com_openrouter(imagem)
+        decorrido = time.perf_counter() - inicio
+        assert dados['placa'] == 'ABC1D23', dados
+        assert decorrido >= 1.0, decorrido
+        assert servidor.total_requisicoes == 2, servidor.total_requisicoes
+    print(f" - Retry-After respeitado: sucesso após {decorrido:.2f}s")
+
+    # 2. Erros 5xx transitórios são repetidos com backoff
+    with ServidorOpenRouterSimulado(resposta, status_forcados=[503, 502]) as servidor:
+        extractor = novo_extrator(servidor)
+        dados = extractor.extrair_dados_com_openrouter(imagem)
+        assert dados['placa'] == 'ABC1D23', dados
+        assert servidor.respostas_5xx == 2 and extractor.limitador.erros_servidor == 2
+    print(" - 5xx transitórios: recuperado após 2 falhas")
+
+    # 3. Lote concorrente acima do limite do servidor: nada se perde e a taxa se adapta
+    with tempfile.TemporaryDirectory() as tmp, \
+            ServidorOpenRouterSimulado(resposta, limite_por_segundo=5) as servidor:
+        pasta = Path(tmp) / "pdfs"
+        pasta.mkdir()
+        for n in range(6):
+            _criar_pdf_simulado(pasta / f"nota_{n:03d}.pdf", f"NOTA {n}")
+        extractor = novo_extrator(servidor, max_requisicoes=8, limitador=LimitadorTaxa(taxa=20, capacidade=8))
+        saida = Path(tmp) / "saida.csv"
+        extractor.gravar_todos_pdfs(pasta, workers=6, arquivo_saida=saida)
+
+        with open(saida, newline='', encoding='utf-8') as f:
+            linhas = list(csv.DictReader(f))
+        assert len(linhas) == 6 and all(l['placa'] == 'ABC1D23' for l in linhas), linhas
+        assert extractor.limitador.taxa < 20, extractor.limitador.taxa
+    print(f" - lote limitado a 5 req/s: 6/6 arquivos completos, {servidor.respostas_429} resposta(s) 429,"
+          f" taxa final {extractor.limitador.taxa:.1f} req/s")
+
+    # 4. Tentativas esgotadas: devolve resultado vazio sem exceção
+    with ServidorOpenRouterSimulado(resposta, status_forcados=[429] * 3, retry_after=0) as servidor:
+        dados = novo_extrator(servidor, max_tentativas=2).extrair_dados_com_openrouter(imagem)
+        assert all(v is None for v in dados.values()), dados
+        assert servidor.total_requisicoes == 3, servidor.total_requisicoes
+    print(" - tentativas esgotadas: resultado vazio após 3 requisições")
+
+    # 5. Recusa do pedido (401): não é sinal de capacidade, a taxa não muda
+    with ServidorOpenRouterSimulado(resposta, status_forcados=[401] * 10) as servidor:
+        extractor = novo_extrator(servidor, limitador=LimitadorTaxa(taxa=4))
+        extractor.extrair_dados_com_openrouter(imagem)
+        assert servidor.total_requisicoes >= 1 and extractor.limitador.taxa == 4, extractor.limitador.taxa
+    print(f" - 401 em {servidor.total_requisicoes} requisição(ões): taxa mantida em 4.0 req/s")
+
+
+def test_streaming_simulado():
+    """Rotina de teste do cliente com streaming contra o servidor simulado em modo SSE.
+
+    Cenários: parser incremental com chaves dentro de strings e pedaços de
+    1 caractere, retorno antecipado quando o JSON fecha (o modelo continua
+    "falando" depois), cancelamento de resposta sem JSON acima de max_tokens
+    e extração completa pelo extrator com --streaming, com o uso de tokens.
+    """
+    from cliente_streaming import ClienteStreaming, ExtratorJSONIncremental
+    from servidor_simulado import ServidorOpenRouterSimulado
+
+    print('\n🔬 Teste do streaming simulado:')
+
+    # 1. Parser incremental: texto antes, '{' solto, chaves dentro de strings e escapes
+    texto = 'Claro! {nota} Segue: {"modelo_veiculo": "A}B {x}", "obs": "aspas \\" e }", "km": "1"} fim {'
+    parser = ExtratorJSONIncremental()
+    fechou_em = next(i for i, c in enumerate(texto) if parser.alimentar(c))
+    assert parser.objeto == {"modelo_veiculo": "A}B {x}", "obs": 'aspas " e }', "km": "1"}, parser.objeto
+    assert texto[fechou_em] == '}' and texto[fechou_em + 1:] == ' fim {'
+    print(" - parser incremental: objeto completo reconhecido no '}' final")
+
+    resposta = {'numero_documento': '1234', 'placa': 'ABC1D23', 'km': '123456'}
+    payload = {"model": "sim/modelo", "messages": [], "max_tokens": 100}
+
+    # 2. O modelo continua escrevendo depois do JSON: sem aguardar o uso, o cliente volta assim que o JSON fecha
+    with ServidorOpenRouterSimulado(resposta, tamanho_pedaco=4, atraso_pedaco=0.01,
+                                    texto_antes="Aqui está o JSON:\n", texto_depois=" Observação: " * 40) as servidor:
+        cliente = ClienteStreaming(aguardar_uso=False)
+        inicio = time.perf_counter()
+        r = cliente.post(servidor.url, json=payload, timeout=10)
+        decorrido = time.perf_counter() - inicio
+        total_pedacos = len(list(servidor._pedacos_sse(payload)))
+        assert r.status_code == 200 and r.dados == resposta, r.dados
+        assert json.loads(r.json()['choices'][0]['message']['content']) == resposta
+        assert cliente.respostas_antecipadas == 1 and 'usage' not in r.json()
+        time.sleep(0.3)
+        assert servidor.pedacos_enviados < total_pedacos, (servidor.pedacos_enviados, total_pedacos)
+    print(f" - retorno antecipado em {decorrido:.2f}s; servidor enviou {servidor.pedacos_enviados}"
+          f" de {total_pedacos} eventos")
+
+    # 3. Resposta sem JSON que passa de max_tokens: stream cancelado
+    with ServidorOpenRouterSimulado(resposta, tamanho_pedaco=10, atraso_pedaco=0.005,
+                                    texto_antes="bla " * 400) as servidor:
+        r = cliente.post(servidor.url, json=payload, timeout=10)
+        assert r.cancelado and r.dados is None and len(r.conteudo) <= 100 * 4 + 10
+        assert cliente.respostas_canceladas == 1
+    print(f" - resposta prolixa cancelada após {len(r.conteudo)} caracteres")
+    cliente.fechar()
+
+    # 4. Extrator completo com streaming (429 inicial continua passando pelo limitador); o
+    # texto depois do JSON é lido até o evento final, que traz o uso de tokens
+    with ServidorOpenRouterSimulado(resposta, tamanho_pedaco=5, texto_depois=" ok" * 50,
+                                    status_forcados=[429], retry_after=0.2) as servidor:
+        extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, streaming=True)
+        dados = extractor.extrair_dados_com_openrouter(Image.new('RGB', (200, 100), 'white'))
+        assert dados == resposta, dados
+        assert servidor.respostas_429 == 1 and extractor.cliente_streaming.respostas_antecipadas == 0
+        uso = extractor.uso_tokens
+        assert uso['saida'] == -(-len(json.dumps(resposta) + " ok" * 50) // 4) and not uso['sem_uso'], uso
+        extractor.fechar()
+    print(f" - extrator com --streaming: dados corretos após 429 + stream, {uso['entrada']} tokens de entrada"
+          f" e {uso['saida']} de saída")
+
+
+def test_roteamento_simulado():
+    """Rotina de teste do roteador de modelos contra um servidor com um modelo lento e um rápido.
+
+    Cenários: p95 e custo do roteador, exploração dos modelos ainda sem
+    amostras seguida da preferência pelo mais rápido, hedge que devolve a
+    resposta do segundo modelo quando o primeiro passa do p95, latência sem
+    esperas locais, hedge contido pela fila e pelas vagas do semáforo e
+    cancelamento da requisição perdedora.
+    """
+    from servidor_simulado import ServidorOpenRouterSimulado
+
+    atrasos = {'sim/lento': 0.6, 'sim/rapido': 0.05}
+    campos_rapido = {'numero_documento': '1234', 'placa': 'ABC1D23', 'km': '123456'}
+
+    def responder(payload):
+        time.sleep(atrasos[payload['model']])
+        if payload['model'] == 'sim/lento':
+            return {'numero_documento': '1234', 'placa': None, 'km': None}
+        return campos_rapido
+
+    imagem = Image.new('RGB', (200, 100), 'white')
+    print('\n🔬 Teste do roteamento de modelos simulado:')
+
+    # 1. p95 e custo: erros e campos vazios encarecem o modelo
+    roteador = RoteadorModelos(min_amostras=3, atraso_hedge_padrao=7.0)
+    assert roteador.atraso_hedge('a') == 7.0
+    for segundos in range(1, 21):
+        roteador.registrar('a', segundos, True, 1.0)
+        roteador.registrar('b', segundos, segundos < 19, 0.5)
+    assert roteador.atraso_hedge('a') == 19
+    assert roteador.custo('b') > roteador.custo('a')
+    assert roteador.ordenar(['b', 'a', 'c']) == ['c', 'a', 'b']
+    print(f" - custo a={roteador.custo('a'):.2f} b={roteador.custo('b'):.2f}; p95 de a = 19s")
+
+    # 2. Sem hedge: os dois modelos são explorados e depois o rápido vai primeiro
+    with ServidorOpenRouterSimulado(responder) as servidor:
+        roteador = RoteadorModelos(min_amostras=2)
+        extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, roteador=roteador,
+                                        modelos_visao=['sim/lento', 'sim/rapido'])
+        for _ in range(8):
+            extractor.extrair_dados_com_openrouter(imagem)
+        escolhas_rapido = roteador._escolhas['sim/rapido']
+        assert escolhas_rapido >= 5, roteador._escolhas
+        assert roteador.ordenar(['sim/lento', 'sim/rapido'])[0] == 'sim/rapido'
+        roteador.exibir_resumo()
+    print(f" - roteamento: {escolhas_rapido} de 8 requisições foram primeiro ao modelo rápido")
+
+    # 3. Hedge: o lento passa do atraso e a resposta do rápido chega antes
+    atrasos['sim/lento'] = 1.5
+    with ServidorOpenRouterSimulado(responder) as servidor:
+        roteador = RoteadorModelos(hedge=True, atraso_hedge_padrao=0.2)
+        extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, roteador=roteador,
+                                        modelos_visao=['sim/lento', 'sim/rapido'])
+        inicio = time.perf_counter()
+        dados = extractor.extrair_dados_com_openrouter(imagem)
+        decorrido = time.perf_counter() - inicio
+        assert dados == campos_rapido, dados
+        assert decorrido < 1.0, decorrido
+        assert roteador.hedges_enviados == 1 and roteador.hedges_vencedores == 1
+        # A requisição perdedora termina em segundo plano e entra nas métricas
+        extractor._executor_hedge.shutdown(wait=True)
+        assert len(roteador._latencias['sim/lento']) == 1
+    print(f" - hedge: resposta do segundo modelo em {decorrido:.2f}s (primeiro levaria 1.5s)")
+
+    # 4. A latência do roteador é só a ida e volta HTTP: o Retry-After de 0.5s não entra
+    with ServidorOpenRouterSimulado(responder, status_forcados=[429], retry_after=0.5) as servidor:
+        roteador = RoteadorModelos()
+        extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, roteador=roteador,
+                                        modelos_visao=['sim/rapido'])
+        inicio = time.perf_counter()
+        extractor.extrair_dados_com_openrouter(imagem)
+        decorrido = time.perf_counter() - inicio
+        latencia, = roteador._latencias['sim/rapido']
+        assert decorrido >= 0.5 and latencia < 0.3, (decorrido, latencia)
+    print(f" - latência registrada {latencia:.2f}s de {decorrido:.2f}s (sem o Retry-After)")
+
+    # 5. Fila local não dispara hedge: o p95 conta do envio, e sem vaga livre não há cópia
+    with ServidorOpenRouterSimulado(responder) as servidor:
+        roteador = RoteadorModelos(hedge=True, atraso_hedge_padrao=0.2)
+        extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, roteador=roteador,
+                                        max_requisicoes=2, modelos_visao=['sim/rapido', 'sim/lento'])
+        for _ in range(2):
+            extractor._semaforo_requisicoes.acquire()
+        liberar = threading.Timer(0.5, lambda: [extractor._semaforo_requisicoes.release() for _ in range(2)])
+        liberar.start()
+        dados = extractor.extrair_dados_com_openrouter(imagem)
+        liberar.join()
+        assert dados == campos_rapido and roteador.hedges_enviados == 0, (dados, roteador.hedges_enviados)
+
+        roteador = RoteadorModelos(hedge=True, atraso_hedge_padrao=0.2)
+        extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, roteador=roteador,
+                                        max_requisicoes=1, modelos_visao=['sim/lento', 'sim/rapido'])
+        dados = extractor.extrair_dados_com_openrouter(imagem)
+        assert dados['numero_documento'] == '1234' and roteador.hedges_enviados == 0, roteador.hedges_enviados
+    print(" - 0.5s na fila do semáforo sem hedge; com o semáforo cheio o hedge não é enviado")
+
+    # 6. Com streaming, a requisição perdedora é cortada assim que o hedge responde
+    with ServidorOpenRouterSimulado(responder) as servidor:
+        roteador = RoteadorModelos(hedge=True, atraso_hedge_padrao=0.2)
+        extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, roteador=roteador,
+                                        streaming=True, modelos_visao=['sim/lento', 'sim/rapido'])
+        inicio = time.perf_counter()
+        dados = extractor.extrair_dados_com_openrouter(imagem)
+        extractor._executor_hedge.shutdown(wait=True)
+        decorrido = time.perf_counter() - inicio
+        extractor.fechar()
+        assert dados == campos_rapido and decorrido < 1.0, (dados, decorrido)
+        assert 'sim/lento' not in roteador._latencias or not roteador._latencias['sim/lento']
+    print(f" - perdedor cancelado: hedge e encerramento em {decorrido:.2f}s (o lento levaria 1.5s)")
+
+
+def test_prompt_simulado():
+    """Rotina de teste dos prompts por região, do prefixo cacheável e da contagem de tokens por página.
+
+    Compara o prompt especializado (cada recorte pede só os seus campos) com
+    o prompt completo, confere que o prefixo fixo é reaproveitado pelo cache
+    de prompt do servidor simulado a partir da segunda requisição e que, com
+    streaming, os tokens por página são os mesmos.
+    """
+    from servidor_simulado import ServidorOpenRouterSimulado
+
+    resposta = {'numero_documento': '1234', 'placa': 'ABC1D23', 'km': '123456'}
+    print('\n🔬 Teste de prompts por região simulado:')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        caminho = Path(tmp) / "nota.pdf"
+        _criar_pdf_simulado(caminho, "NOTA DIGITALIZADA")
+
+        uso, prompts, paginas = {}, {}, {}
+        for nome, kwargs in (('completo', dict(prompt_especializado=False, cache_prompt=False)),
+                             ('especializado', {}), ('streaming', dict(streaming=True))):
+            with ServidorOpenRouterSimulado(resposta) as servidor:
+                extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, reconsultar=False,
+                                                usar_camada_texto=False, **kwargs)
+                resultado = extractor.processar_pdf(caminho)
+                uso[nome], prompts[nome] = extractor.uso_tokens, servidor.prompts
+                paginas[nome] = resultado['tokens_paginas']
+                assert resultado['placa'] == 'ABC1D23', resultado
+                extractor.fechar()
+
+    # O recorte do número do documento não descreve mais placa, km, valores...
+    recorte_numero = next(p for p in prompts['especializado'] if '"numero_documento"' in p)
+    assert 'Placa:' not in recorte_numero and 'Quantidade:' not in recorte_numero, recorte_numero
+    assert all('Placa:' in p for p in prompts['completo'])
+    assert all(p.startswith(PREFIXO_INSTRUCOES) for p in prompts['especializado'])
+
+    # Menos tokens de entrada e o prefixo vem do cache a partir da 2ª requisição
+    assert uso['especializado']['entrada'] < uso['completo']['entrada'], uso
+    assert uso['completo']['cache'] == 0 and uso['especializado']['cache'] > 0, uso
+    assert paginas['especializado'] == [{'pagina': 1, 'requisicoes': 4, 'entrada': uso['especializado']['entrada'],
+                                         'cache': uso['especializado']['cache'],
+                                         'saida': uso['especializado']['saida']}], paginas
+    # Com --streaming o uso vem do evento final do stream: mesmos tokens por página
+    assert uso['streaming'] == uso['especializado'] and paginas['streaming'] == paginas['especializado'], uso
+    reducao = 1 - uso['especializado']['entrada'] / uso['completo']['entrada']
+    faturados = uso['especializado']['entrada'] - uso['especializado']['cache']
+    print(f" - tokens de entrada por página: completo {uso['completo']['entrada']},"
+          f" por região {uso['especializado']['entrada']} (-{reducao:.0%})")
+    print(f" - do cache de prompt: {uso['especializado']['cache']}; sem cache: {faturados}")
+    print(" - com --streaming: mesmos tokens por página (uso lido do último evento do stream)")
+
+
+def test_hibrido_simulado(num_pdfs=4):
+    """Rotina de teste do motor híbrido: OCR local nos recortes e visão só para os campos reprovados.
+
+    Usa as notas digitalizadas simuladas de codificacao_imagem.criar_fixtures
+    (PDF só com imagem) e compara requisições, tempo e acertos dos motores
+    'visao', 'hibrido' e 'ocr'. O servidor simulado devolve o gabarito da nota.
+    """
+    from codificacao_imagem import criar_fixtures
+    from servidor_simulado import ServidorOpenRouterSimulado
+    from validacao import valores_conferem
+
+    print('\n🔬 Teste do motor híbrido (OCR local + visão) simulado:')
+    try:
+        verificar_ocr()
+    except Exception as e:
+        print(f" - OCR local indisponível ({e}); teste ignorado")
+        return
+
+    def confere(campo, valor, esperado):
+        if campo in ('quantidade', 'valor_unitario', 'valor_total'):
+            return valor is not None and valores_conferem(valor, 1, esperado)
+        return OpenRouterExtractor._normalizar_valor(esperado, campo) == valor
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = criar_fixtures(Path(tmp) / "notas", num_pdfs)
+        gabarito_atual = {}
+        metricas = {}
+        with ServidorOpenRouterSimulado(lambda payload: gabarito_atual) as servidor:
+            for motor in ('visao', 'hibrido', 'ocr'):
+                extractor = OpenRouterExtractor(api_key='test', base_url=servidor.url, reconsultar=False,
+                                                motor_extracao=motor)
+                antes, acertos, ocr_certos, ocr_total = servidor.total_requisicoes, 0, 0, 0
+                inicio = time.perf_counter()
+                for caminho, gabarito in fixtures:
+                    gabarito_atual = gabarito
+                    resultado = extractor.processar_pdf(caminho)
+                    for campo, esperado in gabarito.items():
+                        certo = confere(campo, resultado[campo], esperado)
+                        acertos += certo
+                        if resultado.get('origem_campos', {}).get(campo) == 'ocr':
+                            ocr_total += 1
+                            ocr_certos += certo
+                metricas[motor] = (servidor.total_requisicoes - antes, time.perf_counter() - inicio,
+                                   acertos, ocr_certos, ocr_total)
+
+    total_campos = num_pdfs * 10
+    for motor, (requisicoes, tempo, acertos, ocr_certos, ocr_total) in metricas.items():
+        print(f" - {motor}: {requisicoes} requisição(ões), {tempo:.2f}s, {acertos}/{total_campos} campos corretos"
+              + (f", OCR local {ocr_certos}/{ocr_total} corretos" if ocr_total else ""))
+    assert metricas['visao'][0] == 4 * num_pdfs, metricas
+    assert metricas['ocr'][0] == 0 and metricas['ocr'][4] > 0, metricas
+    assert metricas['hibrido'][0] < metricas['visao'][0] / 2, metricas
+    # Os campos aceitos pelo OCR passaram no validador e na confiança do Tesseract
+    assert metricas['hibrido'][3] >= 0.9 * metricas['hibrido'][4], metricas
+
+
+def _normalizar_valor_referencia(valor):
+    """Implementação original de _normalizar_valor (antes da tabela por tipo), para o microbenchmark"""
+    if valor is None:
+        return None
+    if isinstance(valor, (int, float)):
+        return str(valor)
+    s = str(valor).strip()
+    if not s:
+        return None
+    s = s.replace('\u00a0', '').replace('\n', ' ').strip()
+    if any(c.isalpha() for c in s):
+        if re.search(r'\d', s):
+            s_clean = re.sub(r'[^A-Za-z0-9\- ]', '', s)
+            return s_clean.upper().strip()
+        else:
+            return s.upper()
+    try:
+        if '.' in s and ',' in s:
+            s2 = s.replace('.', '').replace(',', '.')
+        elif ',' in s and '.' not in s:
+            s2 = s.replace(',', '.')
+        else:
+            s2 = s
+        s2 = re.sub(r'[^0-9\.-]', '', s2)
+        if s2 == '' or s2 == '.' or s2 == '-':
+            return None
+        return s2
+    except Exception:
+        return s
+
+
+def test_normalizacao_simulado(repeticoes=20000):
+    """Microbenchmark de _normalizar_valor: implementação original x genérica atual x tabela por campo.
+
+    Usa respostas realistas da API (formatos brasileiros, placas antigas e
+    Mercosul, datas e horas) e confere que as três formas devolvem o mesmo
+    valor, exceto os valores com 'R$', que só a tabela trata.
+    """
+    respostas = [
+        {'data_documento': '15/03/2024', 'hora_documento': '14:32', 'tipo_combustível': 'DS',
+         'quantidade': '22,850', 'valor_unitario': '5,890', 'valor_total': '134,58', 'numero_documento': '5708',
+         'placa': 'FEI6365', 'km': '465625', 'modelo_veiculo': 'AMB. RENAULT'},
+        {'data_documento': '02/01/2025', 'hora_documento': '07:05:44', 'tipo_combustível': 'g',
+         'quantidade': '45.000', 'valor_unitario': '6.390', 'valor_total': '1.287,55', 'numero_documento': '8109',
+         'placa': 'abc-1234', 'km': '123.456', 'modelo_veiculo': 'FIAT STRADA'},
+        {'data_documento': '30012025', 'hora_documento': '2359', 'tipo_combustível': 'D',
+         'quantidade': '1.234,567', 'valor_unitario': 'R$ 5,49', 'valor_total': 'R$ 6.777,77',
+         'numero_documento': '1234', 'placa': 'ABC1D23', 'km': '98765', 'modelo_veiculo': 'VW GOL 1.0'},
+    ]
+    valores = [(campo, valor) for resposta in respostas for campo, valor in resposta.items()]
+    normalizar = OpenRouterExtractor._normalizar_valor
+
+    for campo, valor in valores:
+        original, generico, tabela = _normalizar_valor_referencia(valor), normalizar(valor), normalizar(valor, campo)
+        assert original == generico, (campo, valor, original, generico)
+        assert generico == tabela or valor.startswith('R$'), (campo, valor, generico, tabela)
+    assert normalizar('R$ 6.777,77', 'valor_total') == '6777.77'
+
+    formas = {
+        'original': lambda campo, valor: _normalizar_valor_referencia(valor),
+        'genérica': lambda campo, valor: normalizar(valor),
+        'tabela': lambda campo, valor: normalizar(valor, campo),
+    }
+    # Melhor de 3 rodadas alternadas, para reduzir o ruído da máquina
+    tempos = dict.fromkeys(formas, float('inf'))
+    for _ in range(3):
+        for nome, funcao in formas.items():
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                for campo, valor in valores:
+                    funcao(campo, valor)
+            tempos[nome] = min(tempos[nome], time.perf_counter() - inicio)
+
+    total = repeticoes * len(valores)
+    print('\n🔬 Microbenchmark de _normalizar_valor')
+    for nome, tempo in tempos.items():
+        print(f" - {nome}: {total / tempo:,.0f} valores/s ({tempo * 1e9 / total:.0f} ns/valor,"
+              f" {tempos['original'] / tempo:.1f}x a original)")
+
+
 if __name__ == "__main__":
     # Se a variável de ambiente TEST_SIM estiver definida, executa o teste simulado
     if os.getenv('TEST_SIM') == '1':
         test_parsing_simulado()
+    elif os.getenv('TEST_SIM') == 'lote':
+        test_lote_simulado(modo_lote=os.getenv('TEST_SIM_MODO', 'regiao'))
+    elif os.getenv('TEST_SIM') == 'diario':
+        test_diario_simulado()
+    elif os.getenv('TEST_SIM') == 'texto':
+        test_camada_texto_simulado()
+    elif os.getenv('TEST_SIM') == 'modelos':
+        test_modelos_simulado()
+    elif os.getenv('TEST_SIM') == 'confianca':
+        test_confianca_simulado()
+    elif os.getenv('TEST_SIM') == 'limitador':
+        test_limitador_simulado()
+    elif os.getenv('TEST_SIM') == 'normalizacao':
+        test_normalizacao_simulado()
+    elif os.getenv('TEST_SIM') == 'streaming':
+        test_streaming_simulado()
+    elif os.getenv('TEST_SIM') == 'roteamento':
+        test_roteamento_simulado()
+    elif os.getenv('TEST_SIM') == 'prompt':
+        test_prompt_simulado()
+    elif os.getenv('TEST_SIM') == 'hibrido':
+        test_hibrido_simulado()
     else:
         main()
 
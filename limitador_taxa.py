@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+
+def calcular_espera(tentativa: int, base: float = 1.0, maximo: float = 60.0) -> float:
+    """Backoff exponencial com jitter completo: sorteia entre 0 e min(maximo, base * 2^tentativa)"""
+    return random.uniform(0, min(maximo, base * (2 ** tentativa)))
+
+
+def interpretar_retry_after(valor) -> float:
+    """Converte o cabeçalho Retry-After (segundos ou data HTTP) em segundos; None se ausente/inválido"""
+    if not valor:
+        return None
+    try:
+        return max(0.0, float(valor))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(valor).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def interpretar_reset(valor) -> float:
+    """Converte X-RateLimit-Reset em segundos até o reset.
+
+    Aceita timestamp em milissegundos (formato do OpenRouter), timestamp em
+    segundos ou um intervalo relativo em segundos.
+    """
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    if numero > 1e12:
+        numero /= 1000.0
+    if numero > 1e9:
+        return max(0.0, numero - time.time())
+    return max(0.0, numero)
+
+
+class LimitadorTaxa:
+    """Token bucket adaptativo compartilhado por todos os workers do extrator.
+
+    A taxa começa em `taxa` requisições/s e se ajusta pelas respostas da API
+    (AIMD): cada sucesso aumenta a taxa em `incremento`; cada 429 ou 5xx a
+    reduz pela metade. Um 429 com Retry-After (ou X-RateLimit-Remaining = 0)
+    pausa todos os workers até o momento indicado.
+    """
+
+    def __init__(self, taxa: float = 10.0, capacidade: float = 4, taxa_minima: float = 0.2,
+                 taxa_maxima: float = None, incremento: float = 0.1):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self.taxa_minima = taxa_minima
+        self.taxa_maxima = taxa_maxima or taxa * 4
+        self.incremento = incremento
+        self.limites_recebidos = 0
+        self.erros_servidor = 0
+        self._tokens = float(capacidade)
+        self._ultima_recarga = time.monotonic()
+        self._pausado_ate = 0.0
+        self._lock = threading.Lock()
+
+    def _recarregar(self, agora):
+        self._tokens = min(self.capacidade, self._tokens + (agora - self._ultima_recarga) * self.taxa)
+        self._ultima_recarga = agora
+
+    def adquirir(self):
+        """Bloqueia até haver um token disponível e nenhuma pausa ativa"""
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._recarregar(agora)
+                if agora < self._pausado_ate:
+                    espera = self._pausado_ate - agora
+                elif self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                else:
+                    espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+    def pausar(self, segundos: float):
+        """Suspende todas as requisições pelos próximos `segundos`"""
+        with self._lock:
+            self._pausado_ate = max(self._pausado_ate, time.monotonic() + segundos)
+            self._tokens = 0.0
+
+    def registrar_sucesso(self, headers=None):
+        with self._lock:
+            self.taxa = min(self.taxa_maxima, self.taxa + self.incremento)
+        # Cota esgotada: espera o reset em vez de provocar um 429
+        if headers is not None and headers.get('X-RateLimit-Remaining') == '0':
+            reset = interpretar_reset(headers.get('X-RateLimit-Reset'))
+            if reset:
+                self.pausar(reset)
+
+    def registrar_limite(self, retry_after: float = None):
+        """Resposta 429: reduz a taxa e, se o servidor informou quando voltar, pausa todos até lá"""
+        with self._lock:
+            self.limites_recebidos += 1
+            self.taxa = max(self.taxa_minima, self.taxa / 2)
+        if retry_after:
+            self.pausar(retry_after)
+
+    def registrar_erro_servidor(self):
+        """Resposta 5xx: reduz a taxa (sem pausa global; o worker faz seu próprio backoff)"""
+        with self._lock:
+            self.erros_servidor += 1
+            self.taxa = max(self.taxa_minima, self.taxa / 2)
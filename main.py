@@ -2,11 +2,24 @@ import os
 import pytesseract
 import fitz  # PyMuPDF
 from pathlib import Path
-from PIL import Image, ImageEnhance, ImageFilter
+from PIL import Image
 import platform
-import io
-import cv2
 import numpy as np
+import argparse
+import contextlib
+import glob
+import io
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from artefatos_debug import (LIMITE_DEBUG_MB, PASTA_DEBUG, definir_debug, encerrar_debug, obter_gravador_debug,
+                             pasta_execucao, resumo_pasta)
+from motor_ocr import MOTORES_OCR, definir_motor_ocr, obter_motor
+from preprocessamento import obter_preprocessador, para_cinza, renderizar_cinza_ocr
+from qualidade_imagem import INCLINACAO_MINIMA, decidir_preprocessamento, endireitar, estimar_qualidade
+from renderizacao import renderizar_regioes, tamanho_renderizado
 
 # Configuração do Tesseract para Windows
 if platform.system() == "Windows":
@@ -27,137 +40,277 @@ if platform.system() == "Windows":
         print("Aviso: Tesseract não encontrado nos caminhos padrão.")
         print("Certifique-se de que está instalado e no PATH do sistema.")
 
-def segmentar_imagem_horizontal(img, num_segmentos=4, segmentos_desejados=[2, 3]):
+def limites_segmentos(altura, num_segmentos=4, segmentos_desejados=[2, 3]):
+    """Faixas (y_inicio, y_fim) em pixels dos segmentos desejados (a página dividida em faixas horizontais)"""
+    altura_segmento = altura // num_segmentos
+    return [
+        (i * altura_segmento, (i + 1) * altura_segmento if i < num_segmentos - 1 else altura)
+        for i in segmentos_desejados
+    ]
+
+def clipes_segmentos(pagina, zoom=2.0, num_segmentos=4, segmentos_desejados=[2, 3]):
+    """Retângulos (fitz.Rect, em pontos PDF) dos segmentos desejados, como em segmentar_pagina_horizontal"""
+    _, height = tamanho_renderizado(pagina, zoom)
+    r = pagina.rect
+    return [
+        fitz.Rect(r.x0, r.y0 + y_inicio / zoom, r.x1, r.y0 + y_fim / zoom)
+        for y_inicio, y_fim in limites_segmentos(height, num_segmentos, segmentos_desejados)
+    ]
+
+def texto_nativo_segmentos(pagina, zoom=2.0, num_segmentos=4, segmentos_desejados=[2, 3]):
+    """
+    Lê a camada de texto nativa do PDF em cada segmento, sem OCR
+    
+    Returns:
+        Lista com o texto de cada segmento desejado ('' quando não há texto,
+        como em PDFs digitalizados)
+    """
+    return [
+        pagina.get_text("text", clip=clip).strip()
+        for clip in clipes_segmentos(pagina, zoom, num_segmentos, segmentos_desejados)
+    ]
+
+def segmentar_pagina_horizontal(pagina, zoom=2.0, num_segmentos=4, segmentos_desejados=[2, 3], cinza=False):
     """
-    Segmenta a imagem horizontalmente e retorna apenas os segmentos desejados
+    Divide a página em num_segmentos faixas horizontais e devolve as desejadas,
+    rasterizando apenas a faixa que contém esses segmentos (clip)
     
     Args:
-        img: Imagem PIL
+        pagina: Página PyMuPDF
+        zoom: Fator de escala da renderização
         num_segmentos: Número de segmentos horizontais (padrão: 4)
-        segmentos_desejados: Lista com índices dos segmentos desejados (0-indexado, padrão: [2,3] = 3ª e 4ª partes)
+        segmentos_desejados: Índices dos segmentos desejados (0-indexado)
+        cinza: Renderiza direto em tons de cinza (modo 'L'), sem conversão de cor depois
     
     Returns:
         Lista de imagens PIL dos segmentos selecionados
     """
-    width, height = img.size
+    width, height = tamanho_renderizado(pagina, zoom)
     altura_segmento = height // num_segmentos
     
-    segmentos = []
-    
     print(f"  Segmentando imagem {width}x{height} em {num_segmentos} partes horizontais")
     print(f"  Altura de cada segmento: {altura_segmento}px")
     
-    for i in segmentos_desejados:
-        # Calcula as coordenadas do segmento
-        y_inicio = i * altura_segmento
-        y_fim = (i + 1) * altura_segmento if i < num_segmentos - 1 else height
-        
-        # Recorta o segmento
-        segmento = img.crop((0, y_inicio, width, y_fim))
-        segmentos.append(segmento)
-        
+    limites = limites_segmentos(height, num_segmentos, segmentos_desejados)
+    for i, (y_inicio, y_fim) in zip(segmentos_desejados, limites):
         print(f"  Segmento {i+1}: y={y_inicio}-{y_fim} (altura: {y_fim-y_inicio}px)")
     
-    return segmentos
+    # Uma única rasterização da faixa que cobre todos os segmentos
+    topo = min(y_inicio for y_inicio, _ in limites)
+    base = max(y_fim for _, y_fim in limites)
+    faixa, = renderizar_regioes(pagina, [(0, topo, width, base)], zoom=zoom, cinza=cinza)
+    
+    return [faixa.crop((0, y_inicio - topo, width, y_fim - topo)) for y_inicio, y_fim in limites]
+
+GATILHOS_FILTROS = ('qualidade', 'caracteres')
+
+def _decidir_filtros(segmento, num_segmento, usar_filtros_avancados):
+    """
+    Decide, antes do OCR, como tratar o segmento (ver qualidade_imagem)
+    
+    Returns:
+        (segmento, metodo, angulo): o segmento (endireitado, se estava inclinado),
+        'pular', None (OCR direto) ou o método de PreprocessadorOCR.binarizar, e o ângulo
+        da correção (0 se não foi preciso endireitar)
+    """
+    qualidade = estimar_qualidade(segmento)
+    metodo, motivo = decidir_preprocessamento(qualidade)
+    if metodo == 'pular':
+        print(f"    Segmento {num_segmento} em branco, OCR dispensado")
+        return segmento, metodo, 0.0
+    if usar_filtros_avancados and metodo is None:
+        metodo = 'simples'
+    print(f"    Qualidade: {motivo} -> {metodo or 'sem filtros'}")
+    angulo = qualidade['inclinacao'] if abs(qualidade['inclinacao']) >= INCLINACAO_MINIMA else 0.0
+    if angulo:
+        print(f"    Endireitando o segmento ({angulo:+.1f}°)")
+        segmento = endireitar(segmento, angulo)
+    return segmento, metodo, angulo
 
-def preprocessar_imagem(img, metodo='simples'):
+def _ocr_segmento(segmento, num_pagina, num_segmento, usar_filtros_avancados=False, gatilho='qualidade',
+                  fonte=None):
     """
-    Aplica filtros de pré-processamento na imagem para melhorar o OCR
+    Aplica OCR em um segmento da página
+    
+    Com gatilho='qualidade', uma estimativa barata da imagem (contraste,
+    borrão, ruído, inclinação e tinta) decide antes do OCR se o segmento está
+    em branco (não vai ao Tesseract), se é lido direto ou com qual filtro:
+    uma única leitura por segmento. Com gatilho='caracteres' (comportamento
+    anterior), o segmento é lido cru e relido com filtros se vierem menos de
+    50 caracteres.
     
     Args:
-        img (PIL.Image): Imagem original
-        metodo (str): Tipo de processamento ('completo', 'simples', 'agressivo')
+        segmento: Imagem PIL do segmento
+        num_pagina: Número da página (1-indexado, usado na amostragem e no nome das imagens de debug)
+        num_segmento: Número do segmento na página (3 ou 4)
+        usar_filtros_avancados (bool): Se True, sempre aplica os filtros
+        gatilho (str): 'qualidade' ou 'caracteres' (ver acima)
+        fonte: (caminho do PDF, índice da página, retângulo em pontos) do segmento; com
+            ela, os filtros recebem o segmento renderizado já no tamanho do OCR, em vez
+            de ampliado a partir de `segmento`
     
     Returns:
-        PIL.Image: Imagem processada
+        str: Texto reconhecido (sem espaços nas pontas) ou None em caso de erro
     """
-    print(f"  Aplicando filtros de pré-processamento ({metodo})...")
+    print(f"  Processando segmento {num_segmento}...")
     
-    # Converte PIL para OpenCV
-    img_cv = cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR)
-    
-    # 1. Redimensiona se a imagem for muito pequena
-    height, width = img_cv.shape[:2]
-    if height < 1500 or width < 1500:
-        scale_factor = max(1500/height, 1500/width)
-        new_width = int(width * scale_factor)
-        new_height = int(height * scale_factor)
-        img_cv = cv2.resize(img_cv, (new_width, new_height), interpolation=cv2.INTER_CUBIC)
-        print(f"    Redimensionada para: {new_width}x{new_height}")
-    
-    # 2. Converte para escala de cinza
-    gray = cv2.cvtColor(img_cv, cv2.COLOR_BGR2GRAY)
-    
-    if metodo == 'simples':
-        # Processamento básico
-        blurred = cv2.GaussianBlur(gray, (3, 3), 0)
-        threshold = cv2.threshold(blurred, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
-        final = threshold
-        
-    elif metodo == 'agressivo':
-        # Processamento mais intenso
-        # Desfoque bilateral para preservar bordas
-        bilateral = cv2.bilateralFilter(gray, 9, 75, 75)
-        
-        # CLAHE mais intenso
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        contrast_enhanced = clahe.apply(bilateral)
-        
-        # Threshold adaptativo
-        threshold = cv2.adaptiveThreshold(
-            contrast_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 2
-        )
-        
-        # Operações morfológicas mais agressivas
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        opening = cv2.morphologyEx(threshold, cv2.MORPH_OPEN, kernel)
-        closing = cv2.morphologyEx(opening, cv2.MORPH_CLOSE, kernel)
-        
-        # Filtro mediano
-        final = cv2.medianBlur(closing, 3)
-        
-    else:  # 'completo'
-        # 3. Aplica desfoque gaussiano para reduzir ruído
-        blurred = cv2.GaussianBlur(gray, (3, 3), 0)
+    motor = obter_motor()
+    imagem, etapa = segmento, 'cru'  # última imagem enviada ao OCR, para o debug
+    
+    try:
+        metodo, angulo = None, 0.0
+        if gatilho == 'qualidade':
+            segmento, metodo, angulo = _decidir_filtros(segmento, num_segmento, usar_filtros_avancados)
+            if metodo == 'pular':
+                _gravar_debug(segmento, num_pagina, num_segmento, 'pulado', fonte, falhou=True)
+                return ''
+            imagem = segmento
+        if metodo is not None:
+            imagem, etapa = _aplicar_filtros(segmento, metodo, fonte, angulo), metodo
         
-        # 4. Melhora o contraste usando CLAHE
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        contrast_enhanced = clahe.apply(blurred)
+        # Tenta primeiro com português, se não funcionar usa inglês
+        try:
+            idioma = 'por'
+            texto_segmento = motor.reconhecer(imagem, idioma)
+        except Exception:
+            print("    Português não disponível, usando inglês...")
+            idioma = 'eng'
+            texto_segmento = motor.reconhecer(imagem, idioma)
         
-        # 5. Aplica threshold adaptativo para binarização
-        threshold = cv2.adaptiveThreshold(
-            contrast_enhanced, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2
-        )
+        # Segunda leitura com filtros: no gatilho antigo, sempre que vier pouco texto;
+        # no de qualidade, só se a leitura direta não devolveu nada de um segmento com tinta
+        if gatilho == 'caracteres':
+            aplicar_filtros = usar_filtros_avancados or len(texto_segmento.strip()) < 50
+        else:
+            aplicar_filtros = metodo is None and not texto_segmento.strip()
         
-        # 6. Remove ruído com operações morfológicas
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
-        cleaned = cv2.morphologyEx(threshold, cv2.MORPH_CLOSE, kernel)
+        if aplicar_filtros:
+            if usar_filtros_avancados:
+                print(f"    Aplicando filtros avançados...")
+            else:
+                print(f"    Pouco texto extraído ({len(texto_segmento.strip())} chars), aplicando filtros...")
+            
+            imagem, etapa = _aplicar_filtros(segmento, 'simples', fonte, angulo), 'simples'
+            
+            try:
+                texto_segmento = motor.reconhecer(imagem, idioma)
+            except Exception:
+                idioma = 'eng'
+                texto_segmento = motor.reconhecer(imagem, idioma)
         
-        # 7. Aplica filtro mediano para suavizar
-        final = cv2.medianBlur(cleaned, 3)
-    
-    # Converte de volta para PIL
-    img_final = Image.fromarray(final)
-    
-    # 8. Aplica sharpening usando PIL
-    enhancer = ImageEnhance.Sharpness(img_final)
-    img_final = enhancer.enhance(1.5)
+        if texto_segmento.strip():
+            print(f"    Texto extraído: {len(texto_segmento.strip())} caracteres")
+        else:
+            print(f"    Nenhum texto reconhecível no segmento {num_segmento}")
+        _gravar_debug(imagem, num_pagina, num_segmento, etapa, fonte, falhou=not texto_segmento.strip())
+        return texto_segmento.strip()
+            
+    except Exception as e:
+        print(f"    Erro ao processar segmento {num_segmento}: {str(e)}")
+        _gravar_debug(imagem, num_pagina, num_segmento, f"{etapa}_erro", fonte, falhou=True)
+        return None
+
+def _gravar_debug(imagem, num_pagina, num_segmento, etapa, fonte, falhou):
+    """Entrega a imagem ao gravador de debug (em segundo plano), se ligado e se ela entra na amostra"""
+    gravador = obter_gravador_debug()
+    if gravador is None or not gravador.deve_gravar(num_pagina, falhou):
+        return
+    prefixo = f"{Path(fonte[0]).stem}_" if fonte else ""
+    gravador.gravar(imagem, f"{prefixo}pagina_{num_pagina}_segmento_{num_segmento}_{etapa}")
+
+def _aplicar_filtros(segmento, metodo, fonte=None, angulo=0.0):
+    """
+    Binarização (PreprocessadorOCR.binarizar) do segmento
     
-    print("  Filtros aplicados com sucesso!")
-    return img_final
+    Com `fonte`, renderiza o segmento em cinza já no tamanho do OCR (sem ampliar
+    depois); sem ela, amplia `segmento` (já endireitado). A imagem devolvida usa o
+    buffer do preprocessador deste processo: vale até o próximo segmento.
+    """
+    print(f"  Aplicando filtros de pré-processamento ({metodo})...")
+    preprocessador = obter_preprocessador()
+    if fonte is not None:
+        cinza = _renderizar_fonte(fonte)
+        if angulo:
+            cinza = endireitar(cinza, angulo)
+    else:
+        cinza = preprocessador.ampliar(para_cinza(segmento))
+    return Image.fromarray(preprocessador.binarizar(cinza, metodo))
+
+# Documento aberto neste processo para renderizar segmentos no tamanho do OCR (caminho, fitz.Document)
+_documento_fonte = (None, None)
 
-def extrair_texto_pdf_ocr(caminho_pdf, usar_filtros_avancados=False):
+def _renderizar_fonte(fonte):
+    """Segmento (caminho do PDF, página, retângulo) em cinza no tamanho do OCR; reabre o PDF só ao trocar de arquivo"""
+    global _documento_fonte
+    caminho, indice_pagina, clip = fonte
+    if _documento_fonte[0] != caminho:
+        if _documento_fonte[1] is not None:
+            _documento_fonte[1].close()
+        _documento_fonte = (caminho, fitz.open(caminho))
+    return renderizar_cinza_ocr(_documento_fonte[1][indice_pagina], fitz.Rect(clip))
+
+def _iniciar_worker(motor_ocr, debug):
+    """Inicializador dos processos do pool: motor de OCR e gravador de debug próprios"""
+    definir_motor_ocr(motor_ocr)
+    definir_debug(debug)
+
+# Pool do OCR dos segmentos deste processo, reaproveitado entre PDFs: (configuração, executor)
+_pool_segmentos = (None, None)
+
+def _obter_pool_segmentos(workers, motor_ocr, debug):
+    """Pool de OCR dos segmentos; só é recriado se a configuração mudar (os workers mantêm o modelo carregado)"""
+    global _pool_segmentos
+    configuracao = (workers, motor_ocr, debug)
+    if _pool_segmentos[0] != configuracao:
+        encerrar_pool_segmentos()
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker,
+                                       initargs=(motor_ocr, debug))
+        _pool_segmentos = (configuracao, executor)
+    return _pool_segmentos[1]
+
+def encerrar_pool_segmentos():
+    """Encerra o pool de OCR dos segmentos, se houver (os workers esvaziam a fila de debug ao sair)"""
+    global _pool_segmentos
+    if _pool_segmentos[1] is not None:
+        _pool_segmentos[1].shutdown()
+    _pool_segmentos = (None, None)
+
+def _ocr_segmento_tarefa(tarefa):
+    """Desempacota uma tarefa (imagem, página, segmento, filtros, gatilho, fonte) para o pool de processos"""
+    return _ocr_segmento(*tarefa)
+
+def extrair_texto_pdf_ocr(caminho_pdf, usar_filtros_avancados=False, workers=1, motor_ocr='auto',
+                          usar_camada_texto=True, gatilho='qualidade', debug=None, estatisticas=None):
     """
     Extrai texto de um arquivo PDF digitalizado usando PyMuPDF + Tesseract OCR
     
     Args:
         caminho_pdf (str): Caminho para o arquivo PDF
         usar_filtros_avancados (bool): Se True, aplica filtros avançados
+        workers (int): Processos de OCR em paralelo (1 = sequencial). As páginas são
+            renderizadas neste processo e cada segmento vira uma tarefa do pool;
+            o texto é remontado na ordem das páginas.
+        motor_ocr (str): 'auto', 'tesserocr' (API do Tesseract mantida aberta por worker)
+            ou 'pytesseract' (um processo `tesseract` por chamada)
+        usar_camada_texto (bool): Usa o texto nativo do PDF nos segmentos que o têm
+            e aplica OCR apenas nos demais
+        gatilho (str): Como decidir os filtros de cada segmento: 'qualidade' (estimativa
+            da imagem antes do OCR) ou 'caracteres' (relê com filtros se vierem < 50 caracteres)
+        debug (dict): Configuração do artefatos_debug.GravadorDebug (pasta, a_cada, so_falhas,
+            limite_mb) para gravar as imagens enviadas ao OCR; None (padrão) não grava nada.
+            Com workers > 1, cada processo grava na mesma pasta com uma parte do limite.
+        estatisticas (dict): Se informado, é preenchido com páginas, segmentos (camada de
+            texto, OCR e com erro), tempos por etapa em segundos (renderizacao, ocr,
+            montagem) e a mensagem de erro, se houver (usado pelo processamento em lote)
     
     Returns:
-        str: Texto extraído do PDF usando OCR
+        str: Texto extraído do PDF (camada de texto e/ou OCR)
     """
     texto_completo = ""
+    if estatisticas is None:
+        estatisticas = {}
+    tempos = estatisticas.setdefault('tempos', {})
+    inicio = time.perf_counter()
     
     try:
         print(f"Abrindo PDF: {caminho_pdf}")
@@ -165,78 +318,91 @@ def extrair_texto_pdf_ocr(caminho_pdf, usar_filtros_avancados=False):
         # Abre o PDF com PyMuPDF
         documento = fitz.open(caminho_pdf)
         num_paginas = documento.page_count
+        estatisticas['paginas'] = num_paginas
         
         print(f"Número de páginas: {num_paginas}")
         
-        # Processa cada página
+        # Pega apenas 3ª e 4ª partes de cada página
+        segmentos_desejados = [2, 3]
+        
+        # Segmentos com camada de texto nativa usam esse texto; os demais viram tarefas de OCR
+        textos_segmentos = {}  # (num_pagina, num_segmento) -> texto
+        tarefas = []
         for i in range(num_paginas):
             print(f"Processando página {i+1}/{num_paginas}...")
             
             # Obtém a página
             pagina = documento[i]
             
-            # Converte a página para imagem (matriz de pixels)
             # zoom = 2.0 para melhor qualidade (300 DPI aproximadamente)
-            matriz = fitz.Matrix(2.0, 2.0)
-            pix = pagina.get_pixmap(matrix=matriz)
-            
-            # Converte para PIL Image
-            img_data = pix.tobytes("ppm")
-            img_original = Image.open(io.BytesIO(img_data))
-            
-            print(f"  Imagem original: {img_original.size}")
+            print(f"  Imagem original: {tamanho_renderizado(pagina, zoom=2.0)}")
             
-            # Segmenta a imagem horizontalmente (pega apenas 3ª e 4ª partes)
-            segmentos = segmentar_imagem_horizontal(img_original, num_segmentos=4, segmentos_desejados=[2, 3])
+            faltantes = segmentos_desejados
+            if usar_camada_texto:
+                nativos = texto_nativo_segmentos(pagina, zoom=2.0, num_segmentos=4,
+                                                 segmentos_desejados=segmentos_desejados)
+                for idx_seg, texto in zip(segmentos_desejados, nativos):
+                    if texto:
+                        print(f"  Segmento {idx_seg+1}: camada de texto nativa ({len(texto)} caracteres), sem OCR")
+                        textos_segmentos[(i + 1, idx_seg + 1)] = texto
+                faltantes = [idx_seg for idx_seg, texto in zip(segmentos_desejados, nativos) if not texto]
+            if not faltantes:
+                continue
             
-            # Processa cada segmento separadamente
-            texto_segmentos = []
+            # Rasteriza só a faixa dos segmentos restantes, já em tons de cinza
+            segmentos = segmentar_pagina_horizontal(pagina, zoom=2.0, num_segmentos=4, segmentos_desejados=faltantes,
+                                                    cinza=True)
+            clipes = clipes_segmentos(pagina, zoom=2.0, num_segmentos=4, segmentos_desejados=faltantes)
             
-            for idx_seg, segmento in enumerate(segmentos):
-                print(f"  Processando segmento {idx_seg+3}...")  # +3 porque são o 3º e 4º segmentos
-                
-                # Aplica OCR diretamente com processamento básico (mais rápido)
-                try:
-                    # Tenta primeiro com português, se não funcionar usa inglês
-                    try:
-                        config_tesseract = '--psm 6 -l por'
-                        texto_segmento = pytesseract.image_to_string(segmento, config=config_tesseract)
-                    except Exception:
-                        print("    Português não disponível, usando inglês...")
-                        config_tesseract = '--psm 6 -l eng'
-                        texto_segmento = pytesseract.image_to_string(segmento, config=config_tesseract)
-                    
-                    # Se o resultado não for satisfatório ou filtros avançados estiverem ativados, aplica filtros
-                    aplicar_filtros = usar_filtros_avancados or len(texto_segmento.strip()) < 50
-                    
-                    if aplicar_filtros:
-                        if not usar_filtros_avancados:
-                            print(f"    Pouco texto extraído ({len(texto_segmento.strip())} chars), aplicando filtros...")
-                        else:
-                            print(f"    Aplicando filtros avançados...")
-                            
-                        img_processada = preprocessar_imagem(segmento, 'simples')
-                        
-                        # Salva a imagem processada para debug
-                        debug_filename = f"debug_pagina_{i+1}_segmento_{idx_seg+3}_filtrado.png"
-                        img_processada.save(debug_filename)
-                        
-                        try:
-                            texto_segmento = pytesseract.image_to_string(img_processada, config=config_tesseract)
-                        except Exception:
-                            config_tesseract = '--psm 6 -l eng'
-                            texto_segmento = pytesseract.image_to_string(img_processada, config=config_tesseract)
-                    
-                    # Adiciona o resultado deste segmento
-                    if texto_segmento.strip():
-                        texto_segmentos.append(f"--- SEGMENTO {idx_seg+3} ---\n{texto_segmento.strip()}")
-                        print(f"    Texto extraído: {len(texto_segmento.strip())} caracteres")
-                    else:
-                        print(f"    Nenhum texto reconhecível no segmento {idx_seg+3}")
-                        
-                except Exception as e:
-                    print(f"    Erro ao processar segmento {idx_seg+3}: {str(e)}")
-                    continue
+            for idx_seg, segmento, clip in zip(faltantes, segmentos, clipes):
+                # A fonte permite renderizar o segmento de novo, no tamanho do OCR, se ele precisar de filtros
+                fonte = (str(caminho_pdf), i, tuple(clip))
+                tarefas.append((segmento, i + 1, idx_seg + 1, usar_filtros_avancados, gatilho, fonte))
+        
+        # Fecha o documento
+        documento.close()
+        tempos['renderizacao'] = time.perf_counter() - inicio
+        estatisticas['segmentos_camada_texto'] = len(textos_segmentos)
+        estatisticas['segmentos_ocr'] = len(tarefas)
+        
+        if textos_segmentos:
+            print(f"Camada de texto: {len(textos_segmentos)} segmento(s) sem OCR,"
+                  f" {len(tarefas)} segmento(s) para OCR")
+        
+        definir_motor_ocr(motor_ocr)
+        definir_debug(debug)
+        if tarefas:
+            print(f"Motor de OCR: {obter_motor().nome}")
+        
+        # Aplica OCR nos segmentos (em paralelo se workers > 1); map preserva a ordem das tarefas
+        inicio = time.perf_counter()
+        if workers > 1 and len(tarefas) > 1:
+            print(f"Aplicando OCR em {len(tarefas)} segmento(s) com {workers} processos...")
+            # Cada worker cria seu próprio motor (o modelo é carregado uma vez por processo)
+            # e seu gravador de debug, com uma parte do limite da pasta
+            debug_worker = dict(debug, limite_mb=debug.get('limite_mb', LIMITE_DEBUG_MB) / workers) if debug else None
+            executor = _obter_pool_segmentos(workers, motor_ocr, debug_worker)
+            try:
+                textos = list(executor.map(_ocr_segmento_tarefa, tarefas))
+            except BrokenProcessPool:
+                encerrar_pool_segmentos()  # o próximo PDF cria um pool novo
+                raise
+        else:
+            textos = [_ocr_segmento_tarefa(tarefa) for tarefa in tarefas]
+        tempos['ocr'] = time.perf_counter() - inicio
+        estatisticas['segmentos_erro'] = sum(texto is None for texto in textos)
+        
+        inicio = time.perf_counter()
+        for (_, num_pagina, num_segmento, *_), texto in zip(tarefas, textos):
+            textos_segmentos[(num_pagina, num_segmento)] = texto
+        
+        # Remonta o texto página a página
+        for i in range(num_paginas):
+            texto_segmentos = [
+                f"--- SEGMENTO {idx_seg + 1} ---\n{textos_segmentos[(i + 1, idx_seg + 1)]}"
+                for idx_seg in segmentos_desejados
+                if textos_segmentos.get((i + 1, idx_seg + 1))
+            ]
             
             # Combina todos os segmentos desta página
             if texto_segmentos:
@@ -246,22 +412,27 @@ def extrair_texto_pdf_ocr(caminho_pdf, usar_filtros_avancados=False):
                 texto_completo += "\n"
             else:
                 print(f"Aviso: Página {i+1} não contém texto reconhecível nos segmentos 3 e 4")
-        
-        # Fecha o documento
-        documento.close()
+        tempos['montagem'] = time.perf_counter() - inicio
     
     except Exception as e:
         print(f"Erro ao processar PDF {caminho_pdf}: {str(e)}")
+        estatisticas['erro'] = str(e)
         return None
     
     return texto_completo
 
-def processar_primeiro_pdf(usar_filtros_avancados=False):
+def processar_primeiro_pdf(usar_filtros_avancados=False, workers=1, motor_ocr='auto', usar_camada_texto=True,
+                           gatilho='qualidade', debug=None):
     """
     Processa o primeiro arquivo PDF encontrado na pasta tests usando PyMuPDF + OCR
     
     Args:
         usar_filtros_avancados (bool): Se True, aplica filtros avançados em todas as imagens
+        workers (int): Processos de OCR em paralelo
+        motor_ocr (str): Motor de OCR ('auto', 'tesserocr' ou 'pytesseract')
+        usar_camada_texto (bool): Aproveita o texto nativo do PDF quando existir
+        gatilho (str): Como decidir os filtros de cada segmento ('qualidade' ou 'caracteres')
+        debug (dict): Configuração das imagens de debug (ver extrair_texto_pdf_ocr); None = desligado
     """
     pasta_tests = Path("tests")
     
@@ -282,7 +453,8 @@ def processar_primeiro_pdf(usar_filtros_avancados=False):
     print(f"Modo de filtros avançados: {'Ativado' if usar_filtros_avancados else 'Desativado (mais rápido)'}")
     
     # Extrai o texto usando PyMuPDF + OCR
-    texto_extraido = extrair_texto_pdf_ocr(primeiro_pdf, usar_filtros_avancados)
+    texto_extraido = extrair_texto_pdf_ocr(primeiro_pdf, usar_filtros_avancados, workers, motor_ocr,
+                                           usar_camada_texto, gatilho, debug)
     
     if texto_extraido and texto_extraido.strip():
         print("\n" + "="*50)
@@ -300,14 +472,139 @@ def processar_primeiro_pdf(usar_filtros_avancados=False):
     else:
         print("Não foi possível extrair texto do PDF usando OCR")
 
+ARQUIVO_MANIFESTO = "manifesto_ocr.jsonl"
+
+def listar_pdfs(entrada):
+    """PDFs de uma pasta, de um padrão glob (ex.: 'notas/**/*.pdf') ou um único arquivo, em ordem alfabética"""
+    caminho = Path(entrada)
+    if caminho.is_dir():
+        return sorted(caminho.glob("*.pdf"))
+    if caminho.is_file():
+        return [caminho]
+    return sorted(Path(p) for p in glob.glob(str(entrada), recursive=True) if p.lower().endswith(".pdf"))
+
+def _nomes_saida(arquivos_pdf):
+    """Nome do .txt de cada PDF; nomes repetidos (mesmo nome em pastas diferentes) ganham _2, _3..."""
+    nomes, usados = [], {}
+    for pdf in arquivos_pdf:
+        base = f"texto_extraido_ocr_{pdf.stem}"
+        usados[base] = usados.get(base, 0) + 1
+        nomes.append(f"{base}.txt" if usados[base] == 1 else f"{base}_{usados[base]}.txt")
+    return nomes
+
+def _extrair_arquivo_lote(tarefa):
+    """
+    Extrai um PDF do lote (executado no pool de processos, um arquivo por tarefa)
+
+    O log detalhado de cada arquivo é descartado para que os processos não
+    intercalem mensagens; o que interessa fica nas estatísticas do manifesto.
+
+    Returns:
+        (texto ou None, estatísticas)
+    """
+    caminho_pdf, usar_filtros_avancados, motor_ocr, usar_camada_texto, gatilho, debug = tarefa
+    estatisticas = {'tempos': {}}
+    inicio = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        texto = extrair_texto_pdf_ocr(caminho_pdf, usar_filtros_avancados, 1, motor_ocr, usar_camada_texto,
+                                      gatilho, debug, estatisticas)
+    estatisticas['tempos']['total'] = time.perf_counter() - inicio
+    return texto, estatisticas
+
+def processar_lote_ocr(entrada, pasta_saida="saida_ocr", usar_filtros_avancados=False, workers=1,
+                       motor_ocr='auto', usar_camada_texto=True, gatilho='qualidade', debug=None):
+    """
+    Aplica o OCR em todos os PDFs de uma pasta ou padrão glob, sem interação
+
+    Cada arquivo é uma tarefa do pool de processos (o OCR de cada arquivo é
+    sequencial dentro do seu processo); o motor de OCR e o gravador de debug
+    são criados uma vez por processo e servem a todos os seus arquivos. À medida que cada arquivo termina, o
+    texto é gravado em <pasta_saida>/texto_extraido_ocr_<nome>.txt e uma linha
+    é acrescentada ao manifesto (<pasta_saida>/manifesto_ocr.jsonl) com
+    páginas, caracteres, segmentos, tempo por etapa e o erro, se houver.
+
+    Args:
+        entrada: Pasta, padrão glob ou arquivo PDF (ver listar_pdfs)
+        pasta_saida: Pasta dos textos e do manifesto (criada se não existir)
+        usar_filtros_avancados, motor_ocr, usar_camada_texto, gatilho, debug: ver extrair_texto_pdf_ocr
+        workers (int): Arquivos processados em paralelo (1 = sequencial)
+
+    Returns:
+        list: Registros do manifesto, na ordem em que os arquivos terminaram
+    """
+    arquivos_pdf = listar_pdfs(entrada)
+    if not arquivos_pdf:
+        print(f"Nenhum arquivo PDF encontrado em '{entrada}'!")
+        return []
+
+    pasta_saida = Path(pasta_saida)
+    pasta_saida.mkdir(parents=True, exist_ok=True)
+    nomes_saida = dict(zip(arquivos_pdf, _nomes_saida(arquivos_pdf)))
+    workers = max(1, min(workers, len(arquivos_pdf)))
+    print(f"Lote: {len(arquivos_pdf)} arquivo(s) PDF, {workers} processo(s), saída em {pasta_saida}")
+
+    # Cada processo tem seu gravador de debug, com uma parte do limite da pasta
+    debug_worker = dict(debug, limite_mb=debug.get('limite_mb', LIMITE_DEBUG_MB) / workers) if debug else None
+    tarefas = {pdf: (str(pdf), usar_filtros_avancados, motor_ocr, usar_camada_texto, gatilho, debug_worker)
+               for pdf in arquivos_pdf}
+
+    registros = []
+    inicio = time.perf_counter()
+    with open(pasta_saida / ARQUIVO_MANIFESTO, 'w', encoding='utf-8') as manifesto, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker,
+                                initargs=(motor_ocr, debug_worker)) as executor:
+        futuros = {executor.submit(_extrair_arquivo_lote, tarefa): pdf for pdf, tarefa in tarefas.items()}
+        for futuro in as_completed(futuros):
+            pdf = futuros[futuro]
+            try:
+                texto, estatisticas = futuro.result()
+            except Exception as e:  # processo do pool encerrado de forma anormal
+                texto, estatisticas = None, {'tempos': {}, 'erro': str(e) or type(e).__name__}
+
+            saida = None
+            if texto and texto.strip():
+                inicio_gravacao = time.perf_counter()
+                saida = pasta_saida / nomes_saida[pdf]
+                with open(saida, 'w', encoding='utf-8') as arquivo:
+                    arquivo.write(texto)
+                estatisticas['tempos']['gravacao'] = time.perf_counter() - inicio_gravacao
+
+            registro = {
+                'arquivo': str(pdf),
+                'saida': saida.name if saida else None,
+                'paginas': estatisticas.get('paginas'),
+                'caracteres': len(texto) if texto else 0,
+                'segmentos_ocr': estatisticas.get('segmentos_ocr', 0),
+                'segmentos_camada_texto': estatisticas.get('segmentos_camada_texto', 0),
+                'segmentos_erro': estatisticas.get('segmentos_erro', 0),
+                'tempos': {etapa: round(segundos, 3) for etapa, segundos in estatisticas['tempos'].items()},
+                'erro': estatisticas.get('erro'),
+            }
+            manifesto.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            manifesto.flush()
+            registros.append(registro)
+
+            situacao = f"ERRO: {registro['erro']}" if registro['erro'] else (
+                f"{registro['paginas']} página(s), {registro['caracteres']} caracteres"
+                + (f", {registro['segmentos_erro']} segmento(s) com erro" if registro['segmentos_erro'] else ""))
+            print(f"[{len(registros)}/{len(arquivos_pdf)}] {pdf.name}: {situacao}"
+                  f" ({registro['tempos'].get('total', 0):.1f} s)")
+
+    erros = sum(1 for registro in registros if registro['erro'])
+    print(f"\nLote concluído em {time.perf_counter() - inicio:.1f} s: {len(registros) - erros} arquivo(s) ok,"
+          f" {erros} com erro")
+    print(f"Manifesto: {pasta_saida / ARQUIVO_MANIFESTO}")
+    return registros
+
 def verificar_instalacao():
     """Verifica se Tesseract está instalado"""
     print("Verificando instalação...")
     
     # Verifica Tesseract
     try:
-        versao_tesseract = pytesseract.get_tesseract_version()
-        print(f"✓ Tesseract instalado - Versão: {versao_tesseract}")
+        motor = obter_motor()
+        versao_tesseract = motor.versao()
+        print(f"✓ Tesseract instalado - Versão: {versao_tesseract} (motor: {motor.nome})")
     except Exception as e:
         print(f"✗ Erro com Tesseract: {str(e)}")
         return False
@@ -322,10 +619,53 @@ def verificar_instalacao():
     return True
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extrator de Texto PDF com PyMuPDF + OCR")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Processos de OCR em paralelo (padrão: 1 = sequencial); com --entrada, "
+                             "arquivos processados em paralelo")
+    parser.add_argument("--entrada",
+                        help="Pasta, padrão glob (entre aspas, ex.: 'notas/**/*.pdf') ou PDF: processa todos "
+                             "os arquivos sem o menu interativo")
+    parser.add_argument("--saida", default="saida_ocr",
+                        help="Com --entrada, pasta dos textos e do manifesto_ocr.jsonl (padrão: saida_ocr)")
+    parser.add_argument("--filtros-avancados", action="store_true",
+                        help="Com --entrada, aplica filtros em todos os segmentos (opção 2 do menu)")
+    parser.add_argument("--motor-ocr", choices=MOTORES_OCR, default='auto',
+                        help="Motor de OCR: tesserocr (em processo) ou pytesseract (padrão: auto)")
+    parser.add_argument("--sem-camada-texto", action="store_true",
+                        help="Aplica OCR mesmo em segmentos que já têm texto nativo no PDF")
+    parser.add_argument("--gatilho-filtros", choices=GATILHOS_FILTROS, default='qualidade',
+                        help="Quando aplicar filtros: estimativa da imagem antes do OCR (qualidade) ou "
+                             "releitura se vierem < 50 caracteres (caracteres, comportamento anterior)")
+    parser.add_argument("--debug-imagens", action="store_true",
+                        help=f"Grava as imagens enviadas ao OCR em {PASTA_DEBUG}/<data-hora>/ (desligado por padrão)")
+    parser.add_argument("--debug-a-cada", type=int, default=1, metavar="N",
+                        help="Com --debug-imagens, grava só as páginas 1, N+1, 2N+1... (padrão: todas)")
+    parser.add_argument("--debug-falhas", action="store_true",
+                        help="Com --debug-imagens, grava só os segmentos sem texto reconhecido")
+    parser.add_argument("--debug-limite-mb", type=float, default=LIMITE_DEBUG_MB,
+                        help=f"Tamanho máximo da pasta de debug da execução (padrão: {LIMITE_DEBUG_MB:.0f} MB)")
+    args = parser.parse_args()
+    definir_motor_ocr(args.motor_ocr)
+    debug = None
+    if args.debug_imagens:
+        debug = {'pasta': str(pasta_execucao()), 'a_cada': args.debug_a_cada, 'so_falhas': args.debug_falhas,
+                 'limite_mb': args.debug_limite_mb}
+    
     print("Extrator de Texto PDF com PyMuPDF + OCR")
     print("="*45)
     
-    if verificar_instalacao():
+    if args.entrada:
+        # Lote não interativo (agendável): código de saída 1 se algum arquivo falhar
+        if not verificar_instalacao():
+            sys.exit(1)
+        print("="*45)
+        registros = processar_lote_ocr(args.entrada, args.saida, args.filtros_avancados, args.workers,
+                                       args.motor_ocr, not args.sem_camada_texto, args.gatilho_filtros, debug)
+        if debug:
+            print(resumo_pasta(debug['pasta']))
+        sys.exit(0 if registros and not any(registro['erro'] for registro in registros) else 1)
+    elif verificar_instalacao():
         print("="*45)
         print("Opções de processamento:")
         print("1. Rápido (sem filtros) - Recomendado")
@@ -336,7 +676,12 @@ if __name__ == "__main__":
         usar_filtros = escolha == "2"
         
         print("="*45)
-        processar_primeiro_pdf(usar_filtros)
+        processar_primeiro_pdf(usar_filtros, args.workers, args.motor_ocr, not args.sem_camada_texto,
+                               args.gatilho_filtros, debug)
+        encerrar_pool_segmentos()
+        resumo_debug = encerrar_debug()
+        if resumo_debug:
+            print(resumo_debug)
     else:
         print("="*45)
         print("Erro: Dependências não instaladas corretamente!")
@@ -0,0 +1,125 @@
+import json
+import threading
+from collections import Counter
+from pathlib import Path
+
+ARQUIVO_MODELOS = Path(__file__).with_name("modelos_regioes.json")
+
+
+class ModeloRegioes:
+    """Layout de documento: regiões de interesse em unidades relativas à página.
+
+    Cada região é (x0, y0, x1, y1) com valores entre 0 e 1, então o mesmo
+    modelo serve para qualquer tamanho de página ou zoom de renderização.
+    `campos` associa cada região aos campos do CSV que ela contém.
+    """
+
+    def __init__(self, nome, regioes, ancoras=(), proporcao=None, descricao="", campos=None):
+        self.nome = nome
+        self.regioes = [(label, tuple(caixa)) for label, caixa in regioes]
+        self.campos = {label: list(lista) for label, lista in (campos or {}).items()}
+        self.ancoras = list(ancoras)
+        self.proporcao = proporcao
+        self.descricao = descricao
+
+    @classmethod
+    def de_pixels(cls, nome, regioes_px, largura_ref, altura_ref, **kwargs):
+        """Cria um modelo a partir de regiões (label, (x, y, largura, altura)) medidas em uma página de referência"""
+        regioes = [
+            (label, (x / largura_ref, y / altura_ref, min(1.0, (x + w) / largura_ref), min(1.0, (y + h) / altura_ref)))
+            for label, (x, y, w, h) in regioes_px
+        ]
+        return cls(nome, regioes, proporcao=largura_ref / altura_ref, **kwargs)
+
+    @property
+    def labels(self):
+        return [label for label, _ in self.regioes]
+
+    def caixas_pixels(self, largura, altura):
+        """Converte as regiões para caixas (x0, y0, x1, y1) em pixels de uma página largura x altura"""
+        return [
+            (round(x0 * largura), round(y0 * altura), round(x1 * largura), round(y1 * altura))
+            for _, (x0, y0, x1, y1) in self.regioes
+        ]
+
+    def caixas_pontos(self, retangulo):
+        """Converte as regiões para caixas (x0, y0, x1, y1) em pontos PDF dentro de `retangulo` (pagina.rect)"""
+        largura, altura = retangulo.width, retangulo.height
+        return [
+            (retangulo.x0 + x0 * largura, retangulo.y0 + y0 * altura,
+             retangulo.x0 + x1 * largura, retangulo.y0 + y1 * altura)
+            for _, (x0, y0, x1, y1) in self.regioes
+        ]
+
+
+class CatalogoModelos:
+    """Modelos de regiões carregados de um JSON, com detecção do layout de cada página.
+
+    A detecção não faz chamadas de rede nem rasteriza a página:
+        1. âncoras: o primeiro modelo cujas âncoras aparecem todas na camada
+           de texto da página (busca sem diferenciar maiúsculas);
+        2. proporção: em páginas sem texto (digitalizadas), o modelo com a
+           proporção largura/altura mais próxima, dentro da tolerância;
+        3. o modelo padrão do arquivo.
+    """
+
+    def __init__(self, caminho=ARQUIVO_MODELOS, padrao: ModeloRegioes = None, tolerancia_proporcao: float = 0.03):
+        self.caminho = Path(caminho) if caminho else None
+        self.tolerancia_proporcao = tolerancia_proporcao
+        self.modelos = {}
+        self.deteccoes = Counter()
+        self._lock = threading.Lock()
+
+        nome_padrao = None
+        if self.caminho is not None and self.caminho.exists():
+            with open(self.caminho, encoding='utf-8') as f:
+                config = json.load(f)
+            for nome, dados in config.get('modelos', {}).items():
+                self.modelos[nome] = ModeloRegioes(
+                    nome, dados['regioes'].items(), ancoras=dados.get('ancoras', ()),
+                    proporcao=dados.get('proporcao'), descricao=dados.get('descricao', ""),
+                    campos=dados.get('campos'))
+            nome_padrao = config.get('padrao')
+        elif self.caminho is not None:
+            print(f"  Aviso: arquivo de modelos '{self.caminho}' não encontrado, usando regiões embutidas")
+
+        if nome_padrao in self.modelos:
+            self.padrao = self.modelos[nome_padrao]
+        elif padrao is not None:
+            self.padrao = padrao
+        elif self.modelos:
+            self.padrao = next(iter(self.modelos.values()))
+        else:
+            raise ValueError("Nenhum modelo de regiões disponível")
+
+    def _por_ancoras(self, pagina):
+        candidatos = [m for m in self.modelos.values() if m.ancoras]
+        if not candidatos:
+            return None
+        texto = pagina.get_text("text").upper()
+        if not texto.strip():
+            return None
+        for modelo in candidatos:
+            if all(ancora.upper() in texto for ancora in modelo.ancoras):
+                return modelo
+        return None
+
+    def _por_proporcao(self, pagina):
+        proporcao = pagina.rect.width / pagina.rect.height
+        candidatos = [
+            (abs(m.proporcao - proporcao), m) for m in self.modelos.values()
+            if m.proporcao and abs(m.proporcao - proporcao) <= self.tolerancia_proporcao
+        ]
+        return min(candidatos, key=lambda c: c[0])[1] if candidatos else None
+
+    def detectar(self, pagina) -> ModeloRegioes:
+        """Escolhe o modelo de regiões da página"""
+        modelo = self._por_ancoras(pagina) or self._por_proporcao(pagina) or self.padrao
+        with self._lock:
+            self.deteccoes[modelo.nome] += 1
+        return modelo
+
+    def exibir_resumo(self):
+        if self.deteccoes:
+            detalhes = ", ".join(f"{nome}: {n}" for nome, n in self.deteccoes.most_common())
+            print(f"\n🧩 MODELOS DE REGIÕES: {detalhes} página(s)")
@@ -0,0 +1,179 @@
+import threading
+
+import pytesseract
+
+
+class MotorOCR:
+    """Interface dos motores de OCR usados pelo pipeline.
+
+    reconhecer() recebe uma imagem PIL e devolve o texto. Deve lançar uma
+    exceção quando o idioma pedido não estiver instalado, para que quem chama
+    possa tentar outro idioma (ex.: 'por' -> 'eng').
+    """
+
+    nome = "base"
+    chamadas = 0  # leituras feitas por este motor (reconhecer + palavras), para benchmarks
+
+    def reconhecer(self, imagem, idioma: str = 'por', psm: int = 6) -> str:
+        raise NotImplementedError
+
+    def palavras(self, imagem, idioma: str = 'por', psm: int = 6) -> list:
+        """Palavras reconhecidas: (x0, y0, x1, y1, texto, bloco, linha, n_palavra, confiança 0-100).
+
+        Os oito primeiros itens seguem o formato de page.get_text("words") do
+        PyMuPDF (em pixels da imagem), então os mesmos analisadores servem à
+        camada de texto e ao OCR.
+        """
+        raise NotImplementedError
+
+    def versao(self) -> str:
+        raise NotImplementedError
+
+
+class MotorPytesseract(MotorOCR):
+    """Chama o executável `tesseract` a cada imagem (grava arquivo temporário e recarrega o modelo)"""
+
+    nome = "pytesseract"
+
+    def reconhecer(self, imagem, idioma: str = 'por', psm: int = 6) -> str:
+        self.chamadas += 1
+        return pytesseract.image_to_string(imagem, config=f'--psm {psm} -l {idioma}')
+
+    def palavras(self, imagem, idioma: str = 'por', psm: int = 6) -> list:
+        self.chamadas += 1
+        dados = pytesseract.image_to_data(imagem, config=f'--psm {psm} -l {idioma}',
+                                          output_type=pytesseract.Output.DICT)
+        resultado = []
+        for i, texto in enumerate(dados['text']):
+            confianca = float(dados['conf'][i])
+            if not texto.strip() or confianca < 0:
+                continue
+            x, y = dados['left'][i], dados['top'][i]
+            # Linha única por bloco/parágrafo/linha, como o (bloco, linha) do PyMuPDF
+            linha = dados['par_num'][i] * 1000 + dados['line_num'][i]
+            resultado.append((x, y, x + dados['width'][i], y + dados['height'][i], texto.strip(),
+                              dados['block_num'][i], linha, dados['word_num'][i], confianca))
+        return resultado
+
+    def versao(self) -> str:
+        return str(pytesseract.get_tesseract_version())
+
+
+class MotorTesserocr(MotorOCR):
+    """Mantém uma instância da API do Tesseract aberta (via tesserocr) por thread e idioma.
+
+    O modelo (traineddata) é carregado uma única vez por worker, em vez de a
+    cada segmento, e a imagem é passada em memória, sem arquivo temporário
+    nem processo filho.
+    """
+
+    nome = "tesserocr"
+
+    def __init__(self):
+        import tesserocr  # dependência opcional: pip install tesserocr
+        self._tesserocr = tesserocr
+        self._local = threading.local()
+        self._idiomas_indisponiveis = set()
+
+    def _api(self, idioma, psm):
+        if idioma in self._idiomas_indisponiveis:
+            raise RuntimeError(f"Idioma '{idioma}' não instalado no Tesseract")
+        apis = getattr(self._local, 'apis', None)
+        if apis is None:
+            apis = self._local.apis = {}
+        chave = (idioma, psm)
+        if chave not in apis:
+            try:
+                apis[chave] = self._tesserocr.PyTessBaseAPI(lang=idioma, psm=psm)
+            except RuntimeError:
+                # traineddata ausente: não tenta carregar de novo a cada segmento
+                self._idiomas_indisponiveis.add(idioma)
+                raise
+        return apis[chave]
+
+    def idiomas(self) -> list:
+        """Idiomas (traineddata) que o tesserocr encontra na sua pasta tessdata; [] se ela não existir"""
+        try:
+            _, idiomas = self._tesserocr.get_languages()
+        except RuntimeError:
+            return []
+        return [idioma for idioma in idiomas if idioma != 'osd']
+
+    def reconhecer(self, imagem, idioma: str = 'por', psm: int = 6) -> str:
+        api = self._api(idioma, psm)
+        self.chamadas += 1
+        api.SetImage(imagem)
+        return api.GetUTF8Text()
+
+    def palavras(self, imagem, idioma: str = 'por', psm: int = 6) -> list:
+        api = self._api(idioma, psm)
+        self.chamadas += 1
+        api.SetImage(imagem)
+        api.Recognize()
+        nivel = self._tesserocr.RIL.WORD
+        resultado = []
+        bloco = linha = n_palavra = -1
+        for palavra in self._tesserocr.iterate_level(api.GetIterator(), nivel):
+            if palavra.IsAtBeginningOf(self._tesserocr.RIL.BLOCK):
+                bloco += 1
+            if palavra.IsAtBeginningOf(self._tesserocr.RIL.TEXTLINE):
+                linha, n_palavra = linha + 1, -1
+            n_palavra += 1
+            try:
+                texto = (palavra.GetUTF8Text(nivel) or '').strip()
+            except RuntimeError:
+                # Recorte em branco: o iterador existe, mas não há palavra
+                continue
+            caixa = palavra.BoundingBox(nivel)
+            if texto and caixa:
+                resultado.append((*caixa, texto, bloco, linha, n_palavra, palavra.Confidence(nivel)))
+        return resultado
+
+    def versao(self) -> str:
+        return self._tesserocr.tesseract_version().splitlines()[0]
+
+
+MOTORES_OCR = ('auto', 'tesserocr', 'pytesseract')
+
+# Motor do processo atual (cada worker do pool cria o seu)
+_motor_atual = None
+_preferencia = 'auto'
+
+
+def definir_motor_ocr(preferencia: str = 'auto'):
+    """Escolhe o motor usado por obter_motor() neste processo ('auto' prefere tesserocr).
+
+    A mesma preferência de novo mantém o motor atual (e o modelo já carregado).
+    """
+    global _motor_atual, _preferencia
+    if preferencia not in MOTORES_OCR:
+        raise ValueError(f"Motor de OCR inválido: {preferencia!r}. Use um de {MOTORES_OCR}.")
+    if preferencia == _preferencia:
+        return
+    _preferencia = preferencia
+    _motor_atual = None
+
+
+def obter_motor() -> MotorOCR:
+    """Devolve o motor deste processo, criando-o na primeira chamada.
+
+    Com 'auto', usa tesserocr se estiver instalado e encontrar algum idioma na
+    sua pasta tessdata, e cai para pytesseract caso contrário (o tesserocr pode
+    procurar o tessdata em um caminho diferente do executável `tesseract`).
+    """
+    global _motor_atual
+    if _motor_atual is None:
+        if _preferencia in ('auto', 'tesserocr'):
+            try:
+                _motor_atual = MotorTesserocr()
+            except ImportError:
+                if _preferencia == 'tesserocr':
+                    print("  Aviso: tesserocr não instalado, usando pytesseract")
+                _motor_atual = MotorPytesseract()
+            else:
+                if _preferencia == 'auto' and not _motor_atual.idiomas():
+                    print("  Aviso: tesserocr sem idiomas no tessdata (defina TESSDATA_PREFIX), usando pytesseract")
+                    _motor_atual = MotorPytesseract()
+        else:
+            _motor_atual = MotorPytesseract()
+    return _motor_atual
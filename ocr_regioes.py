@@ -0,0 +1,93 @@
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from camada_texto import extrair_campos_palavras
+from motor_ocr import obter_motor
+from validacao import validar_campo
+
+# Confiança mínima do Tesseract (0 a 1) nas palavras de um valor para dispensar a visão
+LIMIAR_OCR = 0.8
+IDIOMAS_OCR = ('por', 'eng')
+
+_idioma = None  # primeiro idioma de IDIOMAS_OCR que funcionou neste processo
+_lock_idioma = threading.Lock()
+
+
+def palavras_ocr(imagem, escala: float = 1.0) -> list:
+    """
+    Aplica o OCR local em um recorte e devolve as palavras com a confiança de cada uma
+
+    Args:
+        imagem: Recorte PIL (uma região da página)
+        escala: Fator pixels -> pontos (1 / zoom da renderização), para que as
+            distâncias usadas pelos analisadores da camada de texto valham aqui
+
+    Returns:
+        Tuplas (x0, y0, x1, y1, texto, bloco, linha, n_palavra, confiança 0-100)
+    """
+    global _idioma
+    motor = obter_motor()
+    idiomas = (_idioma,) if _idioma else IDIOMAS_OCR
+    for idioma in idiomas:
+        try:
+            palavras = motor.palavras(imagem.convert('L'), idioma)
+        except Exception:
+            if idioma == idiomas[-1]:
+                raise
+            continue
+        with _lock_idioma:
+            _idioma = idioma
+        break
+    return [(p[0] * escala, p[1] * escala, p[2] * escala, p[3] * escala, *p[4:]) for p in palavras]
+
+
+def verificar_ocr():
+    """Lança uma exceção se o Tesseract ou os idiomas de IDIOMAS_OCR não estiverem instalados"""
+    from PIL import Image
+    palavras_ocr(Image.new('L', (32, 32), 255))
+
+
+def _chave(texto: str) -> str:
+    return re.sub(r'[^0-9A-Z]', '', str(texto).upper())
+
+
+def confianca_valor(valor, palavras) -> float:
+    """Menor confiança (0 a 1) entre as palavras que formam o valor.
+
+    Considera as palavras cujo texto aparece dentro do valor (ex.: 'FIAT' e
+    'STRADA' em 'FIAT STRADA'); se nenhuma bater, usa a média do recorte.
+    """
+    alvo = _chave(valor)
+    usadas = [p[8] for p in palavras if _chave(p[4]) and (len(_chave(p[4])) > 1 or alvo == _chave(p[4]))
+              and _chave(p[4]) in alvo]
+    if not usadas:
+        usadas = [p[8] for p in palavras]
+    return min(usadas) / 100 if usadas else 0.0
+
+
+def extrair_campos_ocr(imagem, campos: Optional[List[str]] = None, escala: float = 1.0,
+                       limiar: float = LIMIAR_OCR) -> Tuple[Dict[str, str], Dict[str, float]]:
+    """
+    Lê os campos de um recorte com o OCR local
+
+    Um campo só é aceito se passar no validador (validacao.validar_campo) e se
+    o Tesseract tiver confiança >= `limiar` nas palavras do valor; os demais
+    ficam para o modelo de visão.
+
+    Args:
+        imagem: Recorte PIL da região
+        campos: Campos que a região contém (se None, todos)
+        escala: Fator pixels -> pontos do recorte (1 / zoom)
+        limiar: Confiança mínima do OCR (0 a 1)
+
+    Returns:
+        (campos aceitos -> valor, campos aceitos -> confiança do OCR 0 a 1)
+    """
+    palavras = palavras_ocr(imagem, escala)
+    aceitos, confiancas = {}, {}
+    for campo, valor in extrair_campos_palavras(palavras, campos).items():
+        confianca = confianca_valor(valor, palavras)
+        if validar_campo(campo, valor) and confianca >= limiar:
+            aceitos[campo], confiancas[campo] = valor, round(confianca, 2)
+    return aceitos, confiancas
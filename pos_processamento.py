@@ -0,0 +1,318 @@
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from validacao import CAMPOS
+
+if not hasattr(np, 'strings'):
+    # np.strings (funções vetorizadas de texto) só existe a partir do NumPy 2.0
+    raise ImportError(f"pos_processamento requer NumPy >= 2.0 (instalado: {np.__version__})")
+
+COLUNAS_NUMERICAS = ['quantidade', 'valor_unitario', 'valor_total']
+DATA_MINIMA = np.datetime64('2000-01-01')
+# Como None, NaN, pd.NA e NaT aparecem depois de convertidos para texto
+TEXTOS_NULOS = ('None', 'nan', '<NA>', 'NaT')
+
+
+def _texto(serie) -> np.ndarray:
+    """Coluna como array de strings NumPy (nulos viram ''), sem espaços nas pontas
+
+    Converte direto de object para '<U' e só procura nulos (pd.isna) nas poucas
+    posições cujo texto é o de um nulo, em vez de em toda a coluna.
+    """
+    if isinstance(serie, np.ndarray) and serie.dtype.kind == 'U':
+        return serie
+    valores = np.asarray(serie, dtype=object)
+    texto = valores.astype(str)
+    suspeitos = np.flatnonzero(np.logical_or.reduce([texto == nulo for nulo in TEXTOS_NULOS]))
+    if len(suspeitos):
+        texto[suspeitos[pd.isna(valores[suspeitos])]] = ''
+    return np.strings.strip(texto)
+
+
+def _so_digitos(texto, comprimento) -> np.ndarray:
+    return (np.strings.str_len(texto) == comprimento) & np.strings.isdigit(texto)
+
+
+def _codigos(texto, inicio, fim) -> np.ndarray:
+    """Códigos dos caracteres texto[inicio:fim] (0 depois do fim da string), um por coluna
+
+    Lê direto do buffer do array ('<U' = UTF-32), sem criar strings intermediárias.
+    """
+    largura = max(texto.dtype.itemsize // 4, fim)
+    codigos = np.ascontiguousarray(texto, dtype=f'<U{largura}').view(np.uint32).reshape(len(texto), largura)
+    return codigos[:, inicio:fim].astype(np.int64)
+
+
+def _inteiros(texto, inicio, fim) -> np.ndarray:
+    """Converte texto[inicio:fim] em int onde for só dígitos (-1 nos demais)"""
+    digitos = _codigos(texto, inicio, fim) - ord('0')
+    ok = ((digitos >= 0) & (digitos <= 9)).all(axis=1)
+    pesos = 10 ** np.arange(fim - inicio - 1, -1, -1)
+    return np.where(ok, digitos @ pesos, -1)
+
+
+def _substituir(texto, antigo, novo) -> np.ndarray:
+    """np.strings.replace só nas posições que contêm `antigo` (a busca custa bem menos que a troca)"""
+    contem = np.strings.find(texto, antigo) >= 0
+    if not contem.any():
+        return texto
+    texto = texto.copy()
+    texto[contem] = np.strings.replace(texto[contem], antigo, novo)
+    return texto
+
+
+def numeros_br(serie) -> np.ndarray:
+    """Converte uma coluna de números no formato brasileiro em float, de uma vez.
+
+    '1.234,56' -> 1234.56; '22,850' -> 22.85; '1234.56' (já normalizado) -> 1234.56;
+    '-1,5' -> -1.5. Com vírgula, os pontos são de milhar e saem antes da
+    conversão. Valores vazios ou não numéricos ('1,2,3', '12a') viram NaN.
+    """
+    texto = _substituir(_substituir(_texto(serie), 'R$', ''), ' ', '').copy()
+    com_virgula = np.strings.find(texto, ',') >= 0
+    if com_virgula.any():
+        texto[com_virgula] = np.strings.replace(np.strings.replace(texto[com_virgula], '.', ''), ',', '.')
+    negativo = np.strings.startswith(texto, '-')
+    if negativo.any():
+        texto[negativo] = np.strings.replace(texto[negativo], '-', '', 1)
+    # Converte só o que é número (dígitos com no máximo um ponto); o resto fica NaN
+    numerico = np.strings.isdecimal(np.strings.replace(texto, '.', '', 1))
+    valores = np.full(len(texto), np.nan)
+    valores[numerico] = texto[numerico].astype(float)
+    valores[negativo] *= -1
+    return valores
+
+
+def _datas(serie):
+    """Valida 'DD/MM/AAAA' ou 'DDMMAAAA' em lote; devolve (válida, datetime64[D])"""
+    texto = np.strings.replace(_texto(serie), '/', '')
+    dia, mes, ano = _inteiros(texto, 0, 2), _inteiros(texto, 2, 4), _inteiros(texto, 4, 8)
+    bissexto = (ano % 4 == 0) & ((ano % 100 != 0) | (ano % 400 == 0))
+    dias_no_mes = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])[np.clip(mes, 0, 12)]
+    dias_no_mes = dias_no_mes + ((mes == 2) & bissexto)
+    valida = _so_digitos(texto, 8) & (mes >= 1) & (mes <= 12) & (dia >= 1) & (dia <= dias_no_mes)
+    meses = ((ano - 1970) * 12 + mes - 1).astype('datetime64[M]').astype('datetime64[D]')
+    datas = np.where(valida, meses + (dia - 1), np.datetime64('NaT'))
+    return valida, datas
+
+
+def _placas_validas(serie) -> np.ndarray:
+    """Mesmos formatos de validacao.PADRAO_PLACA: ABC1234, ABC-1234, ABC1D23, AB1234 e 1234"""
+    bruto = np.strings.upper(_texto(serie))
+    placa = np.strings.replace(bruto, '-', '')
+    tamanho = np.strings.str_len(placa)
+    # O hífen só é aceito na posição 3 do formato antigo (ABC-1234)
+    hifen_ok = (bruto == placa) | ((np.strings.str_len(bruto) == 8) & (np.strings.find(bruto, '-') == 3)
+                                   & (np.strings.count(bruto, '-') == 1))
+
+    def letras(inicio, fim):
+        codigos = _codigos(placa, inicio, fim)
+        return ((codigos >= ord('A')) & (codigos <= ord('Z'))).all(axis=1)
+
+    def digitos(inicio, fim):
+        return _inteiros(placa, inicio, fim) >= 0
+
+    sete = (tamanho == 7) & letras(0, 3) & digitos(3, 4) & (digitos(4, 7) | (letras(4, 5) & digitos(5, 7)))
+    mercosul = sete & ~digitos(4, 5)
+    return hifen_ok & ~(mercosul & (bruto != placa)) & (
+        sete
+        | ((tamanho == 6) & letras(0, 2) & digitos(2, 6) & (bruto == placa))
+        | ((tamanho == 4) & digitos(0, 4) & (bruto == placa))
+    )
+
+
+def validar_tabela(df: pd.DataFrame, hoje=None) -> pd.DataFrame:
+    """
+    Normaliza e valida todas as linhas de resultados de uma vez (operações vetorizadas)
+
+    Verificações:
+        - campo ausente (vazio ou nulo)
+        - quantidade, valor unitário e valor total numéricos e positivos
+        - quantidade x valor unitário = valor total (tolerância de 0,5%, mínimo R$ 0,05)
+        - placa nos formatos aceitos (ABC1234, ABC-1234, ABC1D23, AB1234, 1234)
+        - número do documento com 4 dígitos e km numérico
+        - data válida entre 2000 e hoje; hora entre 00:00 e 23:59
+          (aceita 'DD/MM/AAAA' e 'HH:MM' ou apenas os dígitos)
+
+    Args:
+        df: Tabela com as colunas do CSV de resultados (texto)
+        hoje: Data limite para datas futuras (padrão: hoje)
+
+    Returns:
+        Cópia da tabela com as colunas <campo>_num (float) para os valores e
+        a coluna 'flags' (problemas separados por ';', vazia se a linha está ok)
+    """
+    resultado = df.copy()
+    if resultado.empty:
+        for campo in COLUNAS_NUMERICAS:
+            resultado[f'{campo}_num'] = pd.Series(dtype=float)
+        resultado['flags'] = pd.Series(dtype=object)
+        return resultado
+    hoje = np.datetime64(pd.Timestamp(hoje or pd.Timestamp.today()).date(), 'D')
+    verificacoes = {}
+
+    textos = {}
+    for campo in CAMPOS:
+        if campo not in resultado:
+            resultado[campo] = ''
+        textos[campo] = _texto(resultado[campo])
+        verificacoes[f'{campo}_ausente'] = np.isin(textos[campo], ['', 'null', 'NULL', 'Null', 'None'])
+    presente = {campo: ~verificacoes[f'{campo}_ausente'] for campo in CAMPOS}
+
+    numeros = {}
+    for campo in COLUNAS_NUMERICAS:
+        numeros[campo] = numeros_br(textos[campo])
+        resultado[f'{campo}_num'] = numeros[campo]
+        with np.errstate(invalid='ignore'):
+            verificacoes[f'{campo}_invalido'] = presente[campo] & ~(numeros[campo] > 0)
+
+    q, u, t = (numeros[c] for c in COLUNAS_NUMERICAS)
+    with np.errstate(invalid='ignore'):
+        diferenca = np.abs(q * u - t)
+        verificacoes['conta_nao_confere'] = ~np.isnan(diferenca) & (diferenca > np.maximum(0.05, t * 0.005))
+
+    verificacoes['placa_invalida'] = presente['placa'] & ~_placas_validas(textos['placa'])
+    verificacoes['numero_documento_invalido'] = (presente['numero_documento']
+                                                 & ~_so_digitos(textos['numero_documento'], 4))
+    km = np.strings.replace(textos['km'], '.', '')
+    verificacoes['km_invalido'] = presente['km'] & ~(np.strings.isdigit(km) & (km != ''))
+
+    data_valida, datas = _datas(textos['data_documento'])
+    verificacoes['data_invalida'] = presente['data_documento'] & ~data_valida
+    verificacoes['data_fora_do_periodo'] = data_valida & ((datas < DATA_MINIMA) | (datas > hoje))
+
+    horas = np.strings.replace(textos['hora_documento'], ':', '')
+    hora_ok = _so_digitos(horas, 4) & (_inteiros(horas, 0, 2) < 24) & (_inteiros(horas, 2, 4) < 60)
+    verificacoes['hora_invalida'] = presente['hora_documento'] & ~hora_ok
+
+    # Cada verificação é um bit; o texto das flags é montado uma vez por combinação distinta
+    nomes = list(verificacoes)
+    codigos = np.zeros(len(resultado), dtype=np.int64)
+    for bit, nome in enumerate(nomes):
+        codigos |= verificacoes[nome].astype(np.int64) << bit
+    distintos, posicoes = np.unique(codigos, return_inverse=True)
+    textos_flags = np.array([';'.join(n for bit, n in enumerate(nomes) if codigo >> bit & 1)
+                             for codigo in distintos.tolist()], dtype=object)
+    resultado['flags'] = textos_flags[posicoes.reshape(-1)]
+    return resultado
+
+
+def resumir_flags(tabela: pd.DataFrame) -> pd.Series:
+    """Quantidade de linhas com cada flag (ordem decrescente)"""
+    flags = tabela['flags'][tabela['flags'] != ''].str.split(';').explode()
+    return flags.value_counts()
+
+
+def validar_csv(caminho, saida=None) -> pd.DataFrame:
+    """
+    Valida o CSV de resultados e grava o relatório <nome>_validacao.csv
+
+    O CSV original não é alterado (o preenchedor digita todas as colunas dele);
+    o relatório traz as mesmas colunas, os valores numéricos normalizados e a
+    coluna 'flags'.
+    """
+    caminho = Path(caminho)
+    tabela = validar_tabela(pd.read_csv(caminho, dtype=str, keep_default_na=False, encoding='utf-8'))
+    saida = Path(saida) if saida else caminho.with_name(f"{caminho.stem}_validacao.csv")
+    tabela.to_csv(saida, index=False, encoding='utf-8')
+
+    com_problema = int((tabela['flags'] != '').sum())
+    print(f"\n🧮 VALIDAÇÃO: {len(tabela) - com_problema}/{len(tabela)} linha(s) sem problemas")
+    for flag, quantidade in resumir_flags(tabela).items():
+        print(f"   • {flag}: {quantidade}")
+    print(f"   Relatório: {saida}")
+    return tabela
+
+
+def gerar_tabela_sintetica(n=100_000, semente=0, taxa_erro=0.05) -> pd.DataFrame:
+    """Gera n linhas com valores realistas (formatos variados e alguns erros) para o benchmark"""
+    rng = np.random.default_rng(semente)
+    quantidade = rng.uniform(5, 300, n).round(3)
+    unitario = rng.uniform(4.5, 7.5, n).round(3)
+    total = (quantidade * unitario).round(2)
+    total[rng.random(n) < taxa_erro] *= 1.1  # conta não confere
+
+    def br(valores, casas):
+        texto = np.char.mod(f'%.{casas}f', valores)
+        return np.char.replace(texto, '.', ',')
+
+    letras = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    placas = (np.char.add(np.char.add(np.char.add(letras[rng.integers(0, 26, n)], letras[rng.integers(0, 26, n)]),
+                                      letras[rng.integers(0, 26, n)]),
+                          np.char.mod('%04d', rng.integers(0, 10000, n))))
+    placas[rng.random(n) < taxa_erro] = 'PLACA?'
+
+    dias = rng.integers(0, 365 * 5, n)
+    datas = (pd.Timestamp(2020, 1, 1) + pd.to_timedelta(dias, unit='D')).strftime('%d/%m/%Y').to_numpy()
+    horas = np.char.add(np.char.add(np.char.mod('%02d', rng.integers(0, 24, n)), ':'),
+                        np.char.mod('%02d', rng.integers(0, 60, n)))
+
+    return pd.DataFrame({
+        'arquivo': np.char.mod('nota_%06d.pdf', np.arange(n)),
+        'data_documento': datas,
+        'hora_documento': horas,
+        'tipo_combustível': rng.choice(['DS', 'D', 'G'], n),
+        'quantidade': br(quantidade, 3),
+        'valor_unitario': br(unitario, 3),
+        'valor_total': br(total, 2),
+        'numero_documento': np.char.mod('%04d', rng.integers(1000, 10000, n)),
+        'placa': placas,
+        'km': np.char.mod('%d', rng.integers(1000, 999999, n)),
+        'modelo_veiculo': rng.choice(['FIAT STRADA', 'AMB. RENAULT', 'VW GOL', ''], n),
+    })
+
+
+def verificar_conversoes():
+    """Confere numeros_br e as flags numéricas de validar_tabela em casos de borda"""
+    casos = {
+        '1.234,56': 1234.56, '22,850': 22.85, '1234.56': 1234.56, 'R$ 1.234,56': 1234.56,
+        '-1,5': -1.5, ' 1.234,5 ': 1234.5, '1,2,3': np.nan, '1.2.3': np.nan, '.5': 0.5, '5.': 5.0,
+        '.': np.nan, '12a': np.nan, 'inf': np.nan, '': np.nan, 'null': np.nan, '--1': np.nan,
+        '0000000000000000001,5': 1.5,
+    }
+    obtidos = numeros_br(pd.Series(list(casos) + [None, np.nan], dtype=object))
+    esperados = np.array(list(casos.values()) + [np.nan, np.nan])
+    assert np.array_equal(obtidos, esperados, equal_nan=True), dict(zip(casos, obtidos))
+
+    tabela = validar_tabela(pd.DataFrame({'quantidade': ['-1,5', ' 1.234,5 ', '1,2,3'],
+                                          'valor_unitario': ['1,000'] * 3, 'valor_total': ['1,00'] * 3}))
+    invalidos = tabela['flags'].str.contains('quantidade_invalido').tolist()
+    assert invalidos == [True, False, True], tabela[['quantidade', 'quantidade_num', 'flags']]
+    print(f"Conversões numéricas: {len(casos) + 2} casos de borda conferidos")
+
+
+def benchmark_validacao(n=100_000, repeticoes=3):
+    """Mede o tempo de validar_tabela sobre n linhas sintéticas"""
+    tabela = gerar_tabela_sintetica(n)
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = validar_tabela(tabela)
+        tempos.append(time.perf_counter() - inicio)
+    print(f"Benchmark de validação: {n} linhas, melhor de {repeticoes}: {min(tempos) * 1000:.0f} ms"
+          f" ({n / min(tempos):,.0f} linhas/s)")
+    print(resumir_flags(resultado).to_string())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validação e normalização em lote do CSV de resultados")
+    parser.add_argument("csv", nargs="?", help="CSV de resultados (ex.: dados_extraidos_grok.csv)")
+    parser.add_argument("--saida", default=None, help="Relatório de validação (padrão: <csv>_validacao.csv)")
+    parser.add_argument("--benchmark", type=int, metavar="LINHAS", default=None,
+                        help="Mede a validação sobre LINHAS linhas sintéticas")
+    parser.add_argument("--verificar", action="store_true",
+                        help="Confere as conversões numéricas em casos de borda")
+    args = parser.parse_args()
+
+    if args.verificar or args.benchmark:
+        verificar_conversoes()
+    if args.benchmark:
+        benchmark_validacao(args.benchmark)
+    elif args.csv:
+        validar_csv(args.csv, args.saida)
+    elif not args.verificar:
+        parser.print_help()
@@ -0,0 +1,292 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance
+
+METODOS_PREPROCESSAMENTO = ('simples', 'completo', 'agressivo')
+
+# Lado mínimo (px) das imagens entregues ao OCR; menores são ampliadas (ou renderizadas maiores)
+LADO_MINIMO_OCR = 1500
+
+
+def escala_ocr(largura, altura) -> float:
+    """Fator que leva a imagem ao lado mínimo do OCR (1.0 se ela já for grande o bastante)"""
+    if altura >= LADO_MINIMO_OCR and largura >= LADO_MINIMO_OCR:
+        return 1.0
+    return max(LADO_MINIMO_OCR / altura, LADO_MINIMO_OCR / largura)
+
+
+def para_cinza(img) -> np.ndarray:
+    """Array em tons de cinza (uint8) de uma imagem PIL ou array RGB/cinza, sem cópia se já for cinza"""
+    if isinstance(img, Image.Image):
+        if img.mode != 'L':
+            img = img.convert('RGB')
+        img = np.asarray(img)
+    return img if img.ndim == 2 else cv2.cvtColor(img, cv2.COLOR_RGB2GRAY)
+
+
+class PreprocessadorOCR:
+    """Ampliação e binarização para o OCR (binarizar) sobre arrays em cinza, com buffers reaproveitados.
+
+    Os passos gravam em dois buffers (pingue-pongue) que só crescem: cada
+    segmento usa uma visão contígua do início deles, então segmentos de
+    tamanhos parecidos (os de um lote) não realocam memória. O array
+    devolvido é um desses buffers: vale até a próxima chamada (copie-o se
+    precisar guardá-lo). Não é thread-safe; use obter_preprocessador().
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self.alocacoes = 0
+        self._clahe = {limite: cv2.createCLAHE(clipLimit=limite, tileGridSize=(8, 8)) for limite in (2.0, 3.0)}
+        self._kernel_2 = cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))
+        self._kernel_3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+    def _buffer(self, nome, forma):
+        tamanho = forma[0] * forma[1]
+        memoria = self._buffers.get(nome)
+        if memoria is None or memoria.size < tamanho:
+            memoria = self._buffers[nome] = np.empty(tamanho, dtype=np.uint8)
+            self.alocacoes += 1
+        return memoria[:tamanho].reshape(forma)
+
+    def ampliar(self, cinza: np.ndarray) -> np.ndarray:
+        """Amplia com INTER_CUBIC até o lado mínimo do OCR (devolve a entrada se não for preciso)"""
+        altura, largura = cinza.shape
+        escala = escala_ocr(largura, altura)
+        if escala == 1.0:
+            return cinza
+        forma = (int(altura * escala), int(largura * escala))
+        return cv2.resize(cinza, forma[::-1], dst=self._buffer('ampliada', forma),
+                          interpolation=cv2.INTER_CUBIC)
+
+    def binarizar(self, cinza: np.ndarray, metodo: str = 'simples') -> np.ndarray:
+        """
+        Aplica os filtros de `metodo` e devolve a imagem binária (0/255)
+
+        Mesmos passos e parâmetros de sempre, sem a nitidez final do PIL:
+        ImageEnhance.Sharpness mistura a imagem com uma versão suavizada, e
+        numa imagem só com 0 e 255 o resultado é a própria imagem.
+        """
+        a = self._buffer('a', cinza.shape)
+        b = self._buffer('b', cinza.shape)
+        if metodo == 'simples':
+            cv2.GaussianBlur(cinza, (3, 3), 0, dst=a)
+            cv2.threshold(a, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=b)
+            return b
+        if metodo == 'agressivo':
+            cv2.bilateralFilter(cinza, 9, 75, 75, dst=a)
+            self._clahe[3.0].apply(a, dst=b)
+            cv2.adaptiveThreshold(b, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 2, dst=a)
+            cv2.morphologyEx(a, cv2.MORPH_OPEN, self._kernel_3, dst=b)
+            cv2.morphologyEx(b, cv2.MORPH_CLOSE, self._kernel_3, dst=a)
+            cv2.medianBlur(a, 3, dst=b)
+            return b
+        # 'completo'
+        cv2.GaussianBlur(cinza, (3, 3), 0, dst=a)
+        self._clahe[2.0].apply(a, dst=b)
+        cv2.adaptiveThreshold(b, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2, dst=a)
+        cv2.morphologyEx(a, cv2.MORPH_CLOSE, self._kernel_2, dst=b)
+        cv2.medianBlur(b, 3, dst=a)
+        return a
+
+    def processar(self, cinza: np.ndarray, metodo: str = 'simples', ampliar: bool = True) -> np.ndarray:
+        """Amplia (se `ampliar` e a imagem for pequena) e binariza; ver binarizar()"""
+        return self.binarizar(self.ampliar(cinza) if ampliar else cinza, metodo)
+
+
+_local = threading.local()
+
+
+def obter_preprocessador() -> PreprocessadorOCR:
+    """Preprocessador desta thread (cada worker do pool tem o seu, com os seus buffers)"""
+    preprocessador = getattr(_local, 'preprocessador', None)
+    if preprocessador is None:
+        preprocessador = _local.preprocessador = PreprocessadorOCR()
+    return preprocessador
+
+
+def renderizar_cinza_ocr(pagina, clip, zoom=2.0) -> np.ndarray:
+    """
+    Rasteriza `clip` (pontos PDF) em cinza já no tamanho que o OCR precisa
+
+    Em vez de renderizar com `zoom` e ampliar com INTER_CUBIC depois, usa
+    direto o zoom que leva o recorte ao lado mínimo do OCR: o MuPDF desenha
+    o texto vetorial nítido nessa resolução e não há conversão de cor.
+    """
+    from renderizacao import renderizar_pagina_array
+    escala = escala_ocr(clip.width * zoom, clip.height * zoom)
+    return renderizar_pagina_array(pagina, zoom * escala, clip=clip, cinza=True)
+
+
+def _preprocessar_referencia(img, metodo='simples'):
+    """Implementação original, removida do main.py (PIL -> RGB -> INTER_CUBIC -> cinza -> filtros -> nitidez).
+
+    Mantida só como referência das verificações de equivalência.
+    """
+    img_cv = np.array(img)
+    height, width = img_cv.shape[:2]
+    if height < 1500 or width < 1500:
+        scale_factor = max(1500 / height, 1500 / width)
+        img_cv = cv2.resize(img_cv, (int(width * scale_factor), int(height * scale_factor)),
+                            interpolation=cv2.INTER_CUBIC)
+    gray = img_cv if img_cv.ndim == 2 else cv2.cvtColor(img_cv, cv2.COLOR_RGB2GRAY)
+    if metodo == 'simples':
+        final = cv2.threshold(cv2.GaussianBlur(gray, (3, 3), 0), 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)[1]
+    elif metodo == 'agressivo':
+        realce = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8)).apply(cv2.bilateralFilter(gray, 9, 75, 75))
+        limiar = cv2.adaptiveThreshold(realce, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 15, 2)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+        final = cv2.medianBlur(cv2.morphologyEx(cv2.morphologyEx(limiar, cv2.MORPH_OPEN, kernel),
+                                                cv2.MORPH_CLOSE, kernel), 3)
+    else:
+        realce = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(cv2.GaussianBlur(gray, (3, 3), 0))
+        limiar = cv2.adaptiveThreshold(realce, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+        final = cv2.medianBlur(cv2.morphologyEx(limiar, cv2.MORPH_CLOSE,
+                                                cv2.getStructuringElement(cv2.MORPH_RECT, (2, 2))), 3)
+    return ImageEnhance.Sharpness(Image.fromarray(final)).enhance(1.5)
+
+
+def _paginas_referencia(pasta):
+    """PDFs de referência: uma nota digital (texto vetorial) e uma digitalizada simulada (só imagem)"""
+    from pathlib import Path
+
+    from codificacao_imagem import criar_fixtures
+    from extrator_deepseek import _criar_nfe_digital_simulada
+
+    digital = Path(pasta) / "digital.pdf"
+    _criar_nfe_digital_simulada(str(digital))
+    (digitalizada, _), = criar_fixtures(Path(pasta) / "notas", 1)
+    return [digital, digitalizada]
+
+
+def verificar_equivalencia():
+    """
+    Confere o novo caminho contra a implementação anterior (imagens de referência)
+
+    - Os três métodos geram exatamente os mesmos pixels que
+      _preprocessar_referencia sobre segmentos renderizados em cinza; sobre
+      segmentos RGB, só o arredondamento do INTER_CUBIC (que difere em ±1
+      entre 3 canais e 1 canal) muda alguns pixels por milhão.
+    - Segmentos seguidos do mesmo tamanho reaproveitam os buffers.
+    - Renderizar em cinza no tamanho do OCR dá o mesmo tamanho que ampliar
+      depois e quase os mesmos pixels binarizados.
+    """
+    import contextlib
+    import io
+    import tempfile
+
+    import fitz
+    from main import clipes_segmentos, segmentar_pagina_horizontal
+
+    print("\n🔬 Pré-processamento: equivalência com a implementação anterior")
+    preprocessador = PreprocessadorOCR()
+    with tempfile.TemporaryDirectory() as pasta:
+        casos = []  # (nome, página aberta, segmento em cinza, segmento RGB, clip)
+        documentos = [fitz.open(caminho) for caminho in _paginas_referencia(pasta)]
+        for documento in documentos:
+            pagina = documento[0]
+            with contextlib.redirect_stdout(io.StringIO()):
+                cinzas = segmentar_pagina_horizontal(pagina, cinza=True)
+                coloridos = segmentar_pagina_horizontal(pagina)
+            for n, caso in enumerate(zip(cinzas, coloridos, clipes_segmentos(pagina)), start=3):
+                casos.append((f"{documento.name.rsplit('/', 1)[-1]} seg. {n}", pagina, *caso))
+
+        for metodo in METODOS_PREPROCESSAMENTO:
+            diferentes_rgb = total_rgb = 0
+            for nome, _, cinza, colorido, _ in casos:
+                esperado = np.asarray(_preprocessar_referencia(cinza, metodo))
+                obtido = preprocessador.processar(para_cinza(cinza), metodo)
+                assert obtido.shape == esperado.shape, (metodo, nome, obtido.shape, esperado.shape)
+                diferentes = int((obtido != esperado).sum())
+                assert diferentes == 0, f"{metodo}, {nome}: {diferentes} pixels diferentes"
+
+                esperado = np.asarray(_preprocessar_referencia(colorido, metodo))
+                obtido = preprocessador.processar(para_cinza(colorido), metodo)
+                assert obtido.shape == esperado.shape, (metodo, nome, obtido.shape, esperado.shape)
+                diferentes_rgb += int((obtido != esperado).sum())
+                total_rgb += esperado.size
+            print(f" - {metodo}: {len(casos)} segmentos em cinza idênticos pixel a pixel;"
+                  f" RGB: {diferentes_rgb / total_rgb * 1e6:.1f} pixels diferentes por milhão")
+            assert diferentes_rgb <= 1e-5 * total_rgb, (metodo, diferentes_rgb)
+
+        # Os buffers (ampliada, a, b) só crescem: poucas alocações para todos os segmentos
+        assert preprocessador.alocacoes <= 3 * len(documentos), preprocessador.alocacoes
+        print(f" - buffers: {preprocessador.alocacoes} alocações para"
+              f" {2 * len(casos) * len(METODOS_PREPROCESSAMENTO)} segmentos processados")
+
+        for nome, pagina, cinza, _, clip in casos:
+            ampliada = preprocessador.processar(para_cinza(cinza), 'simples').copy()
+            direto = preprocessador.processar(renderizar_cinza_ocr(pagina, clip), 'simples', ampliar=False)
+            assert abs(direto.shape[0] - ampliada.shape[0]) <= 1 and abs(direto.shape[1] - ampliada.shape[1]) <= 1, \
+                (nome, direto.shape, ampliada.shape)
+            altura, largura = min(direto.shape[0], ampliada.shape[0]), min(direto.shape[1], ampliada.shape[1])
+            iguais = float((direto[:altura, :largura] == ampliada[:altura, :largura]).mean())
+            print(f" - {nome}: renderizado em {direto.shape[1]}x{direto.shape[0]},"
+                  f" {iguais:.1%} dos pixels iguais aos da ampliação")
+            assert iguais >= 0.97, (nome, iguais)
+        for documento in documentos:
+            documento.close()
+    print("✅ Pré-processamento equivalente ao anterior")
+
+
+def benchmark_preprocessamento(repeticoes=5, metodo='simples'):
+    """Tempo por segmento: implementação anterior x buffers em cinza x renderização no tamanho do OCR.
+
+    Os três caminhos partem do que cada um recebe no pipeline: o anterior e o
+    de buffers, do segmento já renderizado (RGB / cinza) com zoom 2; o
+    direto, da página (renderiza e binariza).
+    """
+    import contextlib
+    import io
+    import tempfile
+
+    import fitz
+    from main import clipes_segmentos, segmentar_pagina_horizontal
+
+    preprocessador = PreprocessadorOCR()
+    with tempfile.TemporaryDirectory() as pasta:
+        casos = []
+        documentos = [fitz.open(caminho) for caminho in _paginas_referencia(pasta)]
+        for documento in documentos:
+            pagina = documento[0]
+            with contextlib.redirect_stdout(io.StringIO()):
+                cinzas = segmentar_pagina_horizontal(pagina, cinza=True)
+                coloridos = segmentar_pagina_horizontal(pagina)
+            casos += [(pagina, *caso) for caso in zip(cinzas, coloridos, clipes_segmentos(pagina))]
+
+        caminhos = {
+            'anterior (PIL RGB)': lambda pagina, cinza, colorido, clip: _preprocessar_referencia(colorido, metodo),
+            'buffers (cinza)': lambda pagina, cinza, colorido, clip: preprocessador.processar(para_cinza(cinza), metodo),
+            'renderização direta': lambda pagina, cinza, colorido, clip: preprocessador.processar(
+                renderizar_cinza_ocr(pagina, clip), metodo, ampliar=False),
+        }
+        tempos = {}
+        for nome, funcao in caminhos.items():
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                for caso in casos:
+                    funcao(*caso)
+            tempos[nome] = (time.perf_counter() - inicio) / (repeticoes * len(casos)) * 1000
+        for documento in documentos:
+            documento.close()
+
+    referencia = tempos['anterior (PIL RGB)']
+    print(f"\n⏱️  Pré-processamento '{metodo}' ({len(casos)} segmentos, {repeticoes} repetições)")
+    for nome, tempo in tempos.items():
+        print(f" - {nome:<22} {tempo:7.1f} ms/segmento ({referencia / tempo:.1f}x)")
+    return tempos
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Equivalência e tempo do pré-processamento para o OCR")
+    parser.add_argument("--repeticoes", type=int, default=5, help="Repetições do benchmark (padrão: 5)")
+    args = parser.parse_args()
+
+    verificar_equivalencia()
+    for metodo in METODOS_PREPROCESSAMENTO:
+        benchmark_preprocessamento(args.repeticoes, metodo)
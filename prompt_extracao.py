@@ -0,0 +1,111 @@
+from typing import Dict, List, Optional, Tuple
+
+from validacao import CAMPOS
+
+# Instruções que não dependem dos campos pedidos. Vão primeiro e idênticas em
+# toda requisição, para o provedor poder guardá-las em cache (prompt caching).
+PREFIXO_INSTRUCOES = """Analise a(s) imagem(ns) de um documento fiscal/nota de abastecimento e extraia EXATAMENTE os campos pedidos.
+
+INSTRUÇÕES IMPORTANTES:
+- Retorne APENAS um JSON válido, somente com os campos pedidos e com as chaves exatas.
+- Use null para campos não encontrados.
+- Seja preciso e extraia apenas o que está claramente visível.
+- Retorne nomes com todos os caracteres em maiúsculo.
+- Caso não tenha certeza sobre mais que 1 campo em 1 arquivo, inclua uma chave "aviso" pedindo para o usuário conferir o documento.
+"""
+
+_LOCAL_DADOS_ADICIONAIS = ('A placa, km e modelo do veículo estão localizados na parte inferior do documento,'
+                           ' na seção "DADOS ADICIONAIS", logo acima do "MOTORISTA".')
+_FORMATO_ORIGINAL = 'Para quantidade, valor unitário e valor total, mantenha o formato original do documento.'
+_VALORES_BR = 'Para valores monetários, use apenas números e com formatação do Brasil (ex: "35198,75").'
+
+# campo -> (descrição, regras específicas, formato no JSON de exemplo)
+DESCRICOES_CAMPOS: Dict[str, Tuple[str, Tuple[str, ...], str]] = {
+    'numero_documento': (
+        'Número do Documento: número do documento que possui 4 dígitos (ex de formato: XXXX).',
+        ('Para o número do documento, ele fica localizado junto com o número de Série e "NF-e", e o número'
+         ' do documento é o de 4 dígitos que vem logo acima, na parte mais inferior do documento.',),
+        'valor ou null'),
+    'data_documento': (
+        'Data do documento: data em que o documento foi emitido (formato: DD/MM/AAAA).',
+        (),
+        'DD/MM/AAAA ou null'),
+    'hora_documento': (
+        'Hora do documento: hora em que o documento foi emitido (formato: HH:MM).',
+        ('Caso não encontre a hora do documento, retorne 00:00.',),
+        'HH:MM ou null'),
+    'tipo_combustível': (
+        'Tipo de Combustível: o tipo do combustível (ex: Gasolina, Etanol, Etanol S10, Diesel, etc).',
+        ('Para o combustível, os numeros 3 = D (Diesel S500), 4 = DS (Diesel S10), 5 = G (Gasolina),'
+         ' retorne apenas a sigla (ex: DS, G, D, etc).',),
+        'valor ou null'),
+    'quantidade': (
+        'Quantidade: quantidade do produto (em litros ou unidades).',
+        (_FORMATO_ORIGINAL,),
+        'valor ou null'),
+    'valor_unitario': (
+        'Valor Unitário: preço por unidade (R$), ele sempre terá 3 casas decimais, use virgulas e pontos'
+        ' conforme o documento.',
+        (_VALORES_BR, _FORMATO_ORIGINAL),
+        'valor ou null'),
+    'valor_total': (
+        'Valor Total: valor total da compra (R$), ele sempre terá 3 casas decimais, use virgulas e pontos'
+        ' conforme o documento.',
+        (_VALORES_BR, _FORMATO_ORIGINAL,
+         'Faça a conta de quantidade * valor unitário e veja se bate com o valor total, se não bater,'
+         ' retorne null para valor total e retorne um aviso.'),
+        'valor ou null'),
+    'placa': (
+        'Placa: placa do veículo (formato ABC-1234 ou ABC1D23).',
+        ('Para placa, mantenha o formato original e a placa sempre tera o formato ABC1234, ABC1D23, 1234 ou'
+         ' AB1234, caso encontre um resultado diferente ou não consiga indentificar, retorne null.',
+         _LOCAL_DADOS_ADICIONAIS),
+        'valor ou null'),
+    'km': (
+        'KM: quilometragem do veículo.',
+        (_LOCAL_DADOS_ADICIONAIS,),
+        'valor ou null'),
+    'modelo_veiculo': (
+        'Modelo do Veículo: modelo/marca do carro, ele está em frente ao "OBS" logo acima do "MOTORISTA" e'
+        ' abaixo da placa e km; se não encontrar, retorne null, não confundir com o nome do motorista que'
+        ' também está acima do modelo do carro.',
+        (_LOCAL_DADOS_ADICIONAIS,),
+        'valor ou null'),
+}
+
+
+def campos_pedidos(campos: Optional[List[str]] = None) -> List[str]:
+    """Campos conhecidos na ordem do CSV (todos, se `campos` for None ou vazio)"""
+    if not campos:
+        return list(CAMPOS)
+    return [campo for campo in CAMPOS if campo in campos]
+
+
+def montar_prompt_campos(campos: Optional[List[str]] = None, etiquetas: Optional[List[str]] = None) -> str:
+    """Parte variável do prompt: descrição, regras e formato só dos campos pedidos.
+
+    Regras compartilhadas por vários campos (ex.: a localização de placa, km
+    e modelo) aparecem uma vez. `etiquetas` lista os recortes enviados na
+    mesma requisição, na ordem das imagens.
+    """
+    pedidos = campos_pedidos(campos)
+    linhas = ["Campos a extrair:"]
+    linhas += [f"{n}. {DESCRICOES_CAMPOS[campo][0]}" for n, campo in enumerate(pedidos, start=1)]
+
+    regras = []
+    for campo in pedidos:
+        for regra in DESCRICOES_CAMPOS[campo][1]:
+            if regra not in regras:
+                regras.append(regra)
+    if regras:
+        linhas += ["", "Regras destes campos:"] + [f"- {regra}" for regra in regras]
+
+    if etiquetas and len(etiquetas) > 1:
+        linhas += ["", "As imagens anexadas são recortes do MESMO documento, na ordem abaixo.",
+                   "Combine as informações de todas elas em UM único JSON."]
+        linhas += [f"Imagem {idx}: {label}" for idx, label in enumerate(etiquetas, start=1)]
+
+    linhas += ["", "Formato de resposta esperado:", "{"]
+    linhas += [f'    "{campo}": "{DESCRICOES_CAMPOS[campo][2]}",' for campo in pedidos]
+    linhas.append("}")
+    return "\n".join(linhas)
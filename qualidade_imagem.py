@@ -0,0 +1,216 @@
+import argparse
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Largura usada nas medições (o segmento é reduzido antes; medir não deve custar perto de um OCR)
+LARGURA_ESTIMATIVA = 600
+
+# Limiares das decisões (medidos na imagem reduzida, tons de cinza 0-255)
+DISTANCIA_TINTA = 25        # quanto um pixel precisa ser mais escuro que o fundo para contar como tinta
+TINTA_MINIMA = 0.0005       # fração de tinta abaixo da qual o segmento está em branco
+RUIDO_DIGITALIZACAO = 1.0   # desvio robusto do fundo a partir do qual a página é digitalizada, não renderizada
+RUIDO_MAXIMO = 6            # acima disso o granulado domina: filtros não recuperam o texto, só atrasam o OCR
+INCLINACAO_MINIMA = 4.0     # graus a partir dos quais o segmento é endireitado (o Tesseract tolera menos que isso)
+INCLINACAO_MAXIMA = 10.0
+
+def _reduzir(img, largura=LARGURA_ESTIMATIVA):
+    """Tons de cinza (np.uint8) com no máximo `largura` pixels de largura"""
+    cinza = np.asarray(img.convert('L')) if isinstance(img, Image.Image) else img
+    if cinza.ndim == 3:
+        cinza = cv2.cvtColor(cinza, cv2.COLOR_RGB2GRAY)
+    altura, largura_atual = cinza.shape
+    if largura_atual > largura:
+        cinza = cv2.resize(cinza, (largura, max(1, round(altura * largura / largura_atual))),
+                           interpolation=cv2.INTER_AREA)
+    return cinza
+
+
+def _inclinacao(tinta, passo=0.5):
+    """Ângulo (graus) que mais alinha as linhas de texto: maior variância da projeção horizontal"""
+    altura, largura = tinta.shape
+    centro = (largura / 2, altura / 2)
+    melhor, melhor_variancia = 0.0, -1.0
+    for angulo in np.arange(-INCLINACAO_MAXIMA, INCLINACAO_MAXIMA + passo / 2, passo):
+        matriz = cv2.getRotationMatrix2D(centro, float(angulo), 1.0)
+        girada = cv2.warpAffine(tinta, matriz, (largura, altura), flags=cv2.INTER_NEAREST)
+        variancia = girada.sum(axis=1, dtype=np.float64).var()
+        if variancia > melhor_variancia:
+            melhor, melhor_variancia = float(angulo), variancia
+    return melhor
+
+
+def estimar_qualidade(img) -> dict:
+    """
+    Mede, em uma cópia reduzida do segmento, o que decide o pré-processamento
+
+    O fundo é a mediana da imagem (em documentos, a maior parte é papel) e a
+    tinta são os pixels bem mais escuros que ele, então granulado de
+    digitalização não conta como texto.
+
+    Args:
+        img: Segmento (PIL.Image ou np.ndarray RGB/cinza)
+
+    Returns:
+        Dicionário com fundo (mediana), ruido (desvio robusto do fundo), tinta
+        (fração de pixels de texto), contraste (fundo - mediana da tinta),
+        borrao (fração de meios-tons nas bordas do texto, 0 a 1) e inclinacao (graus)
+    """
+    cinza = _reduzir(img)
+    fundo = float(np.median(cinza))
+    ruido = float(1.4826 * np.median(np.abs(cinza - np.float32(fundo))))
+    mascara = cinza < fundo - max(DISTANCIA_TINTA, 4 * ruido)
+    tinta = float(mascara.mean())
+    qualidade = {'fundo': fundo, 'ruido': ruido, 'tinta': tinta, 'contraste': 0.0, 'borrao': 0.0,
+                 'inclinacao': 0.0}
+    if tinta < TINTA_MINIMA:
+        return qualidade
+
+    escuro = float(np.percentile(cinza[mascara], 10))
+    qualidade['contraste'] = fundo - escuro
+    # Texto nítido passa quase direto do fundo à tinta; borrado deixa uma faixa de meios-tons
+    faixa = qualidade['contraste'] / 4
+    meios_tons = ((cinza > escuro + faixa) & (cinza < fundo - faixa)).mean()
+    nucleo = (cinza <= escuro + faixa).mean()
+    qualidade['borrao'] = float(meios_tons / (meios_tons + nucleo)) if meios_tons + nucleo else 0.0
+    qualidade['inclinacao'] = _inclinacao(mascara.astype(np.uint8))
+    return qualidade
+
+
+def decidir_preprocessamento(qualidade: dict):
+    """
+    Escolhe o tratamento do segmento a partir de estimar_qualidade
+
+    Nas notas simuladas (ver benchmark_gatilho), só a binarização 'simples'
+    compensou, e só em digitalizações: páginas renderizadas perdem detalhe
+    com ela, e 'completo'/'agressivo' transformam o granulado em pontos que
+    deixam o Tesseract dezenas de vezes mais lento sem ler mais campos.
+
+    Returns:
+        (metodo, motivo): metodo é 'pular' (segmento em branco, sem OCR), None
+        (OCR direto) ou o método de preprocessamento.PreprocessadorOCR.binarizar
+    """
+    medidas = (f"contraste {qualidade['contraste']:.0f}, borrão {qualidade['borrao']:.2f},"
+               f" ruído {qualidade['ruido']:.1f}")
+    if qualidade['tinta'] < TINTA_MINIMA:
+        return 'pular', "segmento em branco"
+    if qualidade['ruido'] > RUIDO_MAXIMO:
+        return None, f"fundo granulado, filtros não ajudam ({medidas})"
+    if qualidade['ruido'] >= RUIDO_DIGITALIZACAO:
+        return 'simples', f"digitalização ({medidas})"
+    return None, f"imagem limpa ({medidas})"
+
+def endireitar(img, angulo: float):
+    """Gira o segmento (PIL ou array em cinza) em `angulo` graus, fundo branco, desfazendo a inclinação medida"""
+    if isinstance(img, np.ndarray):
+        altura, largura = img.shape[:2]
+        matriz = cv2.getRotationMatrix2D((largura / 2, altura / 2), angulo, 1.0)
+        return cv2.warpAffine(img, matriz, (largura, altura), flags=cv2.INTER_CUBIC, borderValue=255)
+    return img.rotate(angulo, resample=Image.BICUBIC, expand=False, fillcolor='white')
+
+
+# Degradações aplicadas aos segmentos das notas simuladas no benchmark
+VARIANTES_BENCHMARK = ('original', 'em_branco', 'borrado', 'inclinado', 'apagado', 'granulado')
+
+
+def _variante(img, nome, rng):
+    """Versão degradada de um segmento, simulando digitalizações ruins"""
+    from PIL import ImageFilter
+    cinza = np.asarray(img.convert('L'), dtype=np.float32)
+    if nome == 'em_branco':
+        return Image.fromarray(np.clip(245 + rng.normal(0, 3, cinza.shape), 0, 255).astype(np.uint8))
+    if nome == 'borrado':
+        return img.filter(ImageFilter.GaussianBlur(2.5))
+    if nome == 'inclinado':
+        return img.rotate(6, resample=Image.BICUBIC, fillcolor='white')
+    if nome == 'apagado':
+        return Image.fromarray((180 + cinza * 75 / 255).astype(np.uint8))
+    if nome == 'granulado':
+        return Image.fromarray(np.clip(cinza + rng.normal(0, 40, cinza.shape), 0, 255).astype(np.uint8))
+    return img
+
+
+def benchmark_gatilho(fixtures, gatilhos=('caracteres', 'qualidade'), variantes=VARIANTES_BENCHMARK,
+                      semente: int = 0):
+    """
+    Compara os gatilhos de filtros de main._ocr_segmento sobre os mesmos segmentos
+
+    Cada nota simulada tem seus dois segmentos de OCR degradados de cada forma
+    em `variantes`; os dois gatilhos leem exatamente as mesmas imagens.
+
+    Args:
+        fixtures: Lista de (caminho do PDF, gabarito), ex.: codificacao_imagem.criar_fixtures()
+        gatilhos: Gatilhos a comparar (ver main.GATILHOS_FILTROS)
+        variantes: Degradações aplicadas (ver VARIANTES_BENCHMARK)
+
+    Returns:
+        Lista de dicionários (gatilho, segmentos, chamadas, acertos, campos, segundos), na ordem de gatilhos
+    """
+    import contextlib
+    import io
+
+    import fitz
+    from codificacao_imagem import _acertos_ocr
+    from main import _ocr_segmento, segmentar_pagina_horizontal
+    from motor_ocr import obter_motor
+
+    rng = np.random.default_rng(semente)
+    notas = []
+    for caminho, gabarito in fixtures:
+        with fitz.open(caminho) as documento, contextlib.redirect_stdout(io.StringIO()):
+            segmentos = segmentar_pagina_horizontal(documento[0])
+        for nome in variantes:
+            notas.append((nome, {} if nome == 'em_branco' else gabarito,
+                          [_variante(segmento, nome, rng) for segmento in segmentos]))
+
+    motor = obter_motor()
+    resultados = []
+    for gatilho in gatilhos:
+        chamadas, inicio = motor.chamadas, time.perf_counter()
+        acertos = campos = 0
+        # As mensagens de main._ocr_segmento não interessam aqui
+        with contextlib.redirect_stdout(io.StringIO()):
+            for nome, gabarito, segmentos in notas:
+                textos = [_ocr_segmento(segmento, 1, i + 3, gatilho=gatilho) or ''
+                          for i, segmento in enumerate(segmentos)]
+                acertos += _acertos_ocr("\n".join(textos), gabarito)
+                campos += len(gabarito)
+        resultados.append({
+            'gatilho': gatilho,
+            'segmentos': sum(len(segmentos) for _, _, segmentos in notas),
+            'chamadas': motor.chamadas - chamadas,
+            'acertos': acertos,
+            'campos': campos,
+            'segundos': time.perf_counter() - inicio,
+        })
+    return resultados
+
+
+def exibir_benchmark(resultados):
+    """Tabela de chamadas de OCR, tempo e campos encontrados por gatilho"""
+    referencia = resultados[0]
+    print(f"\n{'gatilho':<14}{'segmentos':>11}{'chamadas OCR':>14}{'campos':>12}{'tempo':>9}")
+    for r in resultados:
+        print(f"{r['gatilho']:<14}{r['segmentos']:>11}{r['chamadas']:>14}"
+              f"{r['acertos']:>7}/{r['campos']:<4}{r['segundos']:>8.1f}s")
+    for r in resultados[1:]:
+        if referencia['chamadas']:
+            print(f"\n📉 {r['gatilho']}: {1 - r['chamadas'] / referencia['chamadas']:.0%} menos chamadas de OCR"
+                  f" e {1 - r['segundos'] / referencia['segundos']:.0%} menos tempo que {referencia['gatilho']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark: chamadas de OCR com o gatilho por qualidade x por caracteres")
+    parser.add_argument("--fixtures", type=int, default=4, help="Quantidade de notas simuladas (padrão: 4)")
+    parser.add_argument("--semente", type=int, default=0, help="Semente das notas simuladas e das degradações")
+    args = parser.parse_args()
+
+    import tempfile
+    from codificacao_imagem import criar_fixtures
+
+    with tempfile.TemporaryDirectory() as pasta:
+        notas = criar_fixtures(Path(pasta), args.fixtures, args.semente)
+        exibir_benchmark(benchmark_gatilho(notas, semente=args.semente))
@@ -0,0 +1,174 @@
+import sys
+import time
+
+import fitz  # PyMuPDF
+import numpy as np
+from PIL import Image
+
+
+def _renderizar_pixmap(pagina, zoom=2.0, clip=None, cinza=False):
+    """Rasteriza a página (ou só o retângulo `clip`, em pontos PDF) sem canal alfa"""
+    return pagina.get_pixmap(
+        matrix=fitz.Matrix(zoom, zoom),
+        clip=clip,
+        colorspace=fitz.csGRAY if cinza else fitz.csRGB,
+        alpha=False,
+    )
+
+
+def pixmap_para_pil(pix) -> Image.Image:
+    """Converte um Pixmap em imagem PIL lendo os pixels direto do buffer.
+
+    Evita o caminho pix.tobytes("ppm") -> Image.open(BytesIO), que codifica
+    um PPM só para decodificá-lo em seguida. `pix.samples` é uma cópia do
+    buffer do MuPDF; não usamos `samples_mv` porque a memoryview não mantém o
+    Pixmap vivo.
+    """
+    modo = 'L' if pix.n == 1 else 'RGB'
+    return Image.frombuffer(modo, (pix.width, pix.height), pix.samples, 'raw', modo, pix.stride, 1)
+
+
+def pixmap_para_numpy(pix) -> np.ndarray:
+    """Converte um Pixmap em array NumPy (altura x largura[, canais]) sem codificação intermediária.
+
+    O array é somente leitura (aponta para a cópia em `pix.samples`); as
+    funções do OpenCV sempre geram uma saída nova, então isso não é problema.
+    """
+    array = np.frombuffer(pix.samples, dtype=np.uint8)
+    if pix.stride != pix.width * pix.n:
+        array = array.reshape(pix.height, pix.stride)[:, :pix.width * pix.n]
+    if pix.n == 1:
+        return array.reshape(pix.height, pix.width)
+    return array.reshape(pix.height, pix.width, pix.n)
+
+
+def renderizar_pagina(pagina, zoom=2.0, clip=None, cinza=False) -> Image.Image:
+    """
+    Renderiza uma página do PDF como imagem PIL
+
+    Args:
+        pagina: Página PyMuPDF
+        zoom: Fator de escala (2.0 = 144 DPI)
+        clip: fitz.Rect em pontos PDF; se informado, rasteriza apenas essa área
+        cinza: Renderiza direto em escala de cinza (modo 'L')
+
+    Returns:
+        PIL.Image em modo 'RGB' (ou 'L' se cinza=True)
+    """
+    return pixmap_para_pil(_renderizar_pixmap(pagina, zoom, clip, cinza))
+
+
+def renderizar_pagina_array(pagina, zoom=2.0, clip=None, cinza=False) -> np.ndarray:
+    """Como renderizar_pagina, mas devolve um array NumPy (RGB ou tons de cinza)"""
+    return pixmap_para_numpy(_renderizar_pixmap(pagina, zoom, clip, cinza))
+
+
+def tamanho_renderizado(pagina, zoom=2.0):
+    """(largura, altura) em pixels que a página inteira teria se fosse renderizada com este zoom"""
+    irect = (pagina.rect * fitz.Matrix(zoom, zoom)).irect
+    return irect.width, irect.height
+
+
+def _contem(externa, interna):
+    return (externa[0] <= interna[0] and externa[1] <= interna[1]
+            and externa[2] >= interna[2] and externa[3] >= interna[3])
+
+
+def renderizar_regioes(pagina, caixas, zoom=2.0, cinza=False):
+    """
+    Rasteriza apenas as regiões pedidas da página, em vez da página inteira
+
+    As caixas são dadas em pixels da página renderizada inteira com `zoom`
+    (o mesmo sistema de coordenadas de img.crop) e convertidas para pontos
+    PDF para o `clip` do PyMuPDF. Caixas que passam da borda são limitadas à
+    página. Uma caixa contida em outra já renderizada é recortada dela, sem
+    nova rasterização.
+
+    Args:
+        pagina: Página PyMuPDF
+        caixas: Lista de (x0, y0, x1, y1) em pixels
+        zoom: Fator de escala das coordenadas e da renderização
+        cinza: Renderiza em escala de cinza
+
+    Returns:
+        Lista de imagens PIL, na mesma ordem das caixas
+    """
+    largura, altura = tamanho_renderizado(pagina, zoom)
+    origem = pagina.rect.tl
+    limitadas = [(max(0, x0), max(0, y0), min(largura, x1), min(altura, y1)) for x0, y0, x1, y1 in caixas]
+
+    imagens = [None] * len(caixas)
+    renderizadas = []  # (caixa, imagem) efetivamente rasterizadas
+    # Maiores primeiro, para que as menores possam ser recortadas delas
+    for idx in sorted(range(len(caixas)), key=lambda i: -(limitadas[i][2] - limitadas[i][0]) * (limitadas[i][3] - limitadas[i][1])):
+        x0, y0, x1, y1 = limitadas[idx]
+        if x1 <= x0 or y1 <= y0:
+            imagens[idx] = Image.new('L' if cinza else 'RGB', (max(0, x1 - x0), max(0, y1 - y0)))
+            continue
+
+        for (bx0, by0, bx1, by1), base in renderizadas:
+            if _contem((bx0, by0, bx1, by1), limitadas[idx]):
+                imagens[idx] = base.crop((x0 - bx0, y0 - by0, x1 - bx0, y1 - by0))
+                break
+        else:
+            clip = fitz.Rect(x0 / zoom, y0 / zoom, x1 / zoom, y1 / zoom) + (origem.x, origem.y, origem.x, origem.y)
+            imagem = renderizar_pagina(pagina, zoom, clip=clip, cinza=cinza)
+            renderizadas.append((limitadas[idx], imagem))
+            imagens[idx] = imagem
+
+    return imagens
+
+
+def benchmark_renderizacao(caminho_pdf=None, repeticoes=10, zoom=2.0):
+    """Mede o ganho por página do caminho direto sobre o caminho PPM (tobytes -> Image.open).
+
+    Compara dois usos:
+        - PIL RGB (usado pelo extrator antes dos recortes)
+        - NumPy em cinza (entrada do pré-processamento com OpenCV)
+    Sem PDF informado, gera um documento A4 com texto para a medição.
+    """
+    import io
+    import cv2
+
+    if caminho_pdf:
+        documento = fitz.open(caminho_pdf)
+    else:
+        documento = fitz.open()
+        for n in range(3):
+            pagina = documento.new_page(width=595, height=842)
+            for linha in range(40):
+                pagina.insert_text((40, 40 + linha * 19), f"LINHA {linha} DA PAGINA {n} - NF-E 1234 DIESEL S10")
+
+    def via_ppm_pil(pagina):
+        pix = pagina.get_pixmap(matrix=fitz.Matrix(zoom, zoom))
+        img = Image.open(io.BytesIO(pix.tobytes("ppm")))
+        img.load()
+        return img
+
+    def via_ppm_cinza(pagina):
+        img = via_ppm_pil(pagina)
+        return cv2.cvtColor(cv2.cvtColor(np.array(img), cv2.COLOR_RGB2BGR), cv2.COLOR_BGR2GRAY)
+
+    casos = [
+        ("PIL RGB", via_ppm_pil, lambda pagina: renderizar_pagina(pagina, zoom)),
+        ("NumPy cinza", via_ppm_cinza, lambda pagina: renderizar_pagina_array(pagina, zoom, cinza=True)),
+    ]
+
+    print(f"Benchmark de renderização: {documento.page_count} página(s), zoom {zoom}, {repeticoes} repetições")
+    for nome, antigo, novo in casos:
+        tempos = {}
+        for rotulo, funcao in (("ppm", antigo), ("direto", novo)):
+            inicio = time.perf_counter()
+            for _ in range(repeticoes):
+                for pagina in documento:
+                    funcao(pagina)
+            tempos[rotulo] = (time.perf_counter() - inicio) / (repeticoes * documento.page_count) * 1000
+        economia = tempos["ppm"] - tempos["direto"]
+        print(f"  {nome:<12} ppm: {tempos['ppm']:6.1f} ms/página | direto: {tempos['direto']:6.1f} ms/página"
+              f" | economia: {economia:5.1f} ms ({economia / tempos['ppm'] * 100:.0f}%)")
+
+    documento.close()
+
+
+if __name__ == "__main__":
+    benchmark_renderizacao(sys.argv[1] if len(sys.argv) > 1 else None)
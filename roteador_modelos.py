@@ -0,0 +1,131 @@
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+
+class RoteadorModelos:
+    """Escolhe, a cada requisição, a ordem em que os modelos de visão são tentados.
+
+    Para cada modelo guarda uma janela móvel das últimas `janela` requisições:
+    latência (ida e volta HTTP da última tentativa, sem a espera no limitador,
+    no semáforo ou entre tentativas), falha
+    (sem JSON válido) e taxa de preenchimento (fração dos campos pedidos que
+    vieram com valor). O custo esperado de um modelo é
+
+        latência média x (1 + 4 x taxa de erro) / taxa de preenchimento
+
+    e os modelos são tentados do menor para o maior custo. Modelos com menos
+    de `min_amostras` observações vão primeiro (na ordem configurada), até o
+    roteador conhecê-los.
+
+    Com hedge=True, se o primeiro modelo não responder dentro do p95 da sua
+    latência (contado a partir do envio), uma cópia da requisição vai ao
+    segundo modelo e vale o primeiro JSON válido que chegar.
+    """
+
+    def __init__(self, janela: int = 50, min_amostras: int = 3, hedge: bool = False,
+                 percentil_hedge: float = 95, atraso_hedge_padrao: float = 10.0):
+        """
+        Args:
+            janela: Requisições mais recentes consideradas por modelo
+            min_amostras: Observações necessárias antes de usar as métricas do modelo
+            hedge: Envia a requisição duplicada ao segundo modelo quando o primeiro demora
+            percentil_hedge: Percentil da latência do primeiro modelo usado como espera do hedge
+            atraso_hedge_padrao: Espera do hedge (s) enquanto o modelo tem poucas amostras
+        """
+        self.janela = janela
+        self.min_amostras = min_amostras
+        self.hedge = hedge
+        self.percentil_hedge = percentil_hedge
+        self.atraso_hedge_padrao = atraso_hedge_padrao
+        self.hedges_enviados = 0
+        self.hedges_vencedores = 0   # hedges que responderam antes do modelo principal
+        self._latencias: Dict[str, deque] = {}
+        self._falhas: Dict[str, deque] = {}
+        self._preenchimento: Dict[str, deque] = {}
+        self._escolhas: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _janelas(self, modelo):
+        if modelo not in self._latencias:
+            self._latencias[modelo] = deque(maxlen=self.janela)
+            self._falhas[modelo] = deque(maxlen=self.janela)
+            self._preenchimento[modelo] = deque(maxlen=self.janela)
+            self._escolhas[modelo] = 0
+        return self._latencias[modelo], self._falhas[modelo], self._preenchimento[modelo]
+
+    def registrar(self, modelo: str, segundos: float, sucesso: bool, preenchimento: Optional[float] = None):
+        """Anota o resultado de uma requisição ao modelo"""
+        with self._lock:
+            latencias, falhas, preenchimentos = self._janelas(modelo)
+            latencias.append(segundos)
+            falhas.append(0 if sucesso else 1)
+            if sucesso and preenchimento is not None:
+                preenchimentos.append(preenchimento)
+
+    def _metricas(self, modelo):
+        latencias, falhas, preenchimentos = self._janelas(modelo)
+        if len(falhas) < self.min_amostras:
+            return None
+        latencia = sum(latencias) / len(latencias)
+        taxa_erro = sum(falhas) / len(falhas)
+        preenchimento = sum(preenchimentos) / len(preenchimentos) if preenchimentos else 0.0
+        return latencia, taxa_erro, preenchimento
+
+    def custo(self, modelo: str) -> Optional[float]:
+        """Custo esperado do modelo (menor é melhor); None enquanto houver poucas amostras"""
+        with self._lock:
+            metricas = self._metricas(modelo)
+        if metricas is None:
+            return None
+        latencia, taxa_erro, preenchimento = metricas
+        return latencia * (1 + 4 * taxa_erro) / max(0.05, preenchimento)
+
+    def ordenar(self, modelos: List[str]) -> List[str]:
+        """Modelos na ordem em que devem ser tentados nesta requisição"""
+        custos = {modelo: self.custo(modelo) for modelo in modelos}
+        novos = [m for m in modelos if custos[m] is None]
+        conhecidos = sorted((m for m in modelos if custos[m] is not None), key=custos.get)
+        ordem = novos + conhecidos
+        if ordem:
+            with self._lock:
+                self._janelas(ordem[0])
+                self._escolhas[ordem[0]] += 1
+        return ordem
+
+    def atraso_hedge(self, modelo: str) -> float:
+        """Segundos a esperar pelo modelo antes de enviar o hedge (p95 da latência recente)"""
+        with self._lock:
+            latencias = sorted(self._janelas(modelo)[0])
+        if len(latencias) < self.min_amostras:
+            return self.atraso_hedge_padrao
+        indice = min(len(latencias) - 1, int(round(self.percentil_hedge / 100 * (len(latencias) - 1))))
+        return latencias[indice]
+
+    def registrar_hedge(self, venceu: bool):
+        with self._lock:
+            self.hedges_enviados += 1
+            self.hedges_vencedores += int(venceu)
+
+    def exibir_resumo(self):
+        """Métricas por modelo e quantos hedges foram enviados"""
+        with self._lock:
+            modelos = list(self._latencias)
+        if not modelos:
+            return
+        print(f"\n🧭 ROTEAMENTO DE MODELOS")
+        for modelo in modelos:
+            with self._lock:
+                latencias, falhas, preenchimentos = self._janelas(modelo)
+                amostras = len(falhas)
+                escolhas = self._escolhas[modelo]
+                if not amostras:
+                    print(f"   • {modelo}: sem requisições")
+                    continue
+                latencia = sum(latencias) / amostras
+                taxa_erro = sum(falhas) / amostras
+                preenchimento = sum(preenchimentos) / len(preenchimentos) if preenchimentos else 0.0
+            print(f"   • {modelo}: {escolhas} vez(es) primeiro, latência média {latencia:.2f}s,"
+                  f" erros {taxa_erro:.0%}, preenchimento {preenchimento:.0%} ({amostras} amostra(s))")
+        if self.hedge:
+            print(f"   • Hedges: {self.hedges_enviados} enviado(s), {self.hedges_vencedores} responderam primeiro")
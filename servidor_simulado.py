@@ -0,0 +1,246 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ServidorOpenRouterSimulado:
+    """Servidor HTTP local que imita o endpoint /chat/completions do OpenRouter.
+
+    Usado pelas rotinas de teste simulado para exercitar o extrator sem rede
+    e sem gastar créditos. Responde sempre com um JSON fixo (ou gerado por
+    uma função) e registra quantas requisições chegaram e o pico de
+    requisições simultâneas observado.
+
+    Também injeta limitação de taxa: acima de `limite_por_segundo` requisições
+    na janela de 1 s corrente responde 429 com Retry-After, e `status_forcados`
+    permite devolver códigos (ex.: [503, 429]) às primeiras requisições.
+
+    Requisições com "stream": true recebem o conteúdo por SSE, em pedaços de
+    `tamanho_pedaco` caracteres a cada `atraso_pedaco` segundos, com
+    `texto_antes` e `texto_depois` em volta do JSON (simula um modelo que
+    comenta a resposta) e, se o pedido trouxer stream_options.include_usage,
+    um último evento com o `usage`. Se o cliente fechar a conexão no meio, o
+    stream para e conta em `streams_interrompidos`.
+
+    Respostas completas trazem `usage` com tokens estimados (4 caracteres por
+    token, 85 por imagem). Um trecho de texto marcado com cache_control conta
+    como `cached_tokens` a partir da segunda vez que chega, como no prompt
+    caching dos provedores. O texto de cada prompt fica em `prompts`.
+    """
+
+    def __init__(self, resposta=None, atraso: float = 0.0, porta: int = 0,
+                 limite_por_segundo: int = None, status_forcados=None, retry_after: float = 1.0,
+                 tamanho_pedaco: int = 8, atraso_pedaco: float = 0.0, texto_antes: str = '',
+                 texto_depois: str = ''):
+        """
+        Args:
+            resposta: dict com os campos a devolver, ou função (payload) -> dict
+            atraso: segundos de espera antes de responder (simula latência do modelo)
+            porta: porta local (0 = escolhe uma livre)
+            limite_por_segundo: Máximo de requisições aceitas por janela de 1 s (None = sem limite)
+            status_forcados: Códigos HTTP devolvidos, em ordem, às primeiras requisições
+            retry_after: Valor do Retry-After nos 429 forçados (None = sem o cabeçalho)
+            tamanho_pedaco: Caracteres do conteúdo por evento SSE (modo stream)
+            atraso_pedaco: Segundos entre eventos SSE (simula a geração token a token)
+            texto_antes: Texto enviado antes do JSON no modo stream
+            texto_depois: Texto enviado depois do JSON no modo stream
+        """
+        self.resposta = resposta or {}
+        self.atraso = atraso
+        self.limite_por_segundo = limite_por_segundo
+        self.status_forcados = list(status_forcados or [])
+        self.retry_after = retry_after
+        self.tamanho_pedaco = max(1, tamanho_pedaco)
+        self.atraso_pedaco = atraso_pedaco
+        self.texto_antes = texto_antes
+        self.texto_depois = texto_depois
+        self.streams_interrompidos = 0
+        self.prompts = []
+        self._prefixos_em_cache = set()
+        self.pedacos_enviados = 0
+        self.total_requisicoes = 0
+        self.respostas_429 = 0
+        self.respostas_5xx = 0
+        self._janela = (0, 0)  # (segundo inteiro, requisições nesse segundo)
+        self.pico_simultaneas = 0
+        self._simultaneas = 0
+        self._lock = threading.Lock()
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", porta), self._criar_handler())
+        self._servidor.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        """URL do endpoint de chat, no mesmo formato de OpenRouterExtractor.base_url"""
+        host, porta = self._servidor.server_address[:2]
+        return f"http://{host}:{porta}/api/v1/chat/completions"
+
+    def iniciar(self):
+        self._thread = threading.Thread(target=self._servidor.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self):
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+    def __enter__(self):
+        return self.iniciar()
+
+    def __exit__(self, *exc):
+        self.parar()
+
+    def _gerar_resposta(self, payload):
+        """Monta o corpo da resposta no formato de chat completions"""
+        dados = self.resposta(payload) if callable(self.resposta) else self.resposta
+        conteudo = json.dumps(dados, ensure_ascii=False)
+        return {
+            "id": "sim-1",
+            "model": payload.get("model"),
+            "choices": [
+                {"message": {"role": "assistant", "content": conteudo}}
+            ],
+            "usage": self._contar_uso(payload, conteudo),
+        }
+
+    def _contar_uso(self, payload, conteudo):
+        """Tokens estimados da requisição e da resposta, no formato do campo usage"""
+        entrada = cache = 0
+        textos = []
+        for mensagem in payload.get("messages", []):
+            partes = mensagem.get("content")
+            if isinstance(partes, str):
+                partes = [{"type": "text", "text": partes}]
+            for parte in partes or []:
+                if parte.get("type") != "text":
+                    entrada += 85
+                    continue
+                tokens = -(-len(parte["text"]) // 4)
+                entrada += tokens
+                textos.append(parte["text"])
+                if "cache_control" in parte:
+                    with self._lock:
+                        if parte["text"] in self._prefixos_em_cache:
+                            cache += tokens
+                        self._prefixos_em_cache.add(parte["text"])
+        with self._lock:
+            self.prompts.append("\n".join(textos))
+        return {"prompt_tokens": entrada, "completion_tokens": -(-len(conteudo) // 4),
+                "total_tokens": entrada + -(-len(conteudo) // 4),
+                "prompt_tokens_details": {"cached_tokens": cache}}
+
+    def _pedacos_sse(self, payload):
+        """Eventos SSE (bytes) de uma resposta em stream, no formato do OpenRouter"""
+        dados = self.resposta(payload) if callable(self.resposta) else self.resposta
+        conteudo = self.texto_antes + json.dumps(dados, ensure_ascii=False) + self.texto_depois
+        yield b": OPENROUTER PROCESSING\n\n"
+        for i in range(0, len(conteudo), self.tamanho_pedaco):
+            evento = {"id": "sim-1", "model": payload.get("model"),
+                      "choices": [{"delta": {"content": conteudo[i:i + self.tamanho_pedaco]}}]}
+            yield f"data: {json.dumps(evento, ensure_ascii=False)}\n\n".encode("utf-8")
+        if (payload.get("stream_options") or {}).get("include_usage"):
+            # Como no OpenRouter: evento final sem conteúdo (choices vazio), só com o usage
+            evento = {"id": "sim-1", "model": payload.get("model"), "choices": [],
+                      "usage": self._contar_uso(payload, conteudo)}
+            yield f"data: {json.dumps(evento)}\n\n".encode("utf-8")
+        yield b"data: [DONE]\n\n"
+
+    def _verificar_limite(self):
+        """Decide se a requisição corrente deve ser recusada; devolve (status, Retry-After) ou None"""
+        with self._lock:
+            if self.status_forcados:
+                status = self.status_forcados.pop(0)
+                return status, (self.retry_after if status == 429 else None)
+
+            if self.limite_por_segundo:
+                agora = time.time()
+                segundo, contagem = self._janela
+                if int(agora) != segundo:
+                    segundo, contagem = int(agora), 0
+                contagem += 1
+                self._janela = (segundo, contagem)
+                if contagem > self.limite_por_segundo:
+                    return 429, round(segundo + 1 - agora, 3)
+        return None
+
+    def _criar_handler(self):
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                tamanho = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(tamanho) or b"{}")
+
+                recusa = servidor._verificar_limite()
+                if recusa is not None:
+                    status, retry_after = recusa
+                    with servidor._lock:
+                        servidor.total_requisicoes += 1
+                        if status == 429:
+                            servidor.respostas_429 += 1
+                        elif status >= 500:
+                            servidor.respostas_5xx += 1
+                    corpo = json.dumps({"error": {"code": status, "message": "simulado"}}).encode("utf-8")
+                    self.send_response(status)
+                    if retry_after is not None:
+                        self.send_header("Retry-After", str(retry_after))
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(corpo)))
+                    self.end_headers()
+                    self.wfile.write(corpo)
+                    return
+
+                with servidor._lock:
+                    servidor.total_requisicoes += 1
+                    servidor._simultaneas += 1
+                    servidor.pico_simultaneas = max(servidor.pico_simultaneas, servidor._simultaneas)
+                if payload.get("stream"):
+                    try:
+                        self._responder_stream(payload)
+                    finally:
+                        with servidor._lock:
+                            servidor._simultaneas -= 1
+                    return
+                try:
+                    if servidor.atraso:
+                        time.sleep(servidor.atraso)
+                    corpo = json.dumps(servidor._gerar_resposta(payload)).encode("utf-8")
+                finally:
+                    with servidor._lock:
+                        servidor._simultaneas -= 1
+
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(corpo)))
+                self.end_headers()
+                self.wfile.write(corpo)
+
+            def _responder_stream(self, payload):
+                if servidor.atraso:
+                    time.sleep(servidor.atraso)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for evento in servidor._pedacos_sse(payload):
+                        self.wfile.write(b"%x\r\n%s\r\n" % (len(evento), evento))
+                        self.wfile.flush()
+                        with servidor._lock:
+                            servidor.pedacos_enviados += 1
+                        if servidor.atraso_pedaco:
+                            time.sleep(servidor.atraso_pedaco)
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    with servidor._lock:
+                        servidor.streams_interrompidos += 1
+                    self.close_connection = True
+
+        return Handler
@@ -0,0 +1,148 @@
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# Tempo gasto abrindo conexões (TCP + TLS) na requisição corrente de cada thread
+_tempos_thread = threading.local()
+
+
+def _registrar_conexao(segundos):
+    _tempos_thread.conexao = getattr(_tempos_thread, 'conexao', 0.0) + segundos
+
+
+class _ConexaoHTTPCronometrada(HTTPConnection):
+    def connect(self):
+        inicio = time.perf_counter()
+        super().connect()
+        _registrar_conexao(time.perf_counter() - inicio)
+
+
+class _ConexaoHTTPSCronometrada(HTTPSConnection):
+    def connect(self):
+        # Em HTTPS o handshake TLS acontece dentro de connect()
+        inicio = time.perf_counter()
+        super().connect()
+        _registrar_conexao(time.perf_counter() - inicio)
+
+
+class _PoolHTTPCronometrado(HTTPConnectionPool):
+    ConnectionCls = _ConexaoHTTPCronometrada
+
+
+class _PoolHTTPSCronometrado(HTTPSConnectionPool):
+    ConnectionCls = _ConexaoHTTPSCronometrada
+
+
+class _AdaptadorCronometrado(HTTPAdapter):
+    """HTTPAdapter cujas conexões medem o tempo de handshake"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _PoolHTTPCronometrado,
+            'https': _PoolHTTPSCronometrado,
+        }
+
+
+class SessaoHTTP:
+    """Sessão HTTP persistente (pool de conexões + keep-alive) para a API.
+
+    Todas as respostas devolvidas por post() ganham o atributo `tempos`, um dict
+    com os segundos gastos em cada etapa:
+        - conexao: abertura de conexão TCP + TLS (0.0 quando a conexão foi reaproveitada)
+        - ttfb: do envio até a chegada dos cabeçalhos da resposta
+        - total: do envio até o fim da leitura do corpo
+    """
+
+    def __init__(self, tamanho_pool: int = 10, keep_alive: bool = True, http2: bool = False,
+                 keepalive_expiry: float = 60.0):
+        """
+        Args:
+            tamanho_pool: Máximo de conexões mantidas abertas por host
+            keep_alive: Se False, fecha a conexão após cada requisição
+            http2: Usa HTTP/2 via httpx (requer `pip install httpx[http2]`); se não
+                estiver instalado, cai para HTTP/1.1 com requests
+            keepalive_expiry: Segundos que uma conexão ociosa fica aberta (apenas HTTP/2)
+        """
+        self.tamanho_pool = tamanho_pool
+        self.keep_alive = keep_alive
+        self.http2 = False
+        self._cliente_httpx = None
+        self._sessao = None
+
+        if http2:
+            try:
+                import httpx
+                limites = httpx.Limits(
+                    max_connections=tamanho_pool,
+                    max_keepalive_connections=tamanho_pool if keep_alive else 0,
+                    keepalive_expiry=keepalive_expiry,
+                )
+                self._cliente_httpx = httpx.Client(http2=True, limits=limites)
+                self._httpx = httpx
+                self.http2 = True
+            except ImportError:
+                print("  ⚠️  HTTP/2 indisponível (instale httpx[http2]). Usando HTTP/1.1 com keep-alive.")
+
+        if not self.http2:
+            self._sessao = requests.Session()
+            adaptador = _AdaptadorCronometrado(pool_connections=1, pool_maxsize=tamanho_pool)
+            self._sessao.mount('https://', adaptador)
+            self._sessao.mount('http://', adaptador)
+            if not keep_alive:
+                self._sessao.headers['Connection'] = 'close'
+
+    def post(self, url, headers=None, json=None, timeout=None):
+        """Envia um POST reaproveitando conexões do pool; devolve a resposta com `tempos`"""
+        if self.http2:
+            return self._post_httpx(url, headers, json, timeout)
+
+        _tempos_thread.conexao = 0.0
+        inicio = time.perf_counter()
+        # stream=True faz o post retornar assim que os cabeçalhos chegam (TTFB)
+        resposta = self._sessao.post(url, headers=headers, json=json, timeout=timeout, stream=True)
+        ttfb = time.perf_counter() - inicio
+        resposta.content  # lê o corpo e devolve a conexão ao pool
+        resposta.tempos = {
+            'conexao': _tempos_thread.conexao,
+            'ttfb': ttfb,
+            'total': time.perf_counter() - inicio,
+        }
+        return resposta
+
+    def _post_httpx(self, url, headers, json, timeout):
+        marcas = {}
+
+        def rastrear(evento, info):
+            marcas[evento] = time.perf_counter()
+
+        inicio = time.perf_counter()
+        try:
+            resposta = self._cliente_httpx.post(url, headers=headers, json=json, timeout=timeout,
+                                                extensions={'trace': rastrear})
+        except self._httpx.HTTPError as e:
+            # Mantém o contrato de erros do requests para quem chama
+            raise requests.exceptions.ConnectionError(str(e)) from e
+        fim = time.perf_counter()
+
+        inicio_conexao = marcas.get('connection.connect_tcp.started')
+        fim_conexao = marcas.get('connection.start_tls.complete', marcas.get('connection.connect_tcp.complete'))
+        cabecalhos = (marcas.get('http2.receive_response_headers.complete')
+                      or marcas.get('http11.receive_response_headers.complete')
+                      or fim)
+        resposta.tempos = {
+            'conexao': (fim_conexao - inicio_conexao) if inicio_conexao and fim_conexao else 0.0,
+            'ttfb': cabecalhos - inicio,
+            'total': fim - inicio,
+        }
+        return resposta
+
+    def fechar(self):
+        if self._cliente_httpx is not None:
+            self._cliente_httpx.close()
+        if self._sessao is not None:
+            self._sessao.close()
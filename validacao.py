@@ -0,0 +1,131 @@
+import re
+from datetime import date
+
+# Campos do contrato de extração, na ordem do CSV
+CAMPOS = ['data_documento', 'hora_documento', 'tipo_combustível', 'quantidade', 'valor_unitario',
+          'valor_total', 'numero_documento', 'placa', 'km', 'modelo_veiculo']
+
+PADRAO_PLACA = re.compile(r'^(?:[A-Z]{3}-?\d{4}|[A-Z]{3}\d[A-Z]\d{2}|[A-Z]{2}\d{4}|\d{4})$')
+PADRAO_NUMERO_DOCUMENTO = re.compile(r'^\d{4}$')
+PADRAO_COMBUSTIVEL = re.compile(r'^[A-Z]{1,3}$')
+
+# Confiança inicial por etapa que forneceu o valor (já validado)
+CONFIANCA_ORIGEM = {
+    'texto': 0.95,       # camada de texto nativa do PDF
+    'reconsulta': 0.75,  # segunda passada, recorte e prompt só do campo
+    'visao': 0.7,
+    'ocr': 0.6,
+}
+CONFIANCA_INVALIDO = 0.2
+LIMIAR_CONFIANCA = 0.6
+
+
+def _digitos(valor) -> str:
+    return re.sub(r'\D', '', str(valor))
+
+
+def numero_br(valor) -> float:
+    """Converte '1.234,56', '1234.56' ou '22,850' em float (None se não for número)"""
+    s = str(valor).strip().replace('R$', '').replace(' ', '')
+    if ',' in s:
+        s = s.replace('.', '').replace(',', '.')
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def _data_valida(valor) -> bool:
+    # Aceita 'DD/MM/AAAA' e a forma só com dígitos ('DDMMAAAA') gravada pela normalização
+    digitos = _digitos(valor)
+    if len(digitos) != 8:
+        return False
+    try:
+        date(int(digitos[4:]), int(digitos[2:4]), int(digitos[:2]))
+    except ValueError:
+        return False
+    return True
+
+
+def _hora_valida(valor) -> bool:
+    digitos = _digitos(valor)
+    return len(digitos) == 4 and int(digitos[:2]) < 24 and int(digitos[2:]) < 60
+
+
+def _positivo(valor) -> bool:
+    numero = numero_br(valor)
+    return numero is not None and numero > 0
+
+
+VALIDADORES = {
+    'numero_documento': lambda v: bool(PADRAO_NUMERO_DOCUMENTO.match(str(v).strip())),
+    'data_documento': _data_valida,
+    'hora_documento': _hora_valida,
+    'tipo_combustível': lambda v: bool(PADRAO_COMBUSTIVEL.match(str(v).strip().upper())),
+    'quantidade': _positivo,
+    'valor_unitario': _positivo,
+    'valor_total': _positivo,
+    'placa': lambda v: bool(PADRAO_PLACA.match(str(v).strip().upper())),
+    'km': lambda v: str(v).replace('.', '').strip().isdigit(),
+    'modelo_veiculo': lambda v: any(c.isalpha() for c in str(v)) and len(str(v).strip()) <= 40,
+}
+
+
+def validar_campo(campo, valor) -> bool:
+    """True se o valor tem o formato esperado para o campo (campos sem validador sempre passam)"""
+    if valor is None or not str(valor).strip():
+        return False
+    validador = VALIDADORES.get(campo)
+    return validador(valor) if validador else True
+
+
+def valores_conferem(quantidade, valor_unitario, valor_total, tolerancia=0.005) -> bool:
+    """quantidade x valor unitário = valor total (tolerância relativa, mínimo de R$ 0,05)"""
+    q, u, t = numero_br(quantidade), numero_br(valor_unitario), numero_br(valor_total)
+    if None in (q, u, t):
+        return False
+    return abs(q * u - t) <= max(0.05, t * tolerancia)
+
+
+def validar_resultado(resultado):
+    """Valida cada campo de um resultado; inclui a conferência da conta quantidade x unitário = total.
+
+    Returns:
+        Dicionário campo -> bool
+    """
+    validos = {campo: validar_campo(campo, resultado.get(campo)) for campo in VALIDADORES}
+    chaves = ('quantidade', 'valor_unitario', 'valor_total')
+    if all(validos[c] for c in chaves) and not valores_conferem(*(resultado[c] for c in chaves)):
+        for chave in chaves:
+            validos[chave] = False
+    return validos
+
+
+def calcular_confianca(valor, valido, origem, candidatos=(), confianca_ocr=None) -> float:
+    """
+    Confiança (0 a 1) de um campo
+
+    Args:
+        valor: Valor escolhido para o campo
+        valido: Resultado do validador do campo
+        origem: Etapa que forneceu o valor ('texto', 'visao', 'ocr', 'reconsulta')
+        candidatos: Todos os valores devolvidos para o campo (uma entrada por resposta)
+        confianca_ocr: Confiança média do OCR (0 a 1), quando a origem é 'ocr'
+
+    Returns:
+        0 sem valor; CONFIANCA_INVALIDO se reprovado no validador; senão a
+        confiança da origem, somando concordâncias e descontando divergências
+        entre as respostas
+    """
+    if valor is None:
+        return 0.0
+    if not valido:
+        return CONFIANCA_INVALIDO
+    if origem == 'ocr' and confianca_ocr is not None:
+        confianca = confianca_ocr
+    else:
+        confianca = CONFIANCA_ORIGEM.get(origem, CONFIANCA_ORIGEM['visao'])
+    concordam = sum(1 for c in candidatos if c == valor)
+    divergem = len(candidatos) - concordam
+    confianca += 0.1 * max(0, concordam - 1) - 0.2 * divergem
+    return round(min(1.0, max(CONFIANCA_INVALIDO, confianca)), 2)